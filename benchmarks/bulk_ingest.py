@@ -0,0 +1,105 @@
+"""
+Rows/sec of loading a fresh crawl into the page table by the per-row ORM path, the batched upsert and COPY.
+
+The pages of synthetic site (with HTML of the given size and links to other pages) are saved by
+PageBatchWriter.flush in batches like on crawl, each way to a new site, so every run is the fresh load.
+The per-row ORM path adds and commits every page in its own transaction as the first version of app did.
+
+Usage: python -m benchmarks.bulk_ingest [--pages 100000] [--orm-pages 2000] [--batch-size 500]
+"""
+import argparse
+import logging
+import time
+import uuid
+
+import sqlalchemy
+
+from sitemapgen.cmds.generate_map import PageInfo
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.db.api_client import DatabaseApiClient, DbTablePage, DbTableSite
+from sitemapgen.settings import Settings
+
+
+def build_db_client() -> DatabaseApiClient:
+    pg_settings = Settings().postgres
+    return DatabaseApiClient(
+        host=pg_settings.hostname,
+        port=pg_settings.port,
+        database=pg_settings.database,
+        username=pg_settings.username,
+        password=pg_settings.password,
+    )
+
+
+def build_pages(site_url: str, pages_count: int, links_count: int, html_size: int) -> list[PageInfo]:
+    return [
+        PageInfo(
+            url=f"{site_url}/page/{i}",
+            title=f"Page {i}",
+            html=f"<html><title>Page {i}</title>".ljust(html_size, "x"),
+            links=[f"{site_url}/page/{(i * 7 + j) % pages_count}" for j in range(links_count)],
+            content_hash=uuid.uuid4().hex,
+        )
+        for i in range(pages_count)
+    ]
+
+
+def save_by_orm(db_client: DatabaseApiClient, pages: list[PageInfo], site_id: int) -> None:
+    session = db_client.session
+    for page_info in pages:
+        session.add(DbTablePage(
+            url_path=page_info.url.split("/", 3)[3],
+            title=page_info.title,
+            html=page_info.html,
+            content_hash=page_info.content_hash,
+            links=page_info.links,
+            ref_site_id=site_id,
+        ))
+        session.commit()
+
+
+def save_by_writer(db_client: DatabaseApiClient, pages: list[PageInfo], batch_size: int, bulk_copy: bool) -> None:
+    writer = PageBatchWriter(db_client=db_client, batch_size=batch_size, bulk_copy=bulk_copy)
+    for i in range(0, len(pages), batch_size):
+        writer.flush(pages[i:i + batch_size])
+
+
+def delete_site(db_client: DatabaseApiClient, site_id: int) -> None:
+    with db_client.connect() as connection:
+        connection.execute(sqlalchemy.delete(DbTablePage).where(DbTablePage.ref_site_id == site_id))
+        connection.execute(sqlalchemy.delete(DbTableSite).where(DbTableSite.id == site_id))
+        connection.commit()
+
+
+def main(args: argparse.Namespace) -> None:
+    db_client = build_db_client()
+
+    for name, pages_count in (("orm per row", args.orm_pages), ("upsert", args.pages), ("copy", args.pages)):
+        hostname = f"{uuid.uuid4().hex[:12]}.ingest.example"
+        site_id = db_client.create_site(("http", hostname, 80))
+        pages = build_pages(
+            site_url=f"http://{hostname}", pages_count=pages_count, links_count=args.links, html_size=args.html_size
+        )
+
+        started_at = time.perf_counter()
+        try:
+            if name == "orm per row":
+                save_by_orm(db_client, pages=pages, site_id=site_id)
+            else:
+                save_by_writer(db_client, pages=pages, batch_size=args.batch_size, bulk_copy=name == "copy")
+            seconds = time.perf_counter() - started_at
+        finally:
+            delete_site(db_client, site_id=site_id)
+
+        print(f"{name:>12}: pages={pages_count}, seconds={seconds:.2f}, rows_per_second={pages_count / seconds:.2f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100_000, help="The count of pages saved by batches")
+    parser.add_argument("--orm-pages", type=int, default=2_000, help="The count of pages saved row by row")
+    parser.add_argument("--links", type=int, default=10, help="The count of links on each page")
+    parser.add_argument("--html-size", type=int, default=2_000, help="The size of HTML of each page, characters")
+    parser.add_argument("--batch-size", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,213 @@
+"""
+End-to-end crawl benchmark against the deterministic synthetic site, the results are saved as JSON.
+
+The site is served by a child process, so its CPU time and memory are not counted for the crawler.
+SiteMapGenerator crawls it with the host rate limit out of the way and the pages are saved to the local
+Postgres by PageBatchWriter (or dropped with --sink none). Every run reports pages/sec, p50/p99 page
+latency, peak RSS and DB rows/sec; the summary is the median of the runs.
+
+The HTTP 429 responses (--throttle-rate) are handled by the adaptive rate limiter as on the real crawl:
+every one halves the rate of host, so even 1% of them dominates the throughput.
+
+Usage: python -m benchmarks.crawl [--pages 5000] [--latency 0.01] [--throttle-rate 0.01] [--output crawl.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import aiohttp
+import yarl
+
+from benchmarks.bulk_ingest import build_db_client, delete_site
+from benchmarks.synthetic_site import LATENCY_DISTRIBUTIONS, build_synthetic_site, start_synthetic_site, get_site_url
+from sitemapgen.cmds.generate_map import SiteMapGenerator, PageInfo
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher, FetchedPage
+from sitemapgen.http_tools.rate_limiter import HostRateLimits
+from sitemapgen.http_tools.tracing import build_metrics_trace_config
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+from sitemapgen.utils.metrics import MetricsRegistry, add_process_metrics
+
+SITE_PARAMS = (
+    "pages", "fan_out", "padding_size", "latency", "latency_distribution",
+    "error_rate", "throttle_rate", "duplicate_ratio", "seed",
+)
+
+
+class TimedHttpLinkFetcher(HttpLinkFetcher):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.latencies: list[float] = []
+
+    async def get_page(self, url, **request_kwargs) -> FetchedPage:
+        started_at = time.perf_counter()
+        try:
+            return await super().get_page(url, **request_kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - started_at)
+
+
+def serve_synthetic_site(site_kwargs: dict, connection: multiprocessing.connection.Connection) -> None:
+    async def serve() -> None:
+        runner = await start_synthetic_site(build_synthetic_site(**site_kwargs))
+        connection.send(get_site_url(runner))
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_site_process(args: argparse.Namespace) -> tuple[multiprocessing.Process, str]:
+    site_kwargs = {name: getattr(args, name) for name in SITE_PARAMS}
+    site_kwargs["pages_count"] = site_kwargs.pop("pages")
+
+    parent_connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve_synthetic_site, args=(site_kwargs, child_connection), daemon=True)
+    process.start()
+    return process, parent_connection.recv()
+
+
+async def drop_pages(save_queue: asyncio.Queue[PageInfo], stop_event: asyncio.Event) -> None:
+    while not (stop_event.is_set() and save_queue.empty()):
+        try:
+            await asyncio.wait_for(save_queue.get(), 0.1)
+        except asyncio.TimeoutError:
+            continue
+
+
+async def run_crawl(args: argparse.Namespace, site_url: str) -> dict[str, float]:
+    save_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+    stop_event = asyncio.Event()
+    metrics = MetricsRegistry()
+    add_process_metrics(metrics)
+
+    writer = None
+    if args.sink == "postgres":
+        writer = PageBatchWriter(db_client=build_db_client(), bulk_copy=args.bulk_copy, metrics=metrics)
+
+    async with aiohttp.ClientSession(trace_configs=[build_metrics_trace_config(metrics)]) as client_session:
+        link_fetcher = TimedHttpLinkFetcher(
+            client_session=client_session,
+            host_rate_limits=HostRateLimits(initial_rate=100_000, max_rate=100_000),
+            metrics=metrics,
+        )
+        generator = SiteMapGenerator(
+            http_link_fetcher=link_fetcher,
+            page_parser=build_page_parser(kind=args.parser),
+            on_save_queue=save_queue,
+            workers_count=args.concurrent,
+            streaming=args.streaming,
+            metrics=metrics,
+        )
+
+        saving_task = asyncio.ensure_future(
+            writer.run(save_queue, stop_event) if writer is not None else drop_pages(save_queue, stop_event)
+        )
+        await generator.generate_map(url=site_url, depth=args.depth)
+        crawl_seconds = generator.statistics.elapsed_seconds
+        stop_event.set()
+        await saving_task
+
+    latencies = sorted(link_fetcher.latencies)
+    return {
+        "pages": generator.statistics.pages_total,
+        "pages_failed": generator.statistics.pages_failed,
+        "crawl_seconds": crawl_seconds,
+        "pages_per_second": generator.statistics.pages_total / crawl_seconds,
+        "page_latency_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "page_latency_p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+        "http_requests": metrics.get("sitemapgen_http_requests_total").value,
+        "peak_rss_mib": metrics.get("sitemapgen_process_max_rss_bytes").value / 2 ** 20,
+        "db_rows_per_second": writer.statistics.rows_per_second if writer is not None else 0.0,
+        "parse_seconds_total": metrics.get("sitemapgen_parse_seconds").sum,
+        "canonicalize_seconds_total": metrics.get("sitemapgen_canonicalize_seconds").sum,
+    }
+
+
+def delete_crawled_site(site_url: str) -> None:
+    db_client = build_db_client()
+    url = yarl.URL(site_url)
+    if (site_id := db_client.select_site_ids().get((url.scheme, url.host, url.port))) is not None:
+        delete_site(db_client, site_id=site_id)
+
+
+def get_environment() -> dict[str, str]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = "unknown"
+
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": str(os.cpu_count()),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    runs = []
+    for i in range(args.repeat):
+        # A new site process per run, so the requests counts of pages (and the drawn errors) start again
+        site_process, site_url = start_site_process(args)
+        try:
+            result = await run_crawl(args, site_url=site_url)
+        finally:
+            site_process.terminate()
+            site_process.join()
+
+        if args.sink == "postgres":
+            delete_crawled_site(site_url)
+
+        runs.append(result)
+        print(f"run {i + 1}: " + ", ".join(f"{key}={value:.2f}" for key, value in result.items()))
+
+    summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    print("median: " + ", ".join(f"{key}={value:.2f}" for key, value in summary.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "benchmark": "crawl",
+                    "params": {key: getattr(value, "value", value) for key, value in vars(args).items()},
+                    "environment": get_environment(),
+                    "runs": runs,
+                    "summary": summary,
+                },
+                f,
+                indent=2,
+            )
+        print(f"The results are saved to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5000, help="The count of pages on the synthetic site")
+    parser.add_argument("--fan-out", type=int, default=10, help="The count of links on each page")
+    parser.add_argument("--depth", type=int, default=10, help="The depth of crawl")
+    parser.add_argument("--padding-size", type=int, default=2000, help="The padding of every page body, bytes")
+    parser.add_argument("--latency", type=float, default=0.01, help="The mean latency of page, s")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="exponential")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="The share of HTTP 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="The share of HTTP 429 responses")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2, help="The share of links to linked pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrent", type=int, default=32)
+    parser.add_argument("--streaming", action="store_true", help="Crawl with the streaming frontier")
+    parser.add_argument("--parser", type=PageParserKind, choices=list(PageParserKind), default=PageParserKind.STREAMING)
+    parser.add_argument("--sink", choices=("postgres", "none"), default="postgres", help="Where the pages are saved")
+    parser.add_argument("--bulk-copy", action="store_true", help="Save the pages with COPY")
+    parser.add_argument("--repeat", type=int, default=3, help="The count of runs")
+    parser.add_argument("--output", help="The JSON file to save the results to")
+    asyncio.run(main(parser.parse_args()))
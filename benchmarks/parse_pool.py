@@ -0,0 +1,116 @@
+"""
+Crawl throughput with HTML parsed on the event loop and in a pool of processes.
+
+The pages of the synthetic site are padded to make parsing CPU-bound, the saved pages are dropped.
+Besides pages/sec the event loop lag is sampled: the inline parsing blocks the loop for every page,
+so the fetching of the other pages is stalled. The gain of the pool grows with the count of CPU cores.
+
+Usage: python -m benchmarks.parse_pool [--pages 2000] [--padding-size 200000] [--parse-workers 4]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+import typing
+
+import aiohttp
+
+from benchmarks.synthetic_site import build_synthetic_site, start_synthetic_site, get_site_url
+from sitemapgen.cmds.generate_map import SiteMapGenerator, PageInfo
+from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher
+from sitemapgen.http_tools.rate_limiter import HostRateLimits
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+
+
+async def drop_pages(save_queue: asyncio.Queue[PageInfo]) -> None:
+    while True:
+        await save_queue.get()
+        save_queue.task_done()
+
+
+async def sample_loop_lag(lags: list[float], interval: float = 0.01) -> None:
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started_at - interval)
+
+
+async def run_crawl(
+    site_url: str,
+    depth: int,
+    concurrent: int,
+    parser_kind: PageParserKind,
+    parse_executor: typing.Optional[concurrent.futures.Executor],
+) -> dict[str, float]:
+    save_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+    lags: list[float] = []
+
+    async with aiohttp.ClientSession() as client_session:
+        generator = SiteMapGenerator(
+            http_link_fetcher=HttpLinkFetcher(
+                client_session=client_session,
+                host_rate_limits=HostRateLimits(initial_rate=100_000, max_rate=100_000),
+            ),
+            page_parser=build_page_parser(kind=parser_kind),
+            on_save_queue=save_queue,
+            workers_count=concurrent,
+            parse_executor=parse_executor,
+        )
+
+        background_tasks = [
+            asyncio.ensure_future(drop_pages(save_queue)),
+            asyncio.ensure_future(sample_loop_lag(lags)),
+        ]
+        try:
+            await generator.generate_map(url=site_url, depth=depth)
+        finally:
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    lags.sort()
+    return {
+        "pages": generator.statistics.pages_total,
+        "pages_per_second": generator.statistics.pages_per_second,
+        "loop_lag_p50_ms": lags[len(lags) // 2] * 1000,
+        "loop_lag_max_ms": lags[-1] * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    runner = await start_synthetic_site(
+        build_synthetic_site(pages_count=args.pages, fan_out=args.fan_out, padding_size=args.padding_size),
+        port=args.port,
+    )
+    site_url = get_site_url(runner)
+    print(f"CPU cores: {os.cpu_count()}")
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.parse_workers) as parse_executor:
+            for name, executor in (("inline", None), (f"{args.parse_workers} processes", parse_executor)):
+                result = await run_crawl(
+                    site_url=site_url,
+                    depth=args.depth,
+                    concurrent=args.concurrent,
+                    parser_kind=args.parser,
+                    parse_executor=executor,
+                )
+                print(f"{name:>14}: " + ", ".join(f"{key}={value:.2f}" for key, value in result.items()))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000, help="The count of pages on the synthetic site")
+    parser.add_argument("--fan-out", type=int, default=10, help="The count of links on each page")
+    parser.add_argument("--padding-size", type=int, default=200_000, help="The padding of each page, bytes")
+    parser.add_argument("--port", type=int, default=8090, help="The port of the synthetic site")
+    parser.add_argument("--parser", type=PageParserKind, default=PageParserKind.STREAMING)
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--concurrent", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,188 @@
+"""
+Parse throughput, allocations and peak memory of the page parsers on a corpus of pages.
+
+The corpus checked in to benchmarks/corpus covers the small, huge, malformed, non-UTF-8 and link-heavy
+pages (the .gz files are decompressed on load), other HTML files (or directories with them) and the pages
+saved by the previous crawls can be passed instead. Every IPageParser implementation is run: the lxml
+parsers and the legacy BeautifulSoup one. Before measuring, the title and the links of every page are
+compared with the ones of the lxml parser and the first difference is reported.
+
+The allocations are the ones of Python objects traced by tracemalloc, the memory of libxml2 is counted
+only by the growth of peak RSS measured in a fresh process.
+
+Usage: python -m benchmarks.parsers [PATH ...] [--from-db 1000] [--repeat 3]
+"""
+import argparse
+import concurrent.futures
+import gzip
+import importlib.util
+import pathlib
+import resource
+import time
+import tracemalloc
+import typing
+
+from sitemapgen.cmds.generate_map import IPageParser, ParsePageResult
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+
+CORPUS_DIR = pathlib.Path(__file__).parent / "corpus"
+LEGACY_PARSER_NAME = "bs4"
+
+
+class CorpusPage(typing.NamedTuple):
+    name: str
+    raw_html: bytes
+
+
+class LegacyBeautifulSoupParser:
+    """ The IPageParser over the legacy ParserBS, the missing title is "No title" like of the lxml parsers """
+
+    def __init__(self) -> None:
+        # The module is loaded by its path, as the import of sitemapgen.src parses the arguments of legacy CLI
+        spec = importlib.util.spec_from_file_location(
+            "sitemapgen_legacy_parser", pathlib.Path(__file__).parent.parent / "sitemapgen" / "src" / "parser.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        self._parser_class = module.ParserBS
+
+    def parse_html(
+        self, raw_html: typing.Union[str, bytes], http_charset: typing.Optional[str] = None
+    ) -> ParsePageResult:
+        parser = self._parser_class(raw_html)
+        return ParsePageResult(
+            title=parser.title or "No title",
+            links=[node.attrs["href"] for node in parser.anchor_nodes if node.attrs["href"]],
+        )
+
+
+def build_parsers() -> dict[str, IPageParser]:
+    parsers: dict[str, IPageParser] = {kind.value: build_page_parser(kind=kind) for kind in PageParserKind}
+    if importlib.util.find_spec("bs4") is not None:
+        parsers[LEGACY_PARSER_NAME] = LegacyBeautifulSoupParser()
+    return parsers
+
+
+def load_files(paths: list[pathlib.Path]) -> list[CorpusPage]:
+    corpus = []
+    for path in paths:
+        files = sorted(path.rglob("*.htm*")) if path.is_dir() else [path]
+        for file in files:
+            raw_html = gzip.decompress(file.read_bytes()) if file.suffix == ".gz" else file.read_bytes()
+            corpus.append(CorpusPage(name=file.name, raw_html=raw_html))
+    return corpus
+
+
+def load_db_pages(limit: int) -> list[CorpusPage]:
+    from sitemapgen.db.api_client import DbTablePage
+    from sitemapgen.provider import CommandProvider
+
+    session = CommandProvider().db_api_client.session
+    pages = session.query(DbTablePage).filter(DbTablePage.content_hash.isnot(None)).limit(limit)
+    return [CorpusPage(name=f"page {page.id}", raw_html=page.get_html().encode("utf-8")) for page in pages]
+
+
+def find_difference(result: ParsePageResult, expected_result: ParsePageResult) -> typing.Optional[str]:
+    if result.title != expected_result.title:
+        return f"title {result.title!r} != {expected_result.title!r}"
+
+    for i, (link, expected_link) in enumerate(zip(result.links, expected_result.links)):
+        if link != expected_link:
+            return f"link #{i} {link!r} != {expected_link!r}"
+
+    if len(result.links) != len(expected_result.links):
+        return f"{len(result.links)} links != {len(expected_result.links)}"
+
+    return None
+
+
+def compare_parsers(parsers: dict[str, IPageParser], corpus: list[CorpusPage]) -> int:
+    """ Print the first difference from the results of the first parser per page, return the count of them """
+    (expected_name, expected_parser), *other_parsers = parsers.items()
+
+    differences_count = 0
+    for page in corpus:
+        expected_result = expected_parser.parse_html(page.raw_html)
+        for name, parser in other_parsers:
+            if difference := find_difference(parser.parse_html(page.raw_html), expected_result):
+                differences_count += 1
+                print(f"{page.name}: {name} differs from {expected_name}: {difference}")
+
+    return differences_count
+
+
+def measure_peak_rss_growth(parser_name: str, corpus: list[CorpusPage]) -> int:
+    """ The growth of peak RSS while parsing, it must be run in a fresh process to count the memory of libxml2 """
+    parser = build_parsers()[parser_name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for page in corpus:
+        parser.parse_html(page.raw_html)
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 2 ** 10
+
+
+def measure_allocations(parser: IPageParser, corpus: list[CorpusPage]) -> tuple[int, int]:
+    """ The size of Python allocations left after parsing (until collected) and their peak, the largest per page """
+    retained_size, peak_size = 0, 0
+    tracemalloc.start()
+    try:
+        for page in corpus:
+            tracemalloc.clear_traces()
+            tracemalloc.reset_peak()
+            result = parser.parse_html(page.raw_html)
+            size, page_peak_size = tracemalloc.get_traced_memory()
+            del result
+            retained_size = max(retained_size, size)
+            peak_size = max(peak_size, page_peak_size)
+    finally:
+        tracemalloc.stop()
+    return retained_size, peak_size
+
+
+def measure_parser(parser_name: str, corpus: list[CorpusPage], repeat: int) -> dict[str, float]:
+    parser = build_parsers()[parser_name]
+
+    started_at, cpu_started_at = time.perf_counter(), time.process_time()
+    for _ in range(repeat):
+        for page in corpus:
+            parser.parse_html(page.raw_html)
+    seconds, cpu_seconds = time.perf_counter() - started_at, time.process_time() - cpu_started_at
+
+    retained_size, allocations_peak_size = measure_allocations(parser, corpus)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        peak_rss_growth = executor.submit(measure_peak_rss_growth, parser_name, corpus).result()
+
+    pages_count = len(corpus) * repeat
+    return {
+        "pages/sec": pages_count / seconds,
+        "MiB/sec": sum(len(page.raw_html) for page in corpus) * repeat / 2 ** 20 / seconds,
+        "CPU ms/page": cpu_seconds / pages_count * 1000,
+        "max retained MiB": retained_size / 2 ** 20,
+        "max allocations peak MiB": allocations_peak_size / 2 ** 20,
+        "peak RSS growth MiB": peak_rss_growth / 2 ** 20,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    corpus = load_files(args.paths or [CORPUS_DIR])
+    if args.from_db:
+        corpus += load_db_pages(args.from_db)
+    if not corpus:
+        raise SystemExit("The corpus is empty: pass HTML files, directories or --from-db")
+
+    parsers = build_parsers()
+    print(f"Corpus: {len(corpus)} pages, {sum(len(page.raw_html) for page in corpus) / 2 ** 20:.2f} MiB")
+    differences_count = compare_parsers(parsers, corpus)
+    print(f"{differences_count} results differ")
+
+    for parser_name in parsers:
+        result = measure_parser(parser_name=parser_name, corpus=corpus, repeat=args.repeat)
+        print(f"{parser_name:>10}: " + ", ".join(f"{value:.2f} {key}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", type=pathlib.Path, help="The HTML files or directories with them")
+    parser.add_argument("--from-db", type=int, default=0, help="The count of pages saved by crawls to add")
+    parser.add_argument("--repeat", type=int, default=3, help="The count of passes over the corpus")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+"""
+Fetch latency of the crawl while the database is artificially slowed.
+
+Every statement sent to Postgres is preceded by `pg_sleep`, and the crawl is run twice:
+with the flushes made inline on the event loop and with the dedicated writer thread.
+
+Usage: python -m benchmarks.slow_database [--db-delay 0.2] [--pages 2000] [--depth 4]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import aiohttp
+import sqlalchemy.event
+
+from benchmarks.synthetic_site import build_synthetic_site, start_synthetic_site, get_site_url
+from sitemapgen.cmds.generate_map import SiteMapGenerator, PageInfo
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.db.api_client import DatabaseApiClient
+from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher, FetchedPage
+from sitemapgen.settings import Settings
+from sitemapgen.utils.html_page_parser import LxmlParser
+
+
+class InlinePageBatchWriter(PageBatchWriter):
+    async def flush_async(self, batch: list[PageInfo]) -> None:
+        self.flush(batch)
+
+
+class TimedHttpLinkFetcher(HttpLinkFetcher):
+    def __init__(self, client_session: aiohttp.ClientSession) -> None:
+        super().__init__(client_session=client_session)
+        self.latencies: list[float] = []
+
+    async def get_page(self, url, **request_kwargs) -> FetchedPage:
+        started_at = time.perf_counter()
+        try:
+            return await super().get_page(url, **request_kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - started_at)
+
+
+def build_slow_db_client(delay: float) -> DatabaseApiClient:
+    pg_settings = Settings().postgres
+    db_client = DatabaseApiClient(
+        host=pg_settings.hostname,
+        port=pg_settings.port,
+        database=pg_settings.database,
+        username=pg_settings.username,
+        password=pg_settings.password,
+    )
+
+    @sqlalchemy.event.listens_for(db_client._engine, "before_cursor_execute")
+    def _(connection, cursor, statement, parameters, context, executemany):
+        cursor.execute("SELECT pg_sleep(%s)", (delay,))
+
+    return db_client
+
+
+async def run_crawl(writer: PageBatchWriter, site_url: str, depth: int, concurrent: int) -> dict[str, float]:
+    save_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+    stop_event = asyncio.Event()
+
+    async with aiohttp.ClientSession() as client_session:
+        link_fetcher = TimedHttpLinkFetcher(client_session=client_session)
+        generator = SiteMapGenerator(
+            http_link_fetcher=link_fetcher,
+            page_parser=LxmlParser(),
+            on_save_queue=save_queue,
+            workers_count=concurrent,
+        )
+
+        saving_task = asyncio.ensure_future(writer.run(save_queue, stop_event))
+        await generator.generate_map(url=site_url, depth=depth)
+        crawl_seconds = generator.statistics.elapsed_seconds
+        stop_event.set()
+        await saving_task
+
+    latencies = sorted(link_fetcher.latencies)
+    return {
+        "pages": generator.statistics.pages_total,
+        "pages_per_second": generator.statistics.pages_total / crawl_seconds,
+        "fetch_p50_ms": statistics.median(latencies) * 1000,
+        "fetch_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "fetch_max_ms": latencies[-1] * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    runner = await start_synthetic_site(
+        build_synthetic_site(pages_count=args.pages, fan_out=args.fan_out), port=args.port
+    )
+    site_url = get_site_url(runner)
+
+    try:
+        for name, writer_class in (("inline", InlinePageBatchWriter), ("writer thread", PageBatchWriter)):
+            writer = writer_class(db_client=build_slow_db_client(args.db_delay), batch_size=args.batch_size)
+            result = await run_crawl(writer=writer, site_url=site_url, depth=args.depth, concurrent=args.concurrent)
+            print(f"{name:>14}: " + ", ".join(f"{key}={value:.2f}" for key, value in result.items()))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-delay", type=float, default=0.2, help="The delay of every database statement, s")
+    parser.add_argument("--pages", type=int, default=2000, help="The count of pages on the synthetic site")
+    parser.add_argument("--fan-out", type=int, default=10, help="The count of links on each page")
+    parser.add_argument("--port", type=int, default=8089, help="The port of the synthetic site")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--concurrent", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+import asyncio
+import collections
+import random
+
+from aiohttp import web
+
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential")
+
+
+def build_synthetic_site(
+    pages_count: int = 1000,
+    fan_out: int = 10,
+    latency: float = 0.0,
+    padding_size: int = 0,
+    latency_distribution: str = "fixed",
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    duplicate_ratio: float = 0.0,
+    seed: int = 0,
+) -> web.Application:
+    """
+    The site where the page N links to the pages N * fan_out + 1 ... N * fan_out + fan_out,
+    every page body is padded with `padding_size` bytes of paragraphs to make its parsing heavier.
+
+    The site is deterministic for the seed: the latency (fixed, uniform in 0 ... 2 * latency or exponential
+    with the mean latency), HTTP 500 / 429 responses and the duplicate links are drawn from the random
+    generator of the page and the number of its request, so the retry of the page gets the next draw.
+    The duplicate links point to the page already linked in another form (with a fragment or absolute).
+    """
+    if latency_distribution not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"The latency distribution must be one of {LATENCY_DISTRIBUTIONS}: {latency_distribution}")
+
+    padding = "<p>Lorem ipsum <b>dolor</b> sit amet</p>" * (padding_size // 40)
+    requests_counts: collections.Counter[int] = collections.Counter()
+
+    def draw_latency(page_random: random.Random) -> float:
+        if latency_distribution == "uniform":
+            return page_random.uniform(0, 2 * latency)
+        if latency_distribution == "exponential":
+            return page_random.expovariate(1 / latency)
+        return latency
+
+    def build_links(page_number: int, page_random: random.Random, site_url: str) -> str:
+        links = []
+        for i in range(1, fan_out + 1):
+            href = f"/page/{(page_number * fan_out + i) % pages_count}"
+            if links and page_random.random() < duplicate_ratio:
+                linked_href = page_random.choice(links)[0]
+                href = page_random.choice((f"{linked_href}#section-{i}", f"{site_url}{linked_href}"))
+            links.append((href, i))
+
+        return "".join(f'<a href="{href}">Page {i}</a>' for href, i in links)
+
+    async def handle_page(request: web.Request) -> web.Response:
+        page_number = int(request.match_info.get("number", 0))
+        requests_counts[page_number] += 1
+        page_random = random.Random(f"{seed}:{page_number}:{requests_counts[page_number]}")
+
+        if latency:
+            await asyncio.sleep(draw_latency(page_random))
+
+        response_draw = page_random.random()
+        if response_draw < throttle_rate:
+            return web.Response(status=429, text="Too Many Requests")
+        if response_draw < throttle_rate + error_rate:
+            return web.Response(status=500, text="<html><title>Error</title></html>", content_type="text/html")
+
+        # The links are drawn from the generator of the page only, so they are the same for every request
+        links = build_links(page_number, random.Random(f"{seed}:{page_number}"), site_url=f"{request.url.origin()}")
+        return web.Response(
+            text=f"<html><head><title>Page {page_number}</title></head><body>{padding}{links}</body></html>",
+            content_type="text/html",
+        )
+
+    app = web.Application()
+    app.router.add_get("/", handle_page)
+    app.router.add_get("/page/{number}", handle_page)
+    return app
+
+
+async def start_synthetic_site(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
+
+
+def get_site_url(runner: web.AppRunner) -> str:
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}/"
@@ -1,12 +1,17 @@
 import asyncio
 import enum
 import logging
+import pathlib
 import typing
 
 import typer
 import yarl
 
+from sitemapgen.cmds.frontier_worker import build_worker_id
+from sitemapgen.db.html_storage import HtmlStorage
 from sitemapgen.provider import CommandProvider
+from sitemapgen.utils.html_page_parser import PageParserKind
+from sitemapgen.utils.visited_set import VisitedSetKind
 
 cli_app = typer.Typer()
 
@@ -94,6 +99,80 @@ def cli_observe(
     raise typer.BadParameter("Neither URL nor scheme with hostname are passed in the parameters")
 
 
+@cli_app.command(
+    name="links",
+    short_help="Show the links of saved page",
+    help="Show the URLs linked from the saved page by the link graph stored on crawl"
+)
+def cli_links(
+    url: str = typer.Argument(
+        ...,
+        file_okay=False,
+        dir_okay=False,
+        help="The URL of saved page to show its links",
+        callback=validate_url
+    ),
+    limit: int = typer.Option(
+        50, "-l", "--limit",
+        min=0,
+        file_okay=False,
+        dir_okay=False,
+        help="The limit of rows to show (value: 0 is means no limit)"
+    ),
+    log_level: LogLevel = typer.Option(
+        LogLevel.INFO, "--log-level",
+        file_okay=False,
+        dir_okay=False,
+        help="The level of app logging",
+        case_sensitive=False,
+        callback=lambda v: v.upper(),
+    ),
+):
+    configure_logging(log_level=log_level)
+    CommandProvider().provide_show_links(url=url, limit=limit)
+
+
+@cli_app.command(
+    name="export",
+    short_help="Export the sitemap files",
+    help="Write the saved pages of site to gzipped sitemaps of 50,000 URLs and their sitemap.xml index"
+)
+def cli_export(
+    url: str = typer.Argument(
+        ...,
+        file_okay=False,
+        dir_okay=False,
+        help="The URL of site to export its pages",
+        callback=validate_url
+    ),
+    output_dir: pathlib.Path = typer.Option(
+        pathlib.Path("sitemap"), "-o", "--output",
+        file_okay=False,
+        dir_okay=True,
+        writable=True,
+        help="The directory to write the sitemaps and their index to"
+    ),
+    base_url: typing.Optional[str] = typer.Option(
+        None, "--base-url",
+        help="The URL of directory where the sitemaps are served, it is used in the index [default: the site root]"
+    ),
+    compress: bool = typer.Option(
+        True, "--gzip/--no-gzip",
+        help="Compress the sitemaps with gzip"
+    ),
+    log_level: LogLevel = typer.Option(
+        LogLevel.INFO, "--log-level",
+        file_okay=False,
+        dir_okay=False,
+        help="The level of app logging",
+        case_sensitive=False,
+        callback=lambda v: v.upper(),
+    ),
+):
+    configure_logging(log_level=log_level)
+    CommandProvider().provide_export(url=url, output_dir=output_dir, base_url=base_url, compress=compress)
+
+
 @cli_app.command(name="generate", short_help="Generate the sitemap", help="Generate the sitemap of entered URL")
 def cli_generate(
     url: str = typer.Argument(
@@ -117,6 +196,215 @@ def cli_generate(
         dir_okay=False,
         help="The limit of concurrent requests"
     ),
+    streaming: bool = typer.Option(
+        False, "--streaming/--per-depth",
+        help="Fetch the next depth level without waiting for the slowest page of the current one"
+    ),
+    visited_set_kind: VisitedSetKind = typer.Option(
+        VisitedSetKind.FINGERPRINT, "--visited-set",
+        case_sensitive=False,
+        help="The structure to remember visited URLs: exact 64-bit fingerprints or a Bloom filter for huge crawls"
+    ),
+    bloom_capacity: int = typer.Option(
+        10_000_000, "--bloom-capacity",
+        min=1,
+        help="The expected count of URLs for the Bloom filter of visited URLs"
+    ),
+    html_storage: HtmlStorage = typer.Option(
+        HtmlStorage.INLINE, "--html-storage",
+        case_sensitive=False,
+        help="Store HTML as text or compressed once per content hash (zstd requires the 'zstandard' package)"
+    ),
+    bulk_copy: bool = typer.Option(
+        False, "--bulk-copy",
+        help="Load the pages with COPY to a staging table merged by one upsert per batch (faster for large crawls)"
+    ),
+    recrawl: bool = typer.Option(
+        False, "--recrawl",
+        help="Revalidate the saved pages with ETag / Last-Modified and reuse their links when they are not modified"
+    ),
+    parser_kind: PageParserKind = typer.Option(
+        PageParserKind.STREAMING, "--parser",
+        case_sensitive=False,
+        help="The HTML parser: 'streaming' collects the title and links by events, 'lxml' builds the whole tree"
+    ),
+    parse_workers: int = typer.Option(
+        0, "--parse-workers",
+        min=0,
+        help="The count of processes to parse HTML in (value: 0 is means parsing in the main process)"
+    ),
+    robots: bool = typer.Option(
+        False, "--robots",
+        help="Skip the URLs disallowed by robots.txt and keep to its Crawl-delay"
+    ),
+    sitemaps: bool = typer.Option(
+        False, "--sitemaps",
+        help="Seed the crawl with the URLs of sitemaps listed in robots.txt (gzipped sitemaps and indexes too)"
+    ),
+    checkpoint_path: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--checkpoint",
+        dir_okay=False,
+        help="The file to save the crawl state to periodically, it is removed when the crawl is complete"
+    ),
+    checkpoint_interval: float = typer.Option(
+        60.0, "--checkpoint-interval",
+        min=1,
+        help="The interval of saving the crawl state, s"
+    ),
+    resume: bool = typer.Option(
+        False, "--resume",
+        help="Continue the crawl from the --checkpoint file instead of starting it from the URL"
+    ),
+    save_queue_memory: int = typer.Option(
+        256, "--save-queue-memory",
+        min=1,
+        help="The memory of pages waiting to be saved, MiB: the crawl slows down to the database pace over it"
+    ),
+    save_queue_spill_dir: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--save-queue-spill-dir",
+        exists=True,
+        file_okay=False,
+        writable=True,
+        help="Spill the pages over --save-queue-memory to a temporary file in the directory instead of waiting"
+    ),
+    metrics_port: typing.Optional[int] = typer.Option(
+        None, "--metrics-port",
+        min=1,
+        max=65535,
+        help="Serve the crawl metrics on http://127.0.0.1:PORT/metrics in the Prometheus text format"
+    ),
+    metrics_json_path: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--metrics-json",
+        dir_okay=False,
+        writable=True,
+        help="Save the crawl metrics as JSON to the file at exit"
+    ),
+    log_level: LogLevel = typer.Option(
+        LogLevel.INFO, "--log-level",
+        file_okay=False,
+        dir_okay=False,
+        help="The level of app logging",
+        case_sensitive=False,
+        callback=lambda v: v.upper(),
+    ),
+):
+    if resume and checkpoint_path is None:
+        raise typer.BadParameter("The --checkpoint file is required to resume the crawl")
+
+    configure_logging(log_level=log_level)
+    asyncio.run(
+        CommandProvider().provide_generate(
+            url=url,
+            depth=depth,
+            concurrent_requests_limit=concurrent_requests_limit,
+            streaming=streaming,
+            visited_set_kind=visited_set_kind,
+            bloom_capacity=bloom_capacity,
+            html_storage=html_storage,
+            bulk_copy=bulk_copy,
+            recrawl=recrawl,
+            parser_kind=parser_kind,
+            parse_workers=parse_workers,
+            robots=robots,
+            sitemaps=sitemaps,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=checkpoint_interval,
+            resume=resume,
+            save_queue_memory_bytes=save_queue_memory * 2 ** 20,
+            save_queue_spill_dir=save_queue_spill_dir,
+            metrics_port=metrics_port,
+            metrics_json_path=metrics_json_path,
+        )
+    )
+
+
+@cli_app.command(
+    name="worker",
+    short_help="Join the crawl shared through database",
+    help="Crawl the site of entered URL together with the other workers of the same URL through the frontier table",
+)
+def cli_worker(
+    url: str = typer.Argument(
+        ...,
+        file_okay=False,
+        dir_okay=False,
+        help="The URL to parse its hyperlinks, it identifies the shared crawl",
+        callback=validate_url
+    ),
+    depth: int = typer.Option(
+        1, "-d", "--depth",
+        min=1,
+        help="The maximum depth value of hyperlinks on page"
+    ),
+    concurrent_requests_limit: int = typer.Option(
+        6, "--concurrent", "-C",
+        min=1,
+        help="The limit of concurrent requests of this worker"
+    ),
+    worker_id: typing.Optional[str] = typer.Option(
+        None, "--worker-id",
+        help="The name of worker to claim the URLs by [default: hostname:pid]"
+    ),
+    claim_size: int = typer.Option(
+        32, "--claim-size",
+        min=1,
+        help="The count of URLs claimed at once"
+    ),
+    lease: float = typer.Option(
+        120.0, "--lease",
+        min=1,
+        help="The time for which the claimed URLs are not given to other workers, s"
+    ),
+    crawl_id: typing.Optional[str] = typer.Option(
+        None, "--crawl-id",
+        help="The id of crawl shared by the workers, a complete crawl is not run again [default: the canonical URL]"
+    ),
+    restart: bool = typer.Option(
+        False, "--restart",
+        help="Delete the frontier of the previous run of crawl before joining it (pass it to the first worker only)"
+    ),
+    html_storage: HtmlStorage = typer.Option(
+        HtmlStorage.INLINE, "--html-storage",
+        case_sensitive=False,
+        help="Store HTML as text or compressed once per content hash (zstd requires the 'zstandard' package)"
+    ),
+    bulk_copy: bool = typer.Option(
+        False, "--bulk-copy",
+        help="Load the pages with COPY to a staging table merged by one upsert per batch (faster for large crawls)"
+    ),
+    parser_kind: PageParserKind = typer.Option(
+        PageParserKind.STREAMING, "--parser",
+        case_sensitive=False,
+        help="The HTML parser: 'streaming' collects the title and links by events, 'lxml' builds the whole tree"
+    ),
+    robots: bool = typer.Option(
+        False, "--robots",
+        help="Skip the URLs disallowed by robots.txt and keep to its Crawl-delay"
+    ),
+    save_queue_memory: int = typer.Option(
+        256, "--save-queue-memory",
+        min=1,
+        help="The memory of pages waiting to be saved, MiB: the crawl slows down to the database pace over it"
+    ),
+    save_queue_spill_dir: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--save-queue-spill-dir",
+        exists=True,
+        file_okay=False,
+        writable=True,
+        help="Spill the pages over --save-queue-memory to a temporary file in the directory instead of waiting"
+    ),
+    metrics_port: typing.Optional[int] = typer.Option(
+        None, "--metrics-port",
+        min=1,
+        max=65535,
+        help="Serve the crawl metrics on http://127.0.0.1:PORT/metrics in the Prometheus text format"
+    ),
+    metrics_json_path: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--metrics-json",
+        dir_okay=False,
+        writable=True,
+        help="Save the crawl metrics as JSON to the file at exit"
+    ),
     log_level: LogLevel = typer.Option(
         LogLevel.INFO, "--log-level",
         file_okay=False,
@@ -128,5 +416,22 @@ def cli_generate(
 ):
     configure_logging(log_level=log_level)
     asyncio.run(
-        CommandProvider().provide_generate(url=url, depth=depth, concurrent_requests_limit=concurrent_requests_limit)
+        CommandProvider().provide_worker(
+            url=url,
+            depth=depth,
+            concurrent_requests_limit=concurrent_requests_limit,
+            worker_id=worker_id or build_worker_id(),
+            claim_size=claim_size,
+            lease=lease,
+            crawl_id=crawl_id,
+            restart=restart,
+            html_storage=html_storage,
+            bulk_copy=bulk_copy,
+            parser_kind=parser_kind,
+            robots=robots,
+            save_queue_memory_bytes=save_queue_memory * 2 ** 20,
+            save_queue_spill_dir=save_queue_spill_dir,
+            metrics_port=metrics_port,
+            metrics_json_path=metrics_json_path,
+        )
     )
@@ -0,0 +1,138 @@
+import asyncio
+import dataclasses
+import logging
+import os
+import pathlib
+import pickle
+import time
+import typing
+
+from sitemapgen.cmds.generate_map import SiteMapGenerator, FrontierEntry, PageInfo
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.cmds.save_queue import PageSaveQueue, SpilledPages
+from sitemapgen.utils.visited_set import IVisitedSet
+
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 2
+
+
+@dataclasses.dataclass
+class CrawlCheckpoint:
+    """
+    The state of crawl to continue it after the interruption, it is not validated as it is large.
+
+    The pages spilled to disk by the save queue are not in the checkpoint object, they are pickled
+    one by one after it in the file and read by CrawlCheckpointer.iter_spilled_pages.
+    """
+    url: str
+    frontier: list[tuple[int, str]]
+    visited_urls: bytes
+    pending_pages: list[PageInfo]
+    created_at: float
+    spilled_pages_count: int = 0
+    version: int = CHECKPOINT_VERSION
+
+    def get_frontier(self) -> list[FrontierEntry]:
+        return [FrontierEntry(depth=depth, url=url) for depth, url in self.frontier]
+
+    def get_visited_urls(self) -> IVisitedSet:
+        return pickle.loads(self.visited_urls)
+
+
+class CrawlCheckpointer:
+    """
+    The class for saving the crawl state to the local file periodically.
+
+    The state is taken at once on the event loop (the frontier with depths, the visited URLs and
+    the pages queued for saving), only the writing of file is made in the thread.
+    The file is replaced atomically, so the interrupted writing leaves the previous checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: typing.Union[str, os.PathLike],
+        url: str,
+        generator: SiteMapGenerator,
+        visited_urls: IVisitedSet,
+        page_queue: PageSaveQueue,
+        page_writer: PageBatchWriter,
+        interval: float = 60.0,
+    ) -> None:
+        self._path = pathlib.Path(path)
+        self._url = url
+        self._generator = generator
+        self._visited_urls = visited_urls
+        self._page_queue = page_queue
+        self._page_writer = page_writer
+        self._interval = interval
+
+    @staticmethod
+    def load(path: typing.Union[str, os.PathLike]) -> CrawlCheckpoint:
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+
+        if not isinstance(checkpoint, CrawlCheckpoint) or checkpoint.version != CHECKPOINT_VERSION:
+            raise ValueError(f"The file is not a crawl checkpoint of version {CHECKPOINT_VERSION}: {path}")
+
+        return checkpoint
+
+    @staticmethod
+    def iter_spilled_pages(path: typing.Union[str, os.PathLike]) -> typing.Iterator[PageInfo]:
+        """ Read the spilled pages of checkpoint one by one, they are not loaded at once """
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+            for _ in range(checkpoint.spilled_pages_count):
+                yield pickle.load(f)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """ Save the checkpoint every interval until the stop event is set """
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), self._interval)
+            except asyncio.TimeoutError:
+                try:
+                    await self.save()
+                except Exception as e:
+                    logger.exception(f"Unable to save the checkpoint to '{self._path}': {e!s}")
+
+    def take(self) -> tuple[CrawlCheckpoint, SpilledPages]:
+        """ Take the state at once, the spilled pages are only a range of the spill file to copy """
+        spilled_pages = self._page_queue.take_spilled_pages()
+        checkpoint = CrawlCheckpoint(
+            url=self._url,
+            frontier=[tuple(entry) for entry in self._generator.get_frontier_snapshot()],
+            visited_urls=pickle.dumps(self._visited_urls, protocol=pickle.HIGHEST_PROTOCOL),
+            pending_pages=self._page_writer.pending_pages + self._page_queue.get_memory_pages(),
+            created_at=time.time(),
+            spilled_pages_count=spilled_pages.count,
+        )
+        return checkpoint, spilled_pages
+
+    async def save(self) -> None:
+        started_at = time.perf_counter()
+        checkpoint, spilled_pages = self.take()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, checkpoint, spilled_pages)
+        finally:
+            spilled_pages.release()
+
+        logger.info(
+            f"The checkpoint is saved in {time.perf_counter() - started_at:.2f} s: "
+            f"{len(checkpoint.frontier)} URLs in the frontier, "
+            f"{len(checkpoint.pending_pages) + checkpoint.spilled_pages_count} pages to save"
+        )
+
+    def remove(self) -> None:
+        self._path.unlink(missing_ok=True)
+
+    def _write(self, checkpoint: CrawlCheckpoint, spilled_pages: SpilledPages) -> None:
+        tmp_path = self._path.with_name(f"{self._path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+            spilled_pages.copy_to(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self._path)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import typing
+
+import sqlalchemy.engine
+
+from sitemapgen.cmds.generate_map import SiteMapGenerator, FrontierEntry
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.cmds.save_queue import PageSaveQueue
+from sitemapgen.db.api_client import DatabaseApiClient
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FrontierWorker:
+    """
+    The worker of the crawl shared by processes and hosts through the frontier table.
+
+    The entries are claimed in small batches for the lease time, fetched and parsed by the generator,
+    then the links found on them are inserted to the frontier (the unique index of canonical URL
+    drops the known ones). The entries are marked done only when the writer saved their pages,
+    so the entries of pages lost with the save queue of the dead worker are claimed by others
+    when their lease expires. The leases of entries in flight are extended every third of the lease,
+    so the slow fetches and saves do not let another worker claim them.
+
+    The crawl is identified by the canonical URL or by the crawl id, the done entries are kept after
+    the crawl is complete, so the next run of the same crawl finds nothing to do. A new crawl of the URL
+    needs a new crawl id, or the restart which deletes the frontier left by the previous run.
+    """
+
+    def __init__(
+        self,
+        generator: SiteMapGenerator,
+        db_client: DatabaseApiClient,
+        page_writer: PageBatchWriter,
+        save_queue: PageSaveQueue,
+        worker_id: str,
+        claim_size: int = 32,
+        lease: float = 120.0,
+        poll_interval: float = 1.0,
+        crawl_id: typing.Optional[str] = None,
+        restart: bool = False,
+    ) -> None:
+        if claim_size < 1:
+            raise ValueError(f"The claim size must be positive: {claim_size}")
+
+        self._generator = generator
+        self._db = db_client
+        self._page_writer = page_writer
+        self._save_queue = save_queue
+        self._worker_id = worker_id
+        self._claim_size = claim_size
+        self._lease = lease
+        self._poll_interval = poll_interval
+        self._crawl_id = crawl_id
+        self._restart = restart
+        self._in_flight_entry_ids: set[int] = set()
+        self._completions: set[asyncio.Future] = set()
+
+        self.claims_count = 0
+        self.db_seconds_total = 0.0
+
+    async def run(self, url: str, depth: int) -> None:
+        """ Process the frontier of crawl of URL until every entry of it is done by any worker """
+        seed_url = await self._generator.start_crawl(url)
+        crawl = self._crawl_id or seed_url
+
+        if self._restart:
+            deleted_count = await self._call_db(self._db.delete_frontier_entries, crawl)
+            logger.info(f"The frontier of the previous run of crawl '{crawl}' is deleted: {deleted_count} entries")
+
+        if await self._generator.is_seed_allowed(seed_url):
+            await self._call_db(self._db.add_frontier_entries, crawl, [(seed_url, 1)])
+        logger.info(f"The worker '{self._worker_id}' joined the crawl: {crawl}")
+
+        heartbeat_task = asyncio.ensure_future(self._extend_leases())
+        try:
+            await self._process_frontier(crawl=crawl, depth=depth)
+        finally:
+            for task in (heartbeat_task, *self._completions):
+                task.cancel()
+            await asyncio.gather(heartbeat_task, *self._completions, return_exceptions=True)
+
+        logger.info(
+            f"The crawl is complete, the worker '{self._worker_id}' processed {self._generator.statistics}, "
+            f"{self.claims_count} claims, {self.db_seconds_total:.2f} s in database calls"
+        )
+
+    async def _process_frontier(self, crawl: str, depth: int) -> None:
+        while True:
+            self._check_completions()
+
+            claimed_rows = await self._call_db(
+                self._db.claim_frontier_entries, crawl, self._worker_id, self._claim_size, self._lease
+            )
+            if claimed_rows:
+                self.claims_count += 1
+                await self._process_claimed(crawl=crawl, claimed_rows=claimed_rows, depth=depth)
+                continue
+
+            if self._completions:
+                # The entries of this worker are done when their pages are saved, their links may be claimed before
+                await asyncio.wait(self._completions, timeout=self._poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            if not await self._call_db(self._db.has_unfinished_frontier_entries, crawl):
+                if not self.claims_count and not self._generator.statistics.urls_disallowed:
+                    logger.warning(
+                        f"The crawl '{crawl}' is already complete, "
+                        f"pass a new --crawl-id or --restart to crawl the site again"
+                    )
+                return
+
+            # The rest of entries is leased by other workers, they add the links found on them
+            await asyncio.sleep(self._poll_interval)
+
+    async def _process_claimed(self, crawl: str, claimed_rows: list[sqlalchemy.engine.Row], depth: int) -> None:
+        entry_ids = [row.id for row in claimed_rows]
+        self._in_flight_entry_ids.update(entry_ids)
+        new_entries: list[tuple[str, int]] = []
+
+        def on_links(entry: FrontierEntry, links: list[str]) -> None:
+            if entry.depth < depth:
+                new_entries.extend((link, entry.depth + 1) for link in links)
+
+        await self._generator.process_entries(
+            entries=[FrontierEntry(depth=row.depth, url=row.url) for row in claimed_rows], on_links=on_links
+        )
+
+        await self._call_db(self._db.add_frontier_entries, crawl, new_entries)
+
+        # Every page of the entries is in the save queue now, the pages are saved in the order of queue
+        self._completions.add(
+            asyncio.ensure_future(self._complete_when_saved(entry_ids, pages_count=self._save_queue.put_count))
+        )
+
+    async def _complete_when_saved(self, entry_ids: list[int], pages_count: int) -> None:
+        await self._page_writer.wait_saved(pages_count)
+        await self._call_db(self._db.complete_frontier_entries, self._worker_id, entry_ids)
+        self._in_flight_entry_ids.difference_update(entry_ids)
+
+    def _check_completions(self) -> None:
+        """ Forget the completed entries, the error of completion is raised """
+        for completion in [completion for completion in self._completions if completion.done()]:
+            self._completions.discard(completion)
+            completion.result()
+
+    async def _extend_leases(self) -> None:
+        """ Extend the leases of entries in flight every third of the lease, until the worker stops """
+        while True:
+            await asyncio.sleep(self._lease / 3)
+            if not self._in_flight_entry_ids:
+                continue
+
+            try:
+                extended_count = await self._call_db(
+                    self._db.extend_frontier_leases, self._worker_id, list(self._in_flight_entry_ids), self._lease
+                )
+            except Exception as e:
+                logger.warning(f"Unable to extend the leases of {len(self._in_flight_entry_ids)} entries: {e!s}")
+                continue
+
+            logger.debug(f"The leases of {extended_count} entries are extended")
+
+    async def _call_db(self, method, *args):
+        started_at = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+        finally:
+            self.db_seconds_total += time.perf_counter() - started_at
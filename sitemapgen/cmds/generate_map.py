@@ -1,14 +1,20 @@
 import asyncio
+import concurrent.futures
 import logging
+import time
 import typing
 
 import yarl
 from pydantic.dataclasses import dataclass
 
-from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher
-from sitemapgen.utils.url_tools import is_url_reference_to_html_element, is_url_relative, \
-    convert_relative_url_to_absolute, \
-    is_url_scheme_is_http, get_base_url, is_url_internal
+from sitemapgen.db.html_storage import get_content_hash
+from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher, PageSkippedError
+from sitemapgen.http_tools.robots import RobotsCache
+from sitemapgen.http_tools.sitemaps import iter_sitemap_urls
+from sitemapgen.utils.html_encoding import decode_html
+from sitemapgen.utils.metrics import MetricsRegistry
+from sitemapgen.utils.url_tools import UrlCanonicalizer, LinkKind, canonicalize_url
+from sitemapgen.utils.visited_set import IVisitedSet, FingerprintSet
 
 
 logger = logging.getLogger(__name__)
@@ -26,94 +32,492 @@ class PageInfo:
     title: str
     html: str
     links: list[str]
+    etag: typing.Optional[str] = None
+    last_modified: typing.Optional[str] = None
+    content_hash: typing.Optional[str] = None
+    is_modified: bool = True
+
+
+@dataclass
+class KnownPage:
+    """ The state of page saved by the previous crawl """
+    title: str
+    links: list[str]
+    etag: typing.Optional[str] = None
+    last_modified: typing.Optional[str] = None
+    content_hash: typing.Optional[str] = None
 
 
 class IPageParser(typing.Protocol):
-    def parse_html(self, raw_html: str) -> ParsePageResult:
+    def parse_html(
+        self, raw_html: typing.Union[str, bytes], http_charset: typing.Optional[str] = None
+    ) -> ParsePageResult:
+        ...
+
+
+class ISaveQueue(typing.Protocol):
+    """ The queue of pages to save, asyncio.Queue or the memory-bounded PageSaveQueue """
+
+    def full(self) -> bool:
+        ...
+
+    def empty(self) -> bool:
+        ...
+
+    def qsize(self) -> int:
+        ...
+
+    async def put(self, page_info: PageInfo) -> None:
+        ...
+
+    def put_nowait(self, page_info: PageInfo) -> None:
         ...
 
+    async def get(self) -> PageInfo:
+        ...
+
+    def task_done(self) -> None:
+        ...
+
+
+class IKnownPages(typing.Protocol):
+    async def get(self, url: str) -> typing.Optional[KnownPage]:
+        ...
+
+
+class CrawlStatistics:
+    """ The class for tracking the crawl throughput """
+
+    def __init__(self) -> None:
+        self.pages_succeeded = 0
+        self.pages_failed = 0
+        self.pages_skipped = 0
+        self.pages_not_modified = 0
+        self.pages_unchanged = 0
+        self.urls_disallowed = 0
+        self.urls_from_sitemaps = 0
+        self._started_at = time.perf_counter()
+
+    @property
+    def pages_total(self) -> int:
+        return self.pages_succeeded + self.pages_failed + self.pages_skipped
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    @property
+    def pages_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.pages_total / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.pages_total} pages ({self.pages_failed} failed, {self.pages_skipped} skipped, "
+            f"{self.pages_not_modified} not modified, "
+            f"{self.pages_unchanged} unchanged) "
+            f"in {self.elapsed_seconds:.2f} s, "
+            f"{self.pages_per_second:.2f} pages/sec, "
+            f"{self.urls_from_sitemaps} URLs from sitemaps, {self.urls_disallowed} disallowed by robots.txt"
+        )
+
+
+class FrontierEntry(typing.NamedTuple):
+    depth: int
+    url: str
+
 
 class SiteMapGenerator:
     def __init__(
         self,
         http_link_fetcher: HttpLinkFetcher,
         page_parser: IPageParser,
-        on_save_queue: asyncio.Queue[PageInfo]
+        on_save_queue: ISaveQueue,
+        workers_count: int = 6,
+        streaming: bool = False,
+        visited_urls: typing.Optional[IVisitedSet] = None,
+        known_pages: typing.Optional[IKnownPages] = None,
+        parse_executor: typing.Optional[concurrent.futures.Executor] = None,
+        robots: typing.Optional[RobotsCache] = None,
+        seed_from_sitemaps: bool = False,
+        metrics: typing.Optional[MetricsRegistry] = None,
     ) -> None:
+        if workers_count < 1:
+            raise ValueError(f"The workers count must be positive: {workers_count}")
+
         self._link_fetcher = http_link_fetcher
         self._page_parser = page_parser
         self._on_save_queue = on_save_queue
+        self._workers_count = workers_count
+        self._streaming = streaming
+        self._known_pages = known_pages
+        self._parse_executor = parse_executor
+        self._robots = robots
+        self._seed_from_sitemaps = seed_from_sitemaps
+
+        if seed_from_sitemaps and robots is None:
+            raise ValueError("The robots.txt cache is required to seed from sitemaps")
+
+        self._visited_urls: IVisitedSet = visited_urls if visited_urls is not None else FingerprintSet()
+        self.statistics = CrawlStatistics()
+        self._url_canonicalizer = UrlCanonicalizer(base_url_host="")
+
+        self._frontier: typing.Optional[asyncio.Queue[FrontierEntry]] = None
+        self._in_flight: set[FrontierEntry] = set()
+        self._next_level_depth = 0
+        self._next_level_urls: list[str] = []
+
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        self._parse_seconds = metrics.histogram(
+            "sitemapgen_parse_seconds", "The time of parsing the page, with the wait for the parse worker"
+        )
+        self._save_wait_seconds = metrics.histogram(
+            "sitemapgen_save_wait_seconds", "The time of waiting for the room in the full save queue"
+        )
+        self._canonicalize_seconds = metrics.histogram(
+            "sitemapgen_canonicalize_seconds", "The time of resolving and canonicalizing the links of page"
+        )
+        metrics.gauge("sitemapgen_pages_crawled", "The count of processed pages", lambda: self.statistics.pages_total)
+        metrics.gauge(
+            "sitemapgen_frontier_size",
+            "The count of URLs waiting in the frontier",
+            lambda: self._frontier.qsize() if self._frontier is not None else 0,
+        )
+
+    async def generate_map(
+        self, url: str, depth: int, resumed_frontier: typing.Optional[list[FrontierEntry]] = None
+    ):
+        """ Crawl the site from the URL, or continue the crawl from the frontier of checkpoint """
+        url = await self.start_crawl(url)
+
+        if resumed_frontier is None:
+            self._visited_urls.add(url)
+            entries = [FrontierEntry(depth=1, url=url)] if await self.is_seed_allowed(url) else []
+        else:
+            entries = [entry for entry in resumed_frontier if entry.depth <= depth]
+            logger.info(f"Resume the crawl: {len(entries)} URLs in the frontier, {len(self._visited_urls)} visited")
+
+        seeds = self.iter_sitemap_seeds(url=url) if self._seed_from_sitemaps else None
+
+        if self._streaming:
+            await self.crawl_streaming(entries=entries, depth=depth, seeds=seeds)
+        else:
+            await self.crawl_per_depth(entries=entries, depth=depth, seeds=seeds)
 
-        self._memory_cache: set[str] = set()
+        logger.info(f"Processing is complete: {self.statistics}")
+        logger.info(f"Visited URLs: {self._visited_urls}")
+        logger.info(f"Resolved links: {self._url_canonicalizer}")
 
-    async def generate_map(self, url: str, depth: int):
+    async def start_crawl(self, url: str) -> str:
+        """ Reset the statistics and set up the link filtering for the site of URL, return the canonical URL """
         url_ = yarl.URL(url)
 
         if not url_.is_absolute():
             raise ValueError(f"The input URL is not absolute: {url}")
 
-        next_urls = [url]
+        self.statistics = CrawlStatistics()
+        self._url_canonicalizer = UrlCanonicalizer(base_url_host=url_.host)
 
-        for depth_i in range(depth):
-            logger.debug(f"Processing depth {depth_i + 1}...")
-            next_urls = await self.get_urls_of(urls=next_urls, init_url_host=url_.host)
+        if self._robots is not None:
+            await self._robots.get(url)  # Crawl-delay is applied before the first request to the site
 
-        logger.info("Processing is complete")
+        return canonicalize_url(url_)
 
-    async def get_urls_of(self, urls: list[str], init_url_host: str) -> list[str]:
-        if not urls:
-            return []
+    async def is_seed_allowed(self, url: str) -> bool:
+        """ Check the seed URL by robots.txt like the links found on pages """
+        if self._robots is None or await self._robots.is_allowed(url):
+            return True
 
-        page_info_list: list[typing.Union[BaseException, PageInfo]] = await asyncio.gather(  # type: ignore
-            *(self.get_page_result(url=url) for url in urls), return_exceptions=True
-        )
+        logger.warning(f"The URL is disallowed by robots.txt, it is not fetched: {url}")
+        self.statistics.urls_disallowed += 1
+        return False
 
-        next_urls = []
-        for index, page_info in enumerate(page_info_list):
-            page_url = urls[index]
-            page_base_url = get_base_url(page_url)
+    async def process_entries(
+        self, entries: list[FrontierEntry], on_links: typing.Callable[[FrontierEntry, list[str]], None]
+    ) -> None:
+        """ Process the entries concurrently, the new links found on every entry are passed to on_links """
+        frontier: asyncio.Queue[FrontierEntry] = asyncio.Queue()
+        for entry in entries:
+            frontier.put_nowait(entry)
+
+        await self._drain_frontier(frontier=frontier, on_links=on_links, workers_count=len(entries))
+
+    def get_frontier_snapshot(self) -> list[FrontierEntry]:
+        """
+        The entries to process on resume: queued, being processed and found for the next depth level.
+
+        The entries being processed are fetched again on resume, the links found on them
+        are already in the snapshot, as the links are marked as visited and put to the frontier at once.
+        """
+        entries = list(self._in_flight)
+        if self._frontier is not None:
+            entries.extend(self._frontier._queue)  # asyncio.Queue has no public way to look at the items
+        entries.extend(FrontierEntry(depth=self._next_level_depth, url=url) for url in self._next_level_urls)
+        return entries
+
+    async def crawl_per_depth(
+        self, entries: list[FrontierEntry], depth: int, seeds: typing.Optional[typing.AsyncIterator[str]] = None
+    ) -> None:
+        """ Process the URLs level by level, the level N + 1 is started when every page of the level N is processed """
+        if not entries and seeds is None:
+            return
 
-            if isinstance(page_info, BaseException):
-                logger.error(f"An error occurred during fetch '{page_url}': {str(page_info)}", exc_info=page_info)
-                await self.save_page(PageInfo(url=page_url, title=f"[ERROR]: {page_info!s}", html="", links=[]))
-                continue
+        current_depth = min((entry.depth for entry in entries), default=1)
+        urls = [entry.url for entry in entries if entry.depth == current_depth]
+        next_urls = [entry.url for entry in entries if entry.depth > current_depth]
 
-            links = []
-            for link in page_info.links:
-                if is_url_reference_to_html_element(link) is True:
-                    logger.debug(f"Skip reference to HTML element: {link}")
-                    continue
+        while current_depth <= depth:
+            logger.debug(f"Processing depth {current_depth}...")
+            urls = await self.get_urls_of(urls=urls, depth=current_depth, next_urls=next_urls, seeds=seeds)
+            logger.info(f"Depth {current_depth} is processed: {self.statistics}")
 
-                if is_url_relative(link) is True:
-                    link = convert_relative_url_to_absolute(url=link, base_url=page_base_url)
+            current_depth += 1
+            next_urls, seeds = [], None
 
-                if is_url_scheme_is_http(link) is False:
-                    logger.debug(f"Skip not HTTP URL: {link}")
-                    continue
+    async def get_urls_of(
+        self,
+        urls: list[str],
+        depth: int = 1,
+        next_urls: typing.Optional[list[str]] = None,
+        seeds: typing.Optional[typing.AsyncIterator[str]] = None,
+    ) -> list[str]:
+        """ Process the URLs of one depth level and the seeds added to it, return the links found on them """
+        if not urls and seeds is None:
+            return next_urls or []
+
+        frontier: asyncio.Queue[FrontierEntry] = asyncio.Queue()
+        for url in urls:
+            frontier.put_nowait(FrontierEntry(depth=depth, url=url))
+
+        self._next_level_depth = depth + 1
+        self._next_level_urls = next_urls if next_urls is not None else []
+
+        def on_links(_: FrontierEntry, links: list[str]) -> None:
+            self._next_level_urls.extend(links)
+
+        await self._drain_frontier(
+            frontier=frontier,
+            on_links=on_links,
+            workers_count=None if seeds is not None else len(urls),
+            seeds=seeds,
+            seeds_depth=depth,
+        )
+        return self._next_level_urls
+
+    async def crawl_streaming(
+        self, entries: list[FrontierEntry], depth: int, seeds: typing.Optional[typing.AsyncIterator[str]] = None
+    ) -> None:
+        """
+        Process the URLs without the barrier between depth levels.
+
+        Every frontier entry carries its own depth, and the priority queue always hands out
+        the shallowest entry first, so the order stays BFS-like while the links of depth N + 1
+        are fetched together with the stragglers of depth N.
+        """
+        frontier: asyncio.PriorityQueue[FrontierEntry] = asyncio.PriorityQueue()
+        for entry in entries:
+            frontier.put_nowait(entry)
+
+        def on_links(entry: FrontierEntry, links: list[str]) -> None:
+            if entry.depth >= depth:
+                return
+            for link in links:
+                frontier.put_nowait(FrontierEntry(depth=entry.depth + 1, url=link))
+
+        await self._drain_frontier(frontier=frontier, on_links=on_links, seeds=seeds)
+
+    async def iter_sitemap_seeds(self, url: str) -> typing.AsyncIterator[str]:
+        """ Yield the new internal URLs of the sitemaps listed in robots.txt of the site """
+        for sitemap_url in await self._robots.get_sitemap_urls(url):
+            logger.info(f"Seeding from the sitemap: {sitemap_url}")
+            try:
+                async for sitemap_link in iter_sitemap_urls(link_fetcher=self._link_fetcher, sitemap_url=sitemap_url):
+                    resolved_link = self._url_canonicalizer.resolve(page_url=sitemap_url, link=sitemap_link)
+                    if resolved_link.kind is not LinkKind.INTERNAL:
+                        continue
+                    if not await self._filter_new_links([resolved_link.url]):
+                        continue
+
+                    self.statistics.urls_from_sitemaps += 1
+                    yield resolved_link.url
+            except Exception as e:
+                logger.warning(f"An error occurred during reading the sitemap '{sitemap_url}': {e!s}")
+
+    async def _drain_frontier(
+        self,
+        frontier: asyncio.Queue[FrontierEntry],
+        on_links: typing.Callable[[FrontierEntry, list[str]], None],
+        workers_count: typing.Optional[int] = None,
+        seeds: typing.Optional[typing.AsyncIterator[str]] = None,
+        seeds_depth: int = 1,
+    ) -> None:
+        """
+        Process the frontier by the workers until it is empty.
+
+        The seeds are put to the frontier while they are read, the frontier is not joined
+        before the last of them, so the workers start without waiting for all seeds.
+        """
+        self._frontier = frontier
+        workers_count = min(self._workers_count, workers_count or self._workers_count)
+        workers = [
+            asyncio.create_task(self._run_worker(frontier=frontier, on_links=on_links))
+            for _ in range(workers_count)
+        ]
+
+        try:
+            if seeds is not None:
+                async for seed_url in seeds:
+                    await frontier.put(FrontierEntry(depth=seeds_depth, url=seed_url))
+
+            await frontier.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _run_worker(
+        self,
+        frontier: asyncio.Queue[FrontierEntry],
+        on_links: typing.Callable[[FrontierEntry, list[str]], None],
+    ) -> None:
+        while True:
+            entry = await frontier.get()
+            self._in_flight.add(entry)
+            try:
+                on_links(entry, await self.process_url(page_url=entry.url))
+            except Exception as e:
+                logger.exception(f"Unexpected error during processing '{entry.url}': {e!s}")
+            finally:
+                frontier.task_done()
+
+            # The entry interrupted by the cancellation stays in the checkpoint to be fetched on resume
+            self._in_flight.discard(entry)
+
+    async def process_url(self, page_url: str) -> list[str]:
+        try:
+            page_info = await self.get_page_result(url=page_url)
+        except PageSkippedError as e:
+            logger.info(f"Skip '{page_url}': {e!s}")
+            self.statistics.pages_skipped += 1
+            await self.save_page(PageInfo(url=page_url, title=f"[SKIPPED]: {e!s}", html="", links=[]))
+            return []
+        except Exception as e:
+            logger.error(f"An error occurred during fetch '{page_url}': {e!s}", exc_info=e)
+            self.statistics.pages_failed += 1
+            await self.save_page(PageInfo(url=page_url, title=f"[ERROR]: {e!s}", html="", links=[]))
+            return []
+
+        links = {}
+        with self._canonicalize_seconds.time():
+            for link in page_info.links:
+                resolved_link = self._url_canonicalizer.resolve(page_url=page_url, link=link)
 
-                if not is_url_internal(url=link, base_url_host=init_url_host):
+                if resolved_link.kind is not LinkKind.INTERNAL:
                     # TODO: --allow_external
-                    logger.debug(f"Skip external URL: {link}")
+                    logger.debug(f"Skip {resolved_link.kind.value} URL: {link}")
                     continue
 
-                if link in self._memory_cache:
-                    logger.debug(f"Skip cached URL: {link}")
+                links[resolved_link.url] = None
 
-                links.append(link)
+        page_info.links = list(links)
+        self.statistics.pages_succeeded += 1
+        await self.save_page(page_info=page_info)
 
-            page_info.links = links
-            await self.save_page(page_info=page_info)
-            next_urls += links
+        logger.info(f"Success: {page_url}")
+        return await self._filter_new_links(page_info.links)
 
-            logger.info(f"Success: {page_url}")
+    async def _filter_new_links(self, links: list[str]) -> list[str]:
+        """
+        Return the links to fetch: not visited and allowed by robots.txt, they are marked as visited.
 
-        return next_urls
+        robots.txt is checked for every link before the first of them is marked, so nothing else runs between
+        marking the links and putting them to the frontier, and a checkpoint never has a visited URL
+        which is neither saved nor in the frontier.
+        """
+        allowed_links = {}
+        for link in links:
+            if link in self._visited_urls:
+                logger.debug(f"Skip visited URL: {link}")
+                continue
+
+            allowed_links[link] = self._robots is None or await self._robots.is_allowed(link)
+
+        new_links = []
+        for link, is_allowed in allowed_links.items():
+            if not self._visited_urls.add(link):
+                logger.debug(f"Skip visited URL: {link}")
+            elif not is_allowed:
+                logger.debug(f"Skip URL disallowed by robots.txt: {link}")
+                self.statistics.urls_disallowed += 1
+            else:
+                new_links.append(link)
+
+        return new_links
 
     async def get_page_result(self, url: str) -> PageInfo:
-        page_html = await self._link_fetcher.get_html(url=url)
-        parse_info = self._page_parser.parse_html(raw_html=page_html)
-        return PageInfo(url=url, title=parse_info.title, html=page_html, links=parse_info.links)
+        known_page = None
+        if self._known_pages is not None:
+            known_page = await self._known_pages.get(url)
+
+        if known_page is None:
+            fetched_page = await self._link_fetcher.get_page(url=url)
+        else:
+            fetched_page = await self._link_fetcher.get_page(
+                url=url, etag=known_page.etag, last_modified=known_page.last_modified
+            )
+            if fetched_page.is_not_modified:
+                self.statistics.pages_not_modified += 1
+                return PageInfo(url=url, title=known_page.title, html="", links=known_page.links, is_modified=False)
+
+        # The body is hashed and parsed as bytes, its encoding is detected by BOM, Content-Type or <meta charset>
+        page_body = fetched_page.body or b""
+        content_hash = get_content_hash(page_body)
+
+        if known_page is not None and known_page.content_hash == content_hash:
+            self.statistics.pages_unchanged += 1
+            is_modified = (known_page.etag, known_page.last_modified) != (fetched_page.etag, fetched_page.last_modified)
+            return PageInfo(
+                url=url,
+                title=known_page.title,
+                # The unchanged page is saved only for its new validators, it is not decoded otherwise
+                html=decode_html(page_body, http_charset=fetched_page.charset) if is_modified else "",
+                links=known_page.links,
+                etag=fetched_page.etag,
+                last_modified=fetched_page.last_modified,
+                content_hash=content_hash,
+                is_modified=is_modified,
+            )
+
+        parse_info = await self.parse_page(raw_html=page_body, http_charset=fetched_page.charset)
+        return PageInfo(
+            url=url,
+            title=parse_info.title,
+            html=decode_html(page_body, http_charset=fetched_page.charset),
+            links=parse_info.links,
+            etag=fetched_page.etag,
+            last_modified=fetched_page.last_modified,
+            content_hash=content_hash,
+        )
+
+    async def parse_page(self, raw_html: bytes, http_charset: typing.Optional[str] = None) -> ParsePageResult:
+        """ Parse the page inline or in the executor, only the raw bytes and the compact result cross the process """
+        with self._parse_seconds.time():
+            if self._parse_executor is None:
+                return self._page_parser.parse_html(raw_html=raw_html, http_charset=http_charset)
+
+            return await asyncio.get_running_loop().run_in_executor(
+                self._parse_executor, self._page_parser.parse_html, raw_html, http_charset
+            )
 
     async def save_page(self, page_info: PageInfo):
-        self._memory_cache.add(page_info.url)
-        await asyncio.wait_for(self._on_save_queue.put(page_info), 120)
+        if not page_info.is_modified:
+            logger.debug(f"Skip saving not modified page: {page_info.url}")
+            return
+
+        if not self._on_save_queue.full():
+            self._on_save_queue.put_nowait(page_info)
+            return
+
+        # The queue is full while the pages are saved slower than crawled, the worker waits for the room
+        with self._save_wait_seconds.time():
+            await self._on_save_queue.put(page_info)
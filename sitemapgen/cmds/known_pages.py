@@ -0,0 +1,36 @@
+import asyncio
+import typing
+
+import yarl
+
+from sitemapgen.cmds.generate_map import KnownPage
+from sitemapgen.db.api_client import DatabaseApiClient
+
+
+class DbKnownPages:
+    """
+    The class for getting the pages saved by the previous crawls.
+
+    Every page is selected by the unique key of site and path when it is crawled, so the memory does not grow
+    with the site size, and only the page is selected, not the pages of site which are not reached by the crawl.
+    """
+
+    def __init__(self, db_client: DatabaseApiClient) -> None:
+        self._db = db_client
+
+    async def get(self, url: str) -> typing.Optional[KnownPage]:
+        url_ = yarl.URL(url)
+        site_key = (url_.scheme, url_.host, url_.port)
+
+        row = await asyncio.get_running_loop().run_in_executor(None, self._db.select_known_page, site_key, url_.path)
+        # The [ERROR] / [SKIPPED] rows of failed and skipped URLs have no links, their pages are fetched again
+        if row is None or row.links is None:
+            return None
+
+        return KnownPage(
+            title=row.title or "",
+            links=row.links,
+            etag=row.etag,
+            last_modified=row.last_modified,
+            content_hash=row.content_hash,
+        )
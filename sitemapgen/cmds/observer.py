@@ -1,19 +1,42 @@
 import logging
 import typing
 
-from sqlalchemy.orm import Query
+import sqlalchemy
+import sqlalchemy.orm
+import yarl
 
-from sitemapgen.db.api_client import DatabaseApiClient, DbTablePage, DbTableSite
+from sitemapgen.db.api_client import (
+    URL_PATH_PREFIX_LENGTH, DatabaseApiClient, DbTablePage, DbTablePageLink, DbTableSite
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+class ObservedPage(typing.NamedTuple):
+    scheme: str
+    hostname: str
+    port: typing.Optional[int]
+    url_path: str
+    title: typing.Optional[str]
+
+    @property
+    def url(self) -> str:
+        return str(yarl.URL.build(scheme=self.scheme, host=self.hostname, port=self.port, path=self.url_path))
+
+
 class Observer:
-    """ The class for representing the received data """
+    """
+    The class for representing the received data.
 
-    def __init__(self, db_client: DatabaseApiClient) -> None:
+    The pages are read by keyset pagination over the (ref_site_id, url_path prefix) index, and each page of results
+    is streamed from the server cursor, so any count of pages is shown in constant memory.
+    """
+
+    def __init__(self, db_client: DatabaseApiClient, page_size: int = 10_000, yield_per: int = 1_000) -> None:
         self._db = db_client
+        self._page_size = page_size
+        self._yield_per = yield_per
 
     def get_related_to_host_links(
         self,
@@ -21,21 +44,106 @@ class Observer:
         hostname: str,
         port: typing.Optional[int],
         limit: int
-    ) -> list[DbTablePage]:
+    ) -> typing.Iterator[ObservedPage]:
+        """ Yield the pages of the host and its subdomains ordered by site and path, the limit 0 means no limit """
+        hostname = hostname.lower()
         query_site_criterion = [
             DbTableSite.scheme == scheme,
-            DbTableSite.hostname.contains(hostname)
+            sqlalchemy.or_(
+                DbTableSite.hostname == hostname,
+                sqlalchemy.func.reverse(DbTableSite.hostname).startswith(f".{hostname}"[::-1], autoescape=True),
+            ),
         ]
         if port is not None:
             query_site_criterion.append(DbTableSite.port == port)
 
-        query: Query = (
-            self._db.session.query(DbTablePage)
-                .join(DbTableSite.ref_pages)
-                .filter(*query_site_criterion)
-                .order_by(DbTableSite.id, DbTablePage.url_path)
-                .limit(limit)
+        # The path is compared last, the order of the index by path prefix is only refined by it
+        page_key = (
+            DbTablePage.ref_site_id,
+            sqlalchemy.func.left(DbTablePage.url_path, URL_PATH_PREFIX_LENGTH),
+            DbTablePage.url_path,
         )
-        return [
-            result[0] for result in self._db.session.execute(query)
-        ]
+        query = (
+            sqlalchemy.select(
+                DbTableSite.scheme, DbTableSite.hostname, DbTableSite.port,
+                DbTablePage.url_path, DbTablePage.title,
+                DbTablePage.ref_site_id,
+            )
+            .join(DbTableSite.ref_pages)
+            .where(*query_site_criterion)
+            .order_by(*page_key)
+        )
+
+        rows_count = 0
+        last_key = None
+        while True:
+            page_size = self._page_size if not limit else min(self._page_size, limit - rows_count)
+            if page_size <= 0:
+                return
+
+            page_query = query.limit(page_size)
+            if last_key is not None:
+                page_query = page_query.where(
+                    sqlalchemy.tuple_(*page_key) > sqlalchemy.tuple_(*last_key)
+                )
+
+            page_rows_count = 0
+            with self._db.connect() as connection:
+                rows = connection.execution_options(yield_per=self._yield_per).execute(page_query)
+                for scheme_, hostname_, port_, url_path, title, ref_site_id in rows:
+                    page_rows_count += 1
+                    last_key = (ref_site_id, url_path[:URL_PATH_PREFIX_LENGTH], url_path)
+                    yield ObservedPage(scheme=scheme_, hostname=hostname_, port=port_, url_path=url_path, title=title)
+
+            rows_count += page_rows_count
+            if page_rows_count < page_size:
+                return
+
+    def get_linked_pages(
+        self,
+        scheme: str,
+        hostname: str,
+        port: typing.Optional[int],
+        url_path: str,
+        limit: int
+    ) -> typing.Iterator[ObservedPage]:
+        """
+        Yield the URLs linked from the saved page by the edges of link graph, the limit 0 means no limit.
+
+        The title is None for the URLs which are not saved yet.
+        """
+        source_site = sqlalchemy.orm.aliased(DbTableSite)
+        source_page = sqlalchemy.orm.aliased(DbTablePage)
+        query = (
+            sqlalchemy.select(
+                DbTableSite.scheme, DbTableSite.hostname, DbTableSite.port,
+                DbTablePageLink.target_url_path, DbTablePage.title,
+            )
+            .select_from(source_site)
+            .join(source_page, source_page.ref_site_id == source_site.id)
+            .join(DbTablePageLink, DbTablePageLink.source_page_id == source_page.id)
+            .join(DbTableSite, DbTableSite.id == DbTablePageLink.target_site_id)
+            .outerjoin(
+                DbTablePage,
+                sqlalchemy.and_(
+                    DbTablePage.ref_site_id == DbTablePageLink.target_site_id,
+                    sqlalchemy.func.md5(DbTablePage.url_path) == sqlalchemy.func.md5(DbTablePageLink.target_url_path),
+                    DbTablePage.url_path == DbTablePageLink.target_url_path,
+                )
+            )
+            .where(
+                source_site.scheme == scheme,
+                source_site.hostname == hostname.lower(),
+                source_site.port == port,
+                sqlalchemy.func.md5(source_page.url_path) == sqlalchemy.func.md5(url_path),
+                source_page.url_path == url_path,
+            )
+            .order_by(DbTablePageLink.target_site_id, DbTablePageLink.target_url_path)
+        )
+        if limit:
+            query = query.limit(limit)
+
+        with self._db.connect() as connection:
+            rows = connection.execution_options(yield_per=self._yield_per).execute(query)
+            for scheme_, hostname_, port_, url_path_, title in rows:
+                yield ObservedPage(scheme=scheme_, hostname=hostname_, port=port_, url_path=url_path_, title=title)
@@ -0,0 +1,291 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import itertools
+import logging
+import time
+import typing
+
+import backoff
+import sqlalchemy.exc
+import yarl
+
+from sitemapgen.cmds.generate_map import PageInfo, ISaveQueue
+from sitemapgen.db.api_client import DatabaseApiClient, SiteKey, is_database_unavailable, is_rows_rejected
+from sitemapgen.db.html_storage import HtmlStorage, ensure_html_storage_available, get_content_hash, compress_html
+from sitemapgen.db.site_cache import SiteIdCache
+from sitemapgen.utils.metrics import MetricsRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriterStatistics:
+    """ The class for tracking the flushes of the page writer """
+
+    def __init__(self) -> None:
+        self.flushes_count = 0
+        self.rows_count = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_size = 0
+        self.last_flush_seconds = 0.0
+        self.html_raw_bytes = 0
+        self.html_stored_bytes = 0
+        self.html_deduplicated_count = 0
+        self.pages_rejected = 0
+
+    def track_flush(self, rows_count: int, seconds: float) -> None:
+        self.flushes_count += 1
+        self.rows_count += rows_count
+        self.flush_seconds_total += seconds
+        self.last_flush_size = rows_count
+        self.last_flush_seconds = seconds
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_count / self.flush_seconds_total if self.flush_seconds_total > 0 else 0.0
+
+    @property
+    def html_megabytes_per_second(self) -> float:
+        return self.html_raw_bytes / 2 ** 20 / self.flush_seconds_total if self.flush_seconds_total > 0 else 0.0
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.html_raw_bytes / self.html_stored_bytes if self.html_stored_bytes else 1.0
+
+    @property
+    def average_flush_size(self) -> float:
+        return self.rows_count / self.flushes_count if self.flushes_count else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows_count} rows in {self.flushes_count} flushes "
+            f"(average size {self.average_flush_size:.1f}, {self.flush_seconds_total:.2f} s), "
+            f"{self.rows_per_second:.2f} rows/sec, {self.html_megabytes_per_second:.2f} MiB/sec of HTML, "
+            f"compression ratio {self.compression_ratio:.2f} ({self.html_deduplicated_count} duplicates), "
+            f"{self.pages_rejected} pages rejected"
+        )
+
+
+class PageBatchWriter:
+    """
+    The class for saving the crawled pages to database in batches.
+
+    The blocking database calls are made in the dedicated writer thread,
+    so a slow database does not freeze the fetching and parsing on the event loop.
+
+    The batch is never dropped as a whole: the flush is retried while the database is unavailable and
+    the writer fails when it stays unavailable (the batch is kept as the pending pages of checkpoint),
+    the batch rejected by database is split to save the rest of pages and to skip the rejected ones.
+    """
+
+    def __init__(
+        self,
+        db_client: DatabaseApiClient,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        html_storage: HtmlStorage = HtmlStorage.INLINE,
+        bulk_copy: bool = False,
+        metrics: typing.Optional[MetricsRegistry] = None,
+        stored_blob_hashes_limit: int = 2 ** 17,
+        flush_max_tries: int = 8,
+        flush_retry_delay: float = 1.0,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError(f"The batch size must be positive: {batch_size}")
+        ensure_html_storage_available(html_storage)
+
+        self._db = db_client
+        self._site_ids = SiteIdCache(db_client=db_client)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._html_storage = html_storage
+        self._save_pages = db_client.copy_pages if bulk_copy else db_client.upsert_pages
+        # The hint of saved blobs to skip them in the next batches, the evicted ones are inserted again and ignored
+        self._stored_blob_hashes: collections.OrderedDict[str, None] = collections.OrderedDict()
+        self._stored_blob_hashes_limit = stored_blob_hashes_limit
+        self._batch: list[PageInfo] = []
+        self._saved_event = asyncio.Event()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-writer")
+        self._flush_with_retries = backoff.on_exception(
+            wait_gen=backoff.expo,
+            exception=sqlalchemy.exc.DBAPIError,
+            giveup=lambda e: not is_database_unavailable(e),
+            max_tries=flush_max_tries,
+            jitter=backoff.full_jitter,
+            logger=None,
+            on_backoff=lambda details: logger.warning(
+                f"The database is unavailable, the flush of {len(details['args'][0])} pages "
+                f"is retried in {details['wait']:.1f} s"
+            ),
+            factor=flush_retry_delay,
+        )(self.flush_async)
+
+        self.statistics = WriterStatistics()
+        # The count of pages taken from the queue and saved or rejected, they are taken in the order of queue
+        self.saved_count = 0
+
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        self._flush_seconds = metrics.histogram(
+            "sitemapgen_db_flush_seconds", "The time of saving a batch of pages in the writer thread"
+        )
+        self._flushed_rows_total = metrics.counter("sitemapgen_db_flushed_rows_total", "The count of saved pages")
+        self._rejected_pages_total = metrics.counter(
+            "sitemapgen_db_rejected_pages_total", "The count of pages rejected by database and not saved"
+        )
+
+    async def run(self, page_queue: ISaveQueue, stop_event: asyncio.Event) -> None:
+        """ Consume the queue until the stop event is set and the queue is drained """
+        self._batch = []
+        flush_deadline = time.monotonic() + self._flush_interval
+
+        while True:
+            timeout = max(flush_deadline - time.monotonic(), 0)
+            try:
+                self._batch.append(await asyncio.wait_for(page_queue.get(), timeout))
+                page_queue.task_done()
+            except asyncio.TimeoutError:
+                pass
+
+            is_stopping = stop_event.is_set() and page_queue.empty()
+            if len(self._batch) >= self._batch_size or time.monotonic() >= flush_deadline or is_stopping:
+                if self._batch:
+                    await self.save_batch(self._batch)
+                    self.saved_count += len(self._batch)
+                    self._saved_event.set()
+                    self._batch = []
+                flush_deadline = time.monotonic() + self._flush_interval
+
+            if is_stopping:
+                self._executor.shutdown(wait=True)
+                logger.info(f"Pages are saved: {self.statistics}")
+                return
+
+    async def wait_saved(self, pages_count: int) -> None:
+        """ Wait until the first pages_count pages of the queue are saved (or rejected by database) """
+        while self.saved_count < pages_count:
+            self._saved_event.clear()
+            await self._saved_event.wait()
+
+    @property
+    def pending_pages(self) -> list[PageInfo]:
+        """ The pages taken from the queue which are not saved yet """
+        return list(self._batch)
+
+    async def save_batch(self, batch: list[PageInfo]) -> None:
+        """
+        Flush the batch with retries, the error of unavailable database is raised after the last try.
+        The batch rejected by database is split in halves until the rejected pages are found and skipped.
+        """
+        try:
+            await self._flush_with_retries(batch)
+        except sqlalchemy.exc.DBAPIError as e:
+            if not is_rows_rejected(e):
+                raise
+
+            if len(batch) == 1:
+                self.statistics.pages_rejected += 1
+                self._rejected_pages_total.inc()
+                logger.error(f"The page is rejected by database, it is not saved: {batch[0].url}: {e.orig!s}")
+                return
+
+            logger.debug(f"The batch of {len(batch)} pages is rejected by database, it is split: {e.orig!s}")
+            middle = len(batch) // 2
+            await self.save_batch(batch[:middle])
+            await self.save_batch(batch[middle:])
+
+    async def flush_async(self, batch: list[PageInfo]) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.flush, batch)
+
+    def flush(self, batch: list[PageInfo]) -> None:
+        started_at = time.perf_counter()
+
+        rows_by_key: dict[tuple[SiteKey, str], dict[str, typing.Any]] = {}
+        for page_info in batch:
+            page_key = _get_page_key(page_info.url)
+            # The last version of page wins, the statement can not update the same row twice
+            rows_by_key[page_key] = {
+                "url_path": page_key[1],
+                "title": page_info.title,
+                "html": page_info.html,
+                "html_blob_hash": None,
+                "content_hash": page_info.content_hash,
+                "links": page_info.links,
+                "etag": page_info.etag,
+                "last_modified": page_info.last_modified,
+            }
+
+        blob_rows = []
+        batch_blob_hashes: set[str] = set()
+        for row in rows_by_key.values():
+            raw_html = row["html"].encode("utf-8")
+            self.statistics.html_raw_bytes += len(raw_html)
+
+            if self._html_storage == HtmlStorage.INLINE:
+                self.statistics.html_stored_bytes += len(raw_html)
+                continue
+
+            row["html"] = None
+            row["html_blob_hash"] = content_hash = row["content_hash"] or get_content_hash(raw_html)
+            if content_hash in self._stored_blob_hashes or content_hash in batch_blob_hashes:
+                self.statistics.html_deduplicated_count += 1
+                if content_hash in self._stored_blob_hashes:
+                    self._stored_blob_hashes.move_to_end(content_hash)
+                continue
+
+            compressed_html = compress_html(raw_html, storage=self._html_storage)
+            blob_rows.append({
+                "content_hash": content_hash,
+                "compression": self._html_storage.value,
+                "raw_size": len(raw_html),
+                "data": compressed_html,
+            })
+            batch_blob_hashes.add(content_hash)
+            self.statistics.html_stored_bytes += len(compressed_html)
+
+        target_keys_by_page = {
+            page_key: [_get_page_key(link) for link in row["links"]]
+            for page_key, row in rows_by_key.items()
+        }
+        site_ids = self._site_ids.get_site_ids(
+            itertools.chain(
+                (site_key for site_key, _ in rows_by_key),
+                (site_key for target_keys in target_keys_by_page.values() for site_key, _ in target_keys),
+            )
+        )
+        rows = [
+            {**row, "ref_site_id": site_ids[site_key]}
+            for (site_key, _), row in rows_by_key.items()
+        ]
+        page_links = {
+            (site_ids[site_key], url_path): [
+                (site_ids[target_site_key], target_url_path) for target_site_key, target_url_path in target_keys
+            ]
+            for (site_key, url_path), target_keys in target_keys_by_page.items()
+        }
+        self._save_pages(rows, blob_rows=blob_rows, page_links=page_links)
+        # The blobs are remembered only when they are committed, the failed batch is flushed again with its blobs
+        self._remember_blob_hashes(blob_row["content_hash"] for blob_row in blob_rows)
+
+        flush_seconds = time.perf_counter() - started_at
+        self.statistics.track_flush(rows_count=len(rows), seconds=flush_seconds)
+        self._flush_seconds.observe(flush_seconds)
+        self._flushed_rows_total.inc(len(rows))
+        logger.debug(
+            f"Flushed {self.statistics.last_flush_size} pages in {self.statistics.last_flush_seconds:.3f} s "
+            f"({self.statistics.rows_per_second:.2f} rows/sec)"
+        )
+
+    def _remember_blob_hashes(self, content_hashes: typing.Iterable[str]) -> None:
+        for content_hash in content_hashes:
+            self._stored_blob_hashes[content_hash] = None
+
+        while len(self._stored_blob_hashes) > self._stored_blob_hashes_limit:
+            self._stored_blob_hashes.popitem(last=False)
+
+
+@functools.lru_cache(2 ** 16)
+def _get_page_key(url: str) -> tuple[SiteKey, str]:
+    url_ = yarl.URL(url)
+    return (url_.scheme, url_.host, url_.port), url_.path
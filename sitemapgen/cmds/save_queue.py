@@ -0,0 +1,270 @@
+import asyncio
+import collections
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import typing
+
+from sitemapgen.cmds.generate_map import PageInfo
+from sitemapgen.utils.metrics import MetricsRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class SaveQueueClosedError(Exception):
+    pass
+
+
+def get_page_size(page_info: PageInfo) -> int:
+    """ The estimated memory of page: its HTML, title and links, which are the most of it """
+    return (
+        sys.getsizeof(page_info.html)
+        + sys.getsizeof(page_info.title)
+        + sys.getsizeof(page_info.links)
+        + sum(map(sys.getsizeof, page_info.links))
+    )
+
+
+class SpilledPages:
+    """ The byte range of pickled pages in the spill file, the file is not truncated until the range is released """
+
+    def __init__(self, spill_file: typing.Optional["_SpillFile"], start: int, end: int, count: int) -> None:
+        self._spill_file = spill_file
+        self._start = start
+        self._end = end
+        self.count = count
+
+    def copy_to(self, f: typing.BinaryIO, chunk_size: int = 2 ** 20) -> None:
+        """ Copy the pickled pages without loading them, it may be called in a thread """
+        offset = self._start
+        while offset < self._end:
+            chunk = os.pread(self._spill_file.fileno(), min(chunk_size, self._end - offset), offset)
+            if not chunk:
+                raise EOFError(f"The spill file ends at {offset} before {self._end}")
+            f.write(chunk)
+            offset += len(chunk)
+
+    def release(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.release_snapshot()
+            self._spill_file = None
+
+
+class _SpillFile:
+    """ The pickled pages appended to the unlinked temporary file and read from its start """
+
+    def __init__(self, spill_dir: typing.Union[str, os.PathLike]) -> None:
+        self._file = tempfile.TemporaryFile(dir=spill_dir, prefix="sitemapgen-save-queue-")
+        self._read_offset = 0
+        self._snapshots_count = 0
+        self.count = 0
+
+    def append(self, page_info: PageInfo) -> None:
+        self._file.seek(0, os.SEEK_END)
+        pickle.dump(page_info, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def pop(self) -> PageInfo:
+        self._file.seek(self._read_offset)
+        page_info = pickle.load(self._file)
+        self._read_offset = self._file.tell()
+        self.count -= 1
+
+        if not self.count and not self._snapshots_count:
+            # The file is read to the end, it is reused from the start
+            self._file.truncate(0)
+            self._read_offset = 0
+
+        return page_info
+
+    def take_snapshot(self) -> SpilledPages:
+        self._file.flush()
+        self._snapshots_count += 1
+        return SpilledPages(self, start=self._read_offset, end=self._file.seek(0, os.SEEK_END), count=self.count)
+
+    def release_snapshot(self) -> None:
+        self._snapshots_count -= 1
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PageSaveQueue:
+    """
+    The queue of pages waiting to be saved, bounded by the memory of pages instead of their count.
+
+    The put of a page waits while the pages in memory take the budget, so the fetchers slow down to the pace
+    of database. A page is taken in at once while the queue is under budget, so one page larger than
+    the budget does not block the crawl forever.
+
+    With the spill directory the pages over budget are pickled to a temporary file there instead of waiting,
+    the put never blocks then. The pages are got in the order of put: once a page is spilled, the next ones
+    are spilled too until the file is read to the end. The file is read and written on the event loop,
+    it is unlinked at once and removed by close.
+
+    The closed queue fails the put at once, so the fetchers do not wait for the writer which is stopped.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int,
+        spill_dir: typing.Optional[typing.Union[str, os.PathLike]] = None,
+        metrics: typing.Optional[MetricsRegistry] = None,
+    ) -> None:
+        if max_memory_bytes < 1:
+            raise ValueError(f"The memory budget must be positive: {max_memory_bytes}")
+
+        self._max_memory_bytes = max_memory_bytes
+        self._pages: collections.deque[tuple[PageInfo, int]] = collections.deque()
+        self._memory_bytes = 0
+        self._spill_dir = spill_dir
+        self._spill_file: typing.Optional[_SpillFile] = None
+        self._unfinished_count = 0
+        self._is_closed = False
+        # The count of pages ever put, the pages are got in this order
+        self.put_count = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        metrics.gauge("sitemapgen_save_queue_depth", "The count of pages waiting to be saved", self.qsize)
+        metrics.gauge(
+            "sitemapgen_save_queue_memory_bytes", "The estimated memory of pages waiting to be saved",
+            lambda: self._memory_bytes,
+        )
+        metrics.gauge(
+            "sitemapgen_save_queue_spilled_pages", "The count of pages waiting to be saved on disk",
+            lambda: self.spilled_count,
+        )
+        self._spilled_pages_total = metrics.counter(
+            "sitemapgen_save_queue_spilled_pages_total", "The count of pages spilled to disk over the memory budget"
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    @property
+    def spilled_count(self) -> int:
+        return self._spill_file.count if self._spill_file is not None else 0
+
+    @property
+    def is_closed(self) -> bool:
+        return self._is_closed
+
+    def qsize(self) -> int:
+        return len(self._pages) + self.spilled_count
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
+    def full(self) -> bool:
+        return self._spill_dir is None and self._memory_bytes >= self._max_memory_bytes
+
+    async def put(self, page_info: PageInfo) -> None:
+        while self.full():
+            self._ensure_open()
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        self.put_nowait(page_info)
+
+    def put_nowait(self, page_info: PageInfo) -> None:
+        self._ensure_open()
+        if self.full():
+            raise asyncio.QueueFull
+        self._append(page_info)
+
+    def extend(self, pages: typing.Iterable[PageInfo]) -> None:
+        """
+        Put the pages regardless of the budget, e.g. the pending pages of checkpoint on resume.
+        The pages over budget are spilled with the spill directory, they are kept in memory otherwise.
+        """
+        self._ensure_open()
+        for page_info in pages:
+            self._append(page_info)
+
+    async def get(self) -> PageInfo:
+        while self.empty():
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        return self.get_nowait()
+
+    def get_nowait(self) -> PageInfo:
+        if self._pages:
+            page_info, page_size = self._pages.popleft()
+            self._memory_bytes -= page_size
+        elif self.spilled_count:
+            page_info = self._spill_file.pop()
+        else:
+            raise asyncio.QueueEmpty
+
+        if not self.full():
+            self._not_full.set()
+        return page_info
+
+    def task_done(self) -> None:
+        if self._unfinished_count <= 0:
+            raise ValueError("task_done() called too many times")
+
+        self._unfinished_count -= 1
+        if not self._unfinished_count:
+            self._all_done.set()
+
+    async def join(self) -> None:
+        await self._all_done.wait()
+
+    def get_memory_pages(self) -> list[PageInfo]:
+        """ The pages in memory, they are within the budget """
+        return [page_info for page_info, _ in self._pages]
+
+    def take_spilled_pages(self) -> SpilledPages:
+        """ The spilled pages to copy without loading them, the range must be released after the copy """
+        if self._spill_file is None:
+            return SpilledPages(None, start=0, end=0, count=0)
+        return self._spill_file.take_snapshot()
+
+    def close(self) -> None:
+        """ Fail the waiting and next puts and remove the spill file, the spilled pages are lost if not drained """
+        self._is_closed = True
+        self._not_full.set()
+
+        if self._spill_file is not None:
+            if self._spill_file.count:
+                logger.warning(f"{self._spill_file.count} spilled pages are not saved")
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _ensure_open(self) -> None:
+        if self._is_closed:
+            raise SaveQueueClosedError("The save queue is closed, the pages are not saved any more")
+
+    def _append(self, page_info: PageInfo) -> None:
+        is_in_memory = self._spill_dir is None or (
+            not self.spilled_count and self._memory_bytes < self._max_memory_bytes
+        )
+        if is_in_memory:
+            page_size = get_page_size(page_info)
+            self._pages.append((page_info, page_size))
+            self._memory_bytes += page_size
+        else:
+            if self._spill_file is None:
+                self._spill_file = _SpillFile(self._spill_dir)
+                logger.info(f"The save queue is over the memory budget, the pages spill to '{self._spill_dir}'")
+
+            self._spill_file.append(page_info)
+            self._spilled_pages_total.inc()
+
+        self.put_count += 1
+        self._unfinished_count += 1
+        self._all_done.clear()
+        self._not_empty.set()
@@ -0,0 +1,202 @@
+import datetime
+import email.utils
+import gzip
+import logging
+import os
+import pathlib
+import re
+import typing
+import xml.sax.saxutils
+
+import yarl
+
+from sitemapgen.db.api_client import DatabaseApiClient, SiteKey
+
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+MAX_SITEMAP_URLS = 50_000
+MAX_SITEMAP_SIZE = 50 * 2 ** 20  # the limit of uncompressed sitemap by the protocol
+SITEMAP_INDEX_NAME = "sitemap.xml"
+SITEMAP_NAME_PATTERN = re.compile(r"sitemap-\d+\.xml(\.gz)?")
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_HEADER = XML_DECLARATION + f'<urlset xmlns="{SITEMAP_NAMESPACE}">\n'.encode()
+URLSET_FOOTER = b"</urlset>\n"
+
+
+class SitemapFile(typing.NamedTuple):
+    name: str
+    urls_count: int
+    size: int
+    last_modified: typing.Optional[datetime.datetime]
+
+
+class _SitemapChunkWriter:
+    """ The sitemap file written entry by entry, it is full at the URL count or size limit of the protocol """
+
+    def __init__(self, path: pathlib.Path, compress: bool, max_urls: int, max_size: int) -> None:
+        self.path = path
+        self._file = gzip.open(path, "wb", compresslevel=6) if compress else open(path, "wb")
+        self._max_urls = max_urls
+        self._max_size = max_size
+
+        self.urls_count = 0
+        self.size = 0
+        self.last_modified: typing.Optional[datetime.datetime] = None
+
+        self._write(URLSET_HEADER)
+
+    def try_add(self, entry: bytes, last_modified: typing.Optional[datetime.datetime]) -> bool:
+        if self.urls_count >= self._max_urls or self.size + len(entry) + len(URLSET_FOOTER) > self._max_size:
+            return False
+
+        self._write(entry)
+        self.urls_count += 1
+        if last_modified is not None and (self.last_modified is None or last_modified > self.last_modified):
+            self.last_modified = last_modified
+        return True
+
+    def close(self) -> SitemapFile:
+        self._write(URLSET_FOOTER)
+        self._file.close()
+        return SitemapFile(
+            name=self.path.name, urls_count=self.urls_count, size=self.size, last_modified=self.last_modified
+        )
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.size += len(data)
+
+
+class SitemapExporter:
+    """
+    The class for writing the saved pages of site to the sitemaps protocol files.
+
+    The pages are streamed from the server-side cursor and written to the current sitemap file at once,
+    a new file is started at 50,000 URLs or 50 MiB of uncompressed XML. The sitemap index referring to
+    all files is written last, the URLs of files are built from the base URL where they are served.
+    """
+
+    def __init__(
+        self,
+        db_client: DatabaseApiClient,
+        compress: bool = True,
+        max_urls: int = MAX_SITEMAP_URLS,
+        max_size: int = MAX_SITEMAP_SIZE,
+    ) -> None:
+        if max_size <= len(URLSET_HEADER) + len(URLSET_FOOTER):
+            raise ValueError(f"The sitemap size limit is too small: {max_size}")
+
+        self._db = db_client
+        self._compress = compress
+        self._max_urls = max_urls
+        self._max_size = max_size
+
+    def export(
+        self,
+        site_key: SiteKey,
+        output_dir: typing.Union[str, os.PathLike],
+        base_url: typing.Optional[str] = None,
+    ) -> pathlib.Path:
+        """ Write the sitemaps of site and their index to the directory, return the path of index """
+        scheme, hostname, port = site_key
+        output_dir = pathlib.Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        site_url = yarl.URL.build(scheme=scheme, host=hostname, port=port, path="/")
+        base_url = yarl.URL(base_url) if base_url else site_url
+        if not base_url.path.endswith("/"):
+            base_url = base_url.with_path(f"{base_url.path}/")
+
+        sitemap_files: list[SitemapFile] = []
+        chunk_writer: typing.Optional[_SitemapChunkWriter] = None
+        try:
+            for url_path, last_modified_header in self._db.iter_site_pages(site_key=site_key):
+                url = yarl.URL.build(scheme=scheme, host=hostname, port=port, path=url_path)
+                last_modified = parse_last_modified(last_modified_header)
+                entry = build_url_entry(url=str(url), last_modified=last_modified)
+
+                if chunk_writer is not None and not chunk_writer.try_add(entry, last_modified):
+                    sitemap_files.append(chunk_writer.close())
+                    chunk_writer = None
+
+                if chunk_writer is None:
+                    chunk_writer = self._open_chunk(output_dir=output_dir, number=len(sitemap_files) + 1)
+                    if not chunk_writer.try_add(entry, last_modified):
+                        raise ValueError(f"The URL does not fit the sitemap size limit: {url}")
+        finally:
+            if chunk_writer is not None:
+                sitemap_files.append(chunk_writer.close())
+
+        if not sitemap_files:
+            raise ValueError(f"No pages of the site are saved: {site_url}")
+
+        index_path = output_dir / SITEMAP_INDEX_NAME
+        write_sitemap_index(path=index_path, base_url=base_url, sitemap_files=sitemap_files)
+        remove_stale_sitemaps(output_dir=output_dir, sitemap_files=sitemap_files)
+
+        logger.info(
+            f"The sitemap index is written: {index_path}, "
+            f"{sum(f.urls_count for f in sitemap_files)} URLs in {len(sitemap_files)} sitemaps"
+        )
+        return index_path
+
+    def _open_chunk(self, output_dir: pathlib.Path, number: int) -> _SitemapChunkWriter:
+        suffix = ".xml.gz" if self._compress else ".xml"
+        return _SitemapChunkWriter(
+            path=output_dir / f"sitemap-{number}{suffix}",
+            compress=self._compress,
+            max_urls=self._max_urls,
+            max_size=self._max_size,
+        )
+
+
+def remove_stale_sitemaps(output_dir: pathlib.Path, sitemap_files: list[SitemapFile]) -> None:
+    """ Remove the sitemaps of the previous export which are not in the new index """
+    sitemap_names = {sitemap_file.name for sitemap_file in sitemap_files}
+    for path in output_dir.iterdir():
+        if SITEMAP_NAME_PATTERN.fullmatch(path.name) and path.name not in sitemap_names:
+            path.unlink()
+            logger.debug(f"The stale sitemap is removed: {path}")
+
+
+def parse_last_modified(value: typing.Optional[str]) -> typing.Optional[datetime.datetime]:
+    """ Parse the Last-Modified header, the invalid dates are ignored """
+    if not value:
+        return None
+
+    try:
+        last_modified = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+    return last_modified
+
+
+def build_url_entry(url: str, last_modified: typing.Optional[datetime.datetime]) -> bytes:
+    entry = f"<url><loc>{xml.sax.saxutils.escape(url)}</loc>"
+    if last_modified is not None:
+        entry += f"<lastmod>{format_w3c_datetime(last_modified)}</lastmod>"
+    return f"{entry}</url>\n".encode()
+
+
+def format_w3c_datetime(value: datetime.datetime) -> str:
+    return value.astimezone(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def write_sitemap_index(path: pathlib.Path, base_url: yarl.URL, sitemap_files: list[SitemapFile]) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(XML_DECLARATION)
+        f.write(f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'.encode())
+        for sitemap_file in sitemap_files:
+            entry = f"<sitemap><loc>{xml.sax.saxutils.escape(str(base_url.join(yarl.URL(sitemap_file.name))))}</loc>"
+            if sitemap_file.last_modified is not None:
+                entry += f"<lastmod>{format_w3c_datetime(sitemap_file.last_modified)}</lastmod>"
+            f.write(f"{entry}</sitemap>\n".encode())
+        f.write(b"</sitemapindex>\n")
+
+    os.replace(tmp_path, path)
@@ -1,14 +1,22 @@
+import datetime
+import io
 import logging
 import typing
 
 import sqlalchemy
+import sqlalchemy.dialects.postgresql
 import sqlalchemy.event
+import sqlalchemy.exc
 import sqlalchemy.orm
 import sqlalchemy.orm.decl_api
 
+from sitemapgen.db.html_storage import decompress_html
 
 logger = logging.getLogger(__name__)
 
+SiteKey = tuple[str, str, typing.Optional[int]]
+PageKey = tuple[int, str]  # (site id, URL path)
+
 
 def build_postgresql_engine_url(
     host: str,
@@ -24,30 +32,243 @@ def build_postgresql_engine_url(
 
 DbTableBase = sqlalchemy.orm.declarative_base()
 
+# The paths are not limited, so they are indexed by their MD5 for the lookups and by the prefix for the ordering,
+# the B-tree entry of a long path would exceed the size limit and the page would be rejected.
+# The prefix of 512 characters fits the entry in any encoding of path.
+URL_PATH_PREFIX_LENGTH = 512
+
 
 class DbTableSite(DbTableBase):
     __tablename__ = "site"
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint("scheme", "hostname", "port", name="site_scheme_hostname_port_key"),
+        # The suffix match of subdomains is the prefix match of the reversed hostname
+        sqlalchemy.Index(
+            "site_reversed_hostname_idx",
+            sqlalchemy.func.reverse(sqlalchemy.column("hostname")).label("reversed_hostname"),
+            postgresql_ops={"reversed_hostname": "text_pattern_ops"},
+        ),
+    )
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     scheme = sqlalchemy.Column(sqlalchemy.String)
-    hostname = sqlalchemy.Column(sqlalchemy.String, unique=True)
+    hostname = sqlalchemy.Column(sqlalchemy.String)
     port = sqlalchemy.Column(sqlalchemy.Integer)
     ref_pages = sqlalchemy.orm.relationship("DbTablePage", back_populates="ref_site")
 
 
+class DbTablePageBlob(DbTableBase):
+    """ The compressed HTML stored once per content hash """
+    __tablename__ = "page_blob"
+
+    content_hash = sqlalchemy.Column(sqlalchemy.String(64), primary_key=True)
+    compression = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    raw_size = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    data = sqlalchemy.Column(sqlalchemy.LargeBinary, nullable=False)
+
+
 class DbTablePage(DbTableBase):
     __tablename__ = "page"
+    __table_args__ = (
+        sqlalchemy.Index(
+            "page_ref_site_id_url_path_md5_key",
+            "ref_site_id", sqlalchemy.func.md5(sqlalchemy.column("url_path")),
+            unique=True,
+        ),
+        sqlalchemy.Index(
+            "page_ref_site_id_url_path_prefix_idx",
+            "ref_site_id", sqlalchemy.func.left(sqlalchemy.column("url_path"), URL_PATH_PREFIX_LENGTH),
+        ),
+    )
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     url_path = sqlalchemy.Column(sqlalchemy.String)
     title = sqlalchemy.Column(sqlalchemy.String)
-    html = sqlalchemy.Column(sqlalchemy.Text)
+    html = sqlalchemy.orm.deferred(sqlalchemy.Column(sqlalchemy.Text))
+    html_blob_hash = sqlalchemy.Column(sqlalchemy.String(64), sqlalchemy.ForeignKey('page_blob.content_hash'))
+    content_hash = sqlalchemy.Column(sqlalchemy.String(64))
+    links = sqlalchemy.Column(sqlalchemy.dialects.postgresql.ARRAY(sqlalchemy.String))
+    etag = sqlalchemy.Column(sqlalchemy.String)
+    last_modified = sqlalchemy.Column(sqlalchemy.String)
     ref_site_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey('site.id'))
     ref_site = sqlalchemy.orm.relationship('DbTableSite', back_populates="ref_pages")
+    ref_html_blob = sqlalchemy.orm.relationship('DbTablePageBlob')
+
+    def get_html(self) -> str:
+        """ Get HTML of the page, the compressed one is loaded and decompressed on demand """
+        if self.html_blob_hash is not None:
+            return decompress_html(self.ref_html_blob.data, self.ref_html_blob.compression)
+        return self.html or ""
+
+
+class DbTablePageLink(DbTableBase):
+    """ The edge of link graph: the saved page links to the canonical URL of the same or another site """
+    __tablename__ = "page_link"
+    __table_args__ = (
+        sqlalchemy.Index(
+            "page_link_source_page_id_target_key",
+            "source_page_id", "target_site_id", sqlalchemy.func.md5(sqlalchemy.column("target_url_path")),
+            unique=True,
+        ),
+        sqlalchemy.Index(
+            "page_link_target_site_id_target_url_path_md5_idx",
+            "target_site_id", sqlalchemy.func.md5(sqlalchemy.column("target_url_path")),
+        ),
+    )
+
+    id = sqlalchemy.Column(sqlalchemy.BigInteger, primary_key=True)
+    source_page_id = sqlalchemy.Column(
+        sqlalchemy.Integer, sqlalchemy.ForeignKey('page.id', ondelete="CASCADE"), nullable=False
+    )
+    target_site_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey('site.id'), nullable=False)
+    target_url_path = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+
+
+class DbTableFrontierEntry(DbTableBase):
+    """ The URL of the crawl shared by workers, it is claimed by a worker for the lease time and marked done """
+    __tablename__ = "frontier"
+    __table_args__ = (
+        sqlalchemy.Index(
+            "frontier_crawl_url_key", "crawl", sqlalchemy.func.md5(sqlalchemy.column("url")), unique=True
+        ),
+        sqlalchemy.Index(
+            "frontier_crawl_depth_id_unfinished_idx", "crawl", "depth", "id",
+            postgresql_where=sqlalchemy.text("done_at IS NULL"),
+        ),
+    )
+
+    id = sqlalchemy.Column(sqlalchemy.BigInteger, primary_key=True)
+    crawl = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    url = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    depth = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    claimed_by = sqlalchemy.Column(sqlalchemy.String)
+    lease_expires_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True))
+    done_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True))
+
+
+# The upgrade of the schema created by the previous versions, the new tables are created by _create_tables.
+# Every statement is idempotent, so they are run on every start, the tables of the current schema are skipped.
+SCHEMA_MIGRATIONS = (
+    # The sites are unique by scheme, host and port instead of the host only
+    "ALTER TABLE site DROP CONSTRAINT IF EXISTS site_hostname_key",
+    "CREATE UNIQUE INDEX IF NOT EXISTS site_scheme_hostname_port_key ON site (scheme, hostname, port)",
+    "CREATE INDEX IF NOT EXISTS site_reversed_hostname_idx ON site (reverse(hostname) text_pattern_ops)",
+    # The columns of content-addressed HTML, revalidation and links
+    "ALTER TABLE page ADD COLUMN IF NOT EXISTS html_blob_hash VARCHAR(64) REFERENCES page_blob (content_hash)",
+    "ALTER TABLE page ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE page ADD COLUMN IF NOT EXISTS links VARCHAR[]",
+    "ALTER TABLE page ADD COLUMN IF NOT EXISTS etag VARCHAR",
+    "ALTER TABLE page ADD COLUMN IF NOT EXISTS last_modified VARCHAR",
+    # The pages are unique by site and MD5 of path, the duplicates saved by the per-page inserts are removed first
+    # (the last saved one is kept), so it is done only once when the unique index is missing
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('page_ref_site_id_url_path_md5_key') IS NULL THEN
+            DELETE FROM page USING page AS newer_page
+            WHERE page.ref_site_id = newer_page.ref_site_id
+                AND page.url_path = newer_page.url_path
+                AND page.id < newer_page.id;
+            CREATE UNIQUE INDEX page_ref_site_id_url_path_md5_key ON page (ref_site_id, md5(url_path));
+        END IF;
+    END
+    $$
+    """,
+    "ALTER TABLE page DROP CONSTRAINT IF EXISTS page_ref_site_id_url_path_key",
+    "DROP INDEX IF EXISTS page_ref_site_id_url_path_key",
+    "CREATE INDEX IF NOT EXISTS page_ref_site_id_url_path_prefix_idx "
+    f"ON page (ref_site_id, left(url_path, {URL_PATH_PREFIX_LENGTH}))",
+    # The link edges had the primary key over the raw target path, the surrogate key replaces it
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT FROM pg_attribute WHERE attrelid = 'page_link'::regclass AND attname = 'id' AND NOT attisdropped
+        ) THEN
+            ALTER TABLE page_link DROP CONSTRAINT page_link_pkey;
+            ALTER TABLE page_link ADD COLUMN id BIGSERIAL PRIMARY KEY;
+        END IF;
+    END
+    $$
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS page_link_source_page_id_target_key "
+    "ON page_link (source_page_id, target_site_id, md5(target_url_path))",
+    "DROP INDEX IF EXISTS page_link_target_site_id_target_url_path_idx",
+    "CREATE INDEX IF NOT EXISTS page_link_target_site_id_target_url_path_md5_idx "
+    "ON page_link (target_site_id, md5(target_url_path))",
+)
+# The key of advisory lock, so the processes started together do not upgrade the schema concurrently
+SCHEMA_MIGRATION_LOCK_KEY = 0x5173_6d67
+
+COPY_PAGE_COLUMNS = (
+    "ref_site_id", "url_path", "title", "html", "html_blob_hash", "content_hash", "links", "etag", "last_modified",
+)
+
+# The rows of the transaction are dropped on commit, the table lives as long as the connection of pool
+page_staging_table = sqlalchemy.Table(
+    "page_staging",
+    sqlalchemy.MetaData(),
+    *(sqlalchemy.Column(name, DbTablePage.__table__.c[name].type) for name in COPY_PAGE_COLUMNS),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DELETE ROWS",
+)
+
+COPY_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _format_copy_value(value: typing.Any) -> str:
+    """ Format the value for COPY in the text format, the lists are formatted as array literals """
+    if value is None:
+        return "\\N"
+    if isinstance(value, (list, tuple)):
+        value = "{" + ",".join(
+            '"' + str(item).replace("\\", "\\\\").replace('"', '\\"') + '"' for item in value
+        ) + "}"
+    return str(value).translate(COPY_TEXT_ESCAPES)
+
+
+def _copy_rows(
+    connection: sqlalchemy.engine.Connection,
+    table_name: str,
+    columns: typing.Sequence[str],
+    rows: typing.Iterable[typing.Sequence[typing.Any]],
+) -> None:
+    """ Load the rows to the table with COPY FROM STDIN within the transaction of connection """
+    data = io.StringIO()
+    for row in rows:
+        data.write("\t".join(map(_format_copy_value, row)))
+        data.write("\n")
+    data.seek(0)
+
+    statement = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN"
+    with connection.connection.cursor() as cursor:
+        try:
+            cursor.copy_expert(statement, data)
+        except connection.dialect.dbapi.Error as e:
+            # The error of driver cursor is wrapped like the errors of statements executed by SQLAlchemy
+            raise sqlalchemy.exc.DBAPIError.instance(statement, None, e, connection.dialect.dbapi.Error) from e
+
+
+def is_database_unavailable(error: Exception) -> bool:
+    """ Whether the statement failed as the database is unreachable or overloaded, it may succeed when retried """
+    if not isinstance(error, sqlalchemy.exc.DBAPIError):
+        return False
+    return error.connection_invalidated or (
+        isinstance(error, sqlalchemy.exc.OperationalError) and not is_rows_rejected(error)
+    )
+
+
+def is_rows_rejected(error: Exception) -> bool:
+    """ Whether the database rejected the values of some rows, e.g. the value out of range or the too long key """
+    if not isinstance(error, sqlalchemy.exc.DBAPIError):
+        return False
+    # The SQLSTATE class 54 is the program limits, e.g. the index row size exceeded by the key
+    pgcode = getattr(error.orig, "pgcode", None) or ""
+    return isinstance(error, (sqlalchemy.exc.DataError, sqlalchemy.exc.IntegrityError)) or pgcode.startswith("54")
 
 
 class DatabaseApiClient:
-    __tables__ = (DbTableSite, DbTablePage)
+    __tables__ = (DbTableSite, DbTablePageBlob, DbTablePage, DbTablePageLink, DbTableFrontierEntry)
 
     def __init__(
         self,
@@ -71,9 +292,17 @@ class DatabaseApiClient:
 
         self.session: sqlalchemy.orm.Session = sqlalchemy.orm.sessionmaker(self._engine)()
 
+    def connect(self) -> sqlalchemy.engine.Connection:
+        return self._engine.connect()
+
     def _create_tables(self) -> None:
-        for table in self.__tables__:
-            table.__table__.create(bind=self._engine, checkfirst=True)
+        """ Create the missing tables and upgrade the existing ones to the current schema """
+        with self._engine.begin() as connection:
+            connection.execute(sqlalchemy.select(sqlalchemy.func.pg_advisory_xact_lock(SCHEMA_MIGRATION_LOCK_KEY)))
+            for table in self.__tables__:
+                table.__table__.create(bind=connection, checkfirst=True)
+            for statement in SCHEMA_MIGRATIONS:
+                connection.execute(sqlalchemy.text(statement))
 
     def _register_events(self) -> None:
         for table in self.__tables__:
@@ -92,3 +321,293 @@ class DatabaseApiClient:
                 target: sqlalchemy.orm.InstanceState
             ):
                 logger.debug(f"'{table.__tablename__}': the row updated: {str(target.id)}")
+
+    def select_site_ids(self) -> dict[SiteKey, int]:
+        with self._engine.connect() as connection:
+            rows = connection.execute(
+                sqlalchemy.select(DbTableSite.id, DbTableSite.scheme, DbTableSite.hostname, DbTableSite.port)
+            )
+            return {(scheme, hostname, port): site_id for site_id, scheme, hostname, port in rows}
+
+    def create_site(self, site_key: SiteKey) -> int:
+        """ Create the site or get the id of the same one created concurrently by another writer """
+        scheme, hostname, port = site_key
+        with self._engine.begin() as connection:
+            site_id = connection.execute(
+                sqlalchemy.dialects.postgresql.insert(DbTableSite)
+                .values(scheme=scheme, hostname=hostname, port=port)
+                .on_conflict_do_nothing(index_elements=[DbTableSite.scheme, DbTableSite.hostname, DbTableSite.port])
+                .returning(DbTableSite.id)
+            ).scalar()
+            if site_id is not None:
+                return site_id
+
+            return connection.execute(
+                sqlalchemy.select(DbTableSite.id)
+                .where(DbTableSite.scheme == scheme, DbTableSite.hostname == hostname, DbTableSite.port == port)
+            ).scalar_one()
+
+    def select_known_page(self, site_key: SiteKey, url_path: str) -> typing.Optional[sqlalchemy.engine.Row]:
+        """ Select the state of page saved by the previous crawls of site, without its HTML """
+        scheme, hostname, port = site_key
+        with self._engine.connect() as connection:
+            return connection.execute(
+                sqlalchemy.select(
+                    DbTablePage.title, DbTablePage.links,
+                    DbTablePage.etag, DbTablePage.last_modified, DbTablePage.content_hash,
+                )
+                .join(DbTableSite.ref_pages)
+                .where(DbTableSite.scheme == scheme, DbTableSite.hostname == hostname, DbTableSite.port == port)
+                .where(sqlalchemy.func.md5(DbTablePage.url_path) == sqlalchemy.func.md5(url_path))
+                .where(DbTablePage.url_path == url_path)
+            ).first()
+
+    def iter_site_pages(self, site_key: SiteKey, yield_per: int = 1_000) -> typing.Iterator[sqlalchemy.engine.Row]:
+        """
+        Yield the paths and Last-Modified of fetched pages of site ordered by path from the server-side cursor,
+        the pages are read in the order of the path prefix index.
+        The [ERROR] / [SKIPPED] rows of failed and skipped URLs have no content hash, they are not yielded.
+        """
+        scheme, hostname, port = site_key
+        with self._engine.connect() as connection:
+            rows = connection.execution_options(yield_per=yield_per).execute(
+                sqlalchemy.select(DbTablePage.url_path, DbTablePage.last_modified)
+                .join(DbTableSite.ref_pages)
+                .where(DbTableSite.scheme == scheme, DbTableSite.hostname == hostname, DbTableSite.port == port)
+                .where(DbTablePage.content_hash.isnot(None))
+                .order_by(sqlalchemy.func.left(DbTablePage.url_path, URL_PATH_PREFIX_LENGTH), DbTablePage.url_path)
+            )
+            yield from rows
+
+    def upsert_pages(
+        self,
+        rows: list[dict[str, typing.Any]],
+        blob_rows: typing.Optional[list[dict[str, typing.Any]]] = None,
+        page_links: typing.Optional[dict[PageKey, list[PageKey]]] = None,
+    ) -> None:
+        """
+        Insert the pages or update the changed ones in a single statement, the HTML blobs are stored once.
+
+        The pages are compared by the content hash, so the stored HTML is never read back for the comparison.
+        The links of inserted and updated pages replace their edges of link graph, the edges of unchanged
+        pages are kept as they are.
+        """
+        if not rows:
+            return
+
+        upsert_query = self._build_page_upsert(sqlalchemy.dialects.postgresql.insert(DbTablePage).values(rows))
+        with self._engine.begin() as connection:
+            self._insert_page_blobs(connection, blob_rows=blob_rows)
+            saved_page_ids = {
+                (ref_site_id, url_path): page_id for page_id, ref_site_id, url_path in connection.execute(upsert_query)
+            }
+
+            if page_links is not None and saved_page_ids:
+                self._replace_page_links(connection, saved_page_ids=saved_page_ids, page_links=page_links)
+
+    def copy_pages(
+        self,
+        rows: list[dict[str, typing.Any]],
+        blob_rows: typing.Optional[list[dict[str, typing.Any]]] = None,
+        page_links: typing.Optional[dict[PageKey, list[PageKey]]] = None,
+    ) -> None:
+        """
+        Save the pages as upsert_pages does, but load them with COPY to the staging table first.
+
+        The staging table is merged to the pages with one set-based upsert, and the edges of link graph
+        are loaded with COPY too, so the chunk of pages costs a few statements whatever its size is.
+        """
+        if not rows:
+            return
+
+        upsert_query = self._build_page_upsert(
+            sqlalchemy.dialects.postgresql.insert(DbTablePage).from_select(
+                COPY_PAGE_COLUMNS, sqlalchemy.select(*(page_staging_table.c[name] for name in COPY_PAGE_COLUMNS))
+            )
+        )
+        with self._engine.begin() as connection:
+            self._insert_page_blobs(connection, blob_rows=blob_rows)
+
+            page_staging_table.create(connection, checkfirst=True)
+            _copy_rows(
+                connection,
+                table_name=page_staging_table.name,
+                columns=COPY_PAGE_COLUMNS,
+                rows=([row[name] for name in COPY_PAGE_COLUMNS] for row in rows),
+            )
+            saved_page_ids = {
+                (ref_site_id, url_path): page_id for page_id, ref_site_id, url_path in connection.execute(upsert_query)
+            }
+
+            if page_links is not None and saved_page_ids:
+                self._replace_page_links(
+                    connection, saved_page_ids=saved_page_ids, page_links=page_links, use_copy=True
+                )
+
+    @staticmethod
+    def _build_page_upsert(
+        insert_query: sqlalchemy.dialects.postgresql.Insert
+    ) -> sqlalchemy.dialects.postgresql.Insert:
+        """ Update the conflicting pages only when they are changed, return the inserted and updated pages """
+        return insert_query.on_conflict_do_update(
+            index_elements=[DbTablePage.ref_site_id, sqlalchemy.func.md5(DbTablePage.url_path)],
+            set_={
+                "title": insert_query.excluded.title,
+                "html": insert_query.excluded.html,
+                "html_blob_hash": insert_query.excluded.html_blob_hash,
+                "content_hash": insert_query.excluded.content_hash,
+                "links": insert_query.excluded.links,
+                "etag": insert_query.excluded.etag,
+                "last_modified": insert_query.excluded.last_modified,
+            },
+            where=sqlalchemy.or_(
+                DbTablePage.title.is_distinct_from(insert_query.excluded.title),
+                DbTablePage.content_hash.is_distinct_from(insert_query.excluded.content_hash),
+                DbTablePage.html_blob_hash.is_distinct_from(insert_query.excluded.html_blob_hash),
+                DbTablePage.links.is_distinct_from(insert_query.excluded.links),
+                DbTablePage.etag.is_distinct_from(insert_query.excluded.etag),
+                DbTablePage.last_modified.is_distinct_from(insert_query.excluded.last_modified),
+            )
+        ).returning(DbTablePage.id, DbTablePage.ref_site_id, DbTablePage.url_path)
+
+    @staticmethod
+    def _insert_page_blobs(
+        connection: sqlalchemy.engine.Connection,
+        blob_rows: typing.Optional[list[dict[str, typing.Any]]],
+    ) -> None:
+        if blob_rows:
+            connection.execute(
+                sqlalchemy.dialects.postgresql.insert(DbTablePageBlob)
+                .values(blob_rows)
+                .on_conflict_do_nothing(index_elements=[DbTablePageBlob.content_hash])
+            )
+
+    @staticmethod
+    def _replace_page_links(
+        connection: sqlalchemy.engine.Connection,
+        saved_page_ids: dict[PageKey, int],
+        page_links: dict[PageKey, list[PageKey]],
+        use_copy: bool = False,
+    ) -> None:
+        connection.execute(
+            sqlalchemy.delete(DbTablePageLink)
+            .where(DbTablePageLink.source_page_id.in_(list(saved_page_ids.values())))
+        )
+
+        link_rows = [
+            (page_id, target_site_id, target_url_path)
+            for page_key, page_id in saved_page_ids.items()
+            for target_site_id, target_url_path in set(page_links.get(page_key, ()))
+        ]
+        if not link_rows:
+            return
+
+        if use_copy:
+            _copy_rows(
+                connection,
+                table_name=DbTablePageLink.__tablename__,
+                columns=("source_page_id", "target_site_id", "target_url_path"),
+                rows=link_rows,
+            )
+        else:
+            connection.execute(
+                sqlalchemy.insert(DbTablePageLink),
+                [
+                    {"source_page_id": page_id, "target_site_id": target_site_id, "target_url_path": target_url_path}
+                    for page_id, target_site_id, target_url_path in link_rows
+                ],
+            )
+
+    def add_frontier_entries(self, crawl: str, entries: list[tuple[str, int]]) -> None:
+        """ Add the URLs with their depths to the frontier of crawl, the URLs added before are skipped """
+        if not entries:
+            return
+
+        with self._engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.dialects.postgresql.insert(DbTableFrontierEntry)
+                .values([{"crawl": crawl, "url": url, "depth": depth} for url, depth in entries])
+                .on_conflict_do_nothing(
+                    index_elements=[DbTableFrontierEntry.crawl, sqlalchemy.func.md5(DbTableFrontierEntry.url)]
+                )
+            )
+
+    def claim_frontier_entries(
+        self, crawl: str, worker_id: str, limit: int, lease: float
+    ) -> list[sqlalchemy.engine.Row]:
+        """
+        Claim the shallowest unfinished entries which are not leased by other workers.
+
+        The rows locked by the concurrent claims are skipped instead of waiting for them,
+        the entries of the dead worker are claimed again when their lease expires.
+        """
+        claimable = (
+            sqlalchemy.select(DbTableFrontierEntry.id)
+            .where(
+                DbTableFrontierEntry.crawl == crawl,
+                DbTableFrontierEntry.done_at.is_(None),
+                sqlalchemy.or_(
+                    DbTableFrontierEntry.lease_expires_at.is_(None),
+                    DbTableFrontierEntry.lease_expires_at < sqlalchemy.func.now(),
+                ),
+            )
+            .order_by(DbTableFrontierEntry.depth, DbTableFrontierEntry.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("claimable")
+        )
+        with self._engine.begin() as connection:
+            return connection.execute(
+                sqlalchemy.update(DbTableFrontierEntry)
+                .where(DbTableFrontierEntry.id == claimable.c.id)
+                .values(
+                    claimed_by=worker_id,
+                    lease_expires_at=sqlalchemy.func.now() + datetime.timedelta(seconds=lease),
+                )
+                .returning(DbTableFrontierEntry.id, DbTableFrontierEntry.url, DbTableFrontierEntry.depth)
+            ).all()
+
+    def extend_frontier_leases(self, worker_id: str, entry_ids: list[int], lease: float) -> int:
+        """ Extend the lease of unfinished entries still claimed by the worker, return the count of extended ones """
+        if not entry_ids:
+            return 0
+
+        with self._engine.begin() as connection:
+            return connection.execute(
+                sqlalchemy.update(DbTableFrontierEntry)
+                .where(
+                    DbTableFrontierEntry.id.in_(entry_ids),
+                    DbTableFrontierEntry.claimed_by == worker_id,
+                    DbTableFrontierEntry.done_at.is_(None),
+                )
+                .values(lease_expires_at=sqlalchemy.func.now() + datetime.timedelta(seconds=lease))
+            ).rowcount
+
+    def complete_frontier_entries(self, worker_id: str, entry_ids: list[int]) -> None:
+        """ Mark the entries done, unless their lease is expired and another worker claimed them """
+        if not entry_ids:
+            return
+
+        with self._engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.update(DbTableFrontierEntry)
+                .where(DbTableFrontierEntry.id.in_(entry_ids), DbTableFrontierEntry.claimed_by == worker_id)
+                .values(done_at=sqlalchemy.func.now(), lease_expires_at=None)
+            )
+
+    def delete_frontier_entries(self, crawl: str) -> int:
+        """ Delete the frontier of crawl left by the previous run, return the count of deleted entries """
+        with self._engine.begin() as connection:
+            return connection.execute(
+                sqlalchemy.delete(DbTableFrontierEntry).where(DbTableFrontierEntry.crawl == crawl)
+            ).rowcount
+
+    def has_unfinished_frontier_entries(self, crawl: str) -> bool:
+        with self._engine.connect() as connection:
+            return connection.execute(
+                sqlalchemy.select(
+                    sqlalchemy.exists().where(
+                        DbTableFrontierEntry.crawl == crawl, DbTableFrontierEntry.done_at.is_(None)
+                    )
+                )
+            ).scalar()
@@ -0,0 +1,43 @@
+import enum
+import gzip
+import hashlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class HtmlStorage(str, enum.Enum):
+    INLINE = "inline"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+def ensure_html_storage_available(storage: HtmlStorage) -> None:
+    if storage == HtmlStorage.ZSTD and zstandard is None:
+        raise RuntimeError("The 'zstandard' package is required for the zstd HTML storage: pip install zstandard")
+
+
+def get_content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress_html(raw_html: bytes, storage: HtmlStorage) -> bytes:
+    if storage == HtmlStorage.GZIP:
+        return gzip.compress(raw_html, compresslevel=6)
+    if storage == HtmlStorage.ZSTD:
+        ensure_html_storage_available(storage)
+        return zstandard.ZstdCompressor(level=3).compress(raw_html)
+
+    raise ValueError(f"The HTML storage is not compressed: {storage}")
+
+
+def decompress_html(data: bytes, storage: str) -> str:
+    if storage == HtmlStorage.GZIP:
+        return gzip.decompress(data).decode("utf-8")
+    if storage == HtmlStorage.ZSTD:
+        ensure_html_storage_available(HtmlStorage.ZSTD)
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+
+    raise ValueError(f"The HTML storage is not compressed: {storage}")
@@ -0,0 +1,34 @@
+import logging
+import threading
+import typing
+
+from sitemapgen.db.api_client import DatabaseApiClient, SiteKey
+
+
+logger = logging.getLogger(__name__)
+
+
+class SiteIdCache:
+    """ The in-process cache of site ids by (scheme, hostname, port) """
+
+    def __init__(self, db_client: DatabaseApiClient) -> None:
+        self._db = db_client
+        self._site_ids: dict[SiteKey, int] = {}
+        self._is_warmed = False
+        self._lock = threading.Lock()
+
+    def get_site_id(self, site_key: SiteKey) -> int:
+        with self._lock:
+            if not self._is_warmed:
+                self._site_ids.update(self._db.select_site_ids())
+                self._is_warmed = True
+                logger.debug(f"The cache of site ids is warmed: {len(self._site_ids)} sites")
+
+            if (site_id := self._site_ids.get(site_key)) is None:
+                site_id = self._site_ids[site_key] = self._db.create_site(site_key)
+                logger.debug(f"The site {site_key} is cached: {site_id}")
+
+            return site_id
+
+    def get_site_ids(self, site_keys: typing.Iterable[SiteKey]) -> dict[SiteKey, int]:
+        return {site_key: self.get_site_id(site_key) for site_key in set(site_keys)}
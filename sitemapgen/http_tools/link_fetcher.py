@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import logging
 import ssl
 import typing
@@ -6,15 +7,86 @@ import typing
 import aiohttp
 import backoff
 import yarl
+from pydantic.dataclasses import dataclass
 
 from sitemapgen.http_tools.backoff_utils import log_backoff, log_giveup
+from sitemapgen.http_tools.rate_limiter import HostRateLimits, parse_retry_after
+from sitemapgen.utils.html_encoding import decode_html
+from sitemapgen.utils.metrics import MetricsRegistry
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageSkippedError(Exception):
+    """ The page is not HTML or it is too large to download """
+
+
+class HostThrottledError(Exception):
+    def __init__(self, url: str, status: int, retry_after: typing.Optional[float]) -> None:
+        super().__init__(f"The host throttled the request to '{url}': HTTP {status}, retry after {retry_after}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+@dataclass
+class FetchedPage:
+    status: int
+    body: typing.Optional[bytes]
+    etag: typing.Optional[str] = None
+    last_modified: typing.Optional[str] = None
+    charset: typing.Optional[str] = None
+
+    @property
+    def is_not_modified(self) -> bool:
+        return self.status == 304
+
+    @property
+    def html(self) -> typing.Optional[str]:
+        return decode_html(self.body, http_charset=self.charset) if self.body is not None else None
 
 
 class HttpLinkFetcher:
-    def __init__(self, client_session: aiohttp.ClientSession) -> None:
+    THROTTLED_STATUSES = (429, 503)
+    HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+    CHUNK_SIZE = 64 * 2 ** 10
+
+    def __init__(
+        self,
+        client_session: aiohttp.ClientSession,
+        host_rate_limits: typing.Optional[HostRateLimits] = None,
+        max_body_size: int = 10 * 2 ** 20,
+        metrics: typing.Optional[MetricsRegistry] = None,
+    ) -> None:
         self._session = client_session
+        self._host_rate_limits = host_rate_limits
+        self._max_body_size = max_body_size
+
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        self._body_seconds = metrics.histogram(
+            "sitemapgen_http_body_seconds", "The time of downloading the response body after the headers"
+        )
+        self._downloaded_bytes_total = metrics.counter(
+            "sitemapgen_http_downloaded_bytes_total", "The count of downloaded bytes of response bodies"
+        )
 
     async def get_html(self, url: typing.Union[str, yarl.URL], **request_kwargs) -> str:
+        fetched_page = await self.get_page(url=url, **request_kwargs)
+        return fetched_page.html or ""
+
+    async def get_page(
+        self,
+        url: typing.Union[str, yarl.URL],
+        etag: typing.Optional[str] = None,
+        last_modified: typing.Optional[str] = None,
+        **request_kwargs
+    ) -> FetchedPage:
+        """
+        Get the page, it is revalidated by the passed validators and the body is skipped on HTTP 304.
+
+        Raise PageSkippedError as soon as the headers or the downloaded part of body show
+        that the response is not HTML or it is larger than the limit.
+        """
         url_ = url
         if not isinstance(url, yarl.URL):
             url_ = yarl.URL(url)
@@ -22,8 +94,59 @@ class HttpLinkFetcher:
         if not url_.host or url_.scheme not in ("http", "https"):
             raise ValueError(f"Invalid URL: {url}")
 
+        headers = dict(request_kwargs.pop("headers", None) or {})
+        if etag is not None:
+            headers[aiohttp.hdrs.IF_NONE_MATCH] = etag
+        if last_modified is not None:
+            headers[aiohttp.hdrs.IF_MODIFIED_SINCE] = last_modified
+
+        async with await self._request(
+            url=url, method=aiohttp.hdrs.METH_GET, headers=headers, **request_kwargs
+        ) as response:
+            body = None
+            if response.status != 304:
+                body = await self._read_html_body(response)
+
+            return FetchedPage(
+                status=response.status,
+                body=body,
+                etag=response.headers.get(aiohttp.hdrs.ETAG),
+                last_modified=response.headers.get(aiohttp.hdrs.LAST_MODIFIED),
+                charset=response.charset,
+            )
+
+    async def get_resource(self, url: typing.Union[str, yarl.URL], **request_kwargs) -> FetchedPage:
+        """ Get the body of any content type (e.g. robots.txt), the size limit of page is applied """
+        async with await self._request(url=url, method=aiohttp.hdrs.METH_GET, **request_kwargs) as response:
+            return FetchedPage(status=response.status, body=await self._read_body(response), charset=response.charset)
+
+    async def iter_body_chunks(self, url: typing.Union[str, yarl.URL], **request_kwargs) -> typing.AsyncIterator[bytes]:
+        """ Stream the body of successful response by chunks without the size limit (e.g. sitemap.xml) """
         async with await self._request(url=url, method=aiohttp.hdrs.METH_GET, **request_kwargs) as response:
-            return await response.text(encoding='utf-8')
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                self._downloaded_bytes_total.inc(len(chunk))
+                yield chunk
+
+    async def _read_html_body(self, response: aiohttp.ClientResponse) -> bytes:
+        if aiohttp.hdrs.CONTENT_TYPE in response.headers and response.content_type not in self.HTML_CONTENT_TYPES:
+            raise PageSkippedError(f"The content type is not HTML: {response.content_type}")
+
+        return await self._read_body(response)
+
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        if response.content_length is not None and response.content_length > self._max_body_size:
+            raise PageSkippedError(f"The content length {response.content_length} exceeds {self._max_body_size} bytes")
+
+        body = bytearray()
+        with self._body_seconds.time():
+            async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                body += chunk
+                self._downloaded_bytes_total.inc(len(chunk))
+                if len(body) > self._max_body_size:
+                    raise PageSkippedError(f"The body exceeds {self._max_body_size} bytes")
+
+        return bytes(body)
 
     @backoff.on_exception(
         wait_gen=backoff.expo,
@@ -36,22 +159,47 @@ class HttpLinkFetcher:
         ),
         max_time=120,
         jitter=backoff.full_jitter,
-        logger=__name__,
-        on_backoff=log_backoff,
-        on_giveup=log_giveup,
-        backoff_log_level=logging.DEBUG,
-        giveup_log_level=logging.WARNING
+        logger=None,
+        on_backoff=functools.partial(log_backoff, logger=logger, log_level=logging.DEBUG),
+        on_giveup=functools.partial(log_giveup, logger=logger, log_level=logging.WARNING),
     )
     @backoff.on_exception(
         wait_gen=backoff.expo,
         exception=aiohttp.ClientConnectionError,
         max_time=10,
         jitter=backoff.full_jitter,
-        logger=__name__,
-        on_backoff=log_backoff,
-        on_giveup=log_giveup,
-        backoff_log_level=logging.DEBUG,
-        giveup_log_level=logging.WARNING
+        logger=None,
+        on_backoff=functools.partial(log_backoff, logger=logger, log_level=logging.DEBUG),
+        on_giveup=functools.partial(log_giveup, logger=logger, log_level=logging.WARNING),
+    )
+    @backoff.on_exception(
+        wait_gen=backoff.constant,
+        exception=HostThrottledError,
+        interval=0,  # the rate limiter of host waits before the next try
+        max_tries=5,
+        jitter=None,
+        logger=None,
+        on_backoff=functools.partial(log_backoff, logger=logger, log_level=logging.DEBUG),
+        on_giveup=functools.partial(log_giveup, logger=logger, log_level=logging.WARNING),
     )
     async def _request(self, url: str, method: str = aiohttp.hdrs.METH_GET, **request_kwargs) -> aiohttp.ClientResponse:
-        return await self._session.request(method, url, **request_kwargs)
+        if self._host_rate_limits is None:
+            return await self._session.request(method, url, **request_kwargs)
+
+        rate_limiter = self._host_rate_limits.get(yarl.URL(url).host)
+        await rate_limiter.acquire()
+
+        try:
+            response = await self._session.request(method, url, **request_kwargs)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            rate_limiter.on_connection_error()
+            raise
+
+        if response.status in self.THROTTLED_STATUSES:
+            retry_after = parse_retry_after(response.headers.get(aiohttp.hdrs.RETRY_AFTER))
+            rate_limiter.on_throttled(retry_after=retry_after)
+            response.release()
+            raise HostThrottledError(url=str(url), status=response.status, retry_after=retry_after)
+
+        rate_limiter.on_success()
+        return response
@@ -0,0 +1,168 @@
+import asyncio
+import email.utils
+import logging
+import time
+import typing
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: typing.Optional[str]) -> typing.Optional[float]:
+    """ Parse the Retry-After header value (delay in seconds or HTTP-date) to the delay in seconds """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class HostRateLimiter:
+    """
+    The token bucket of one host with the adaptive rate and the circuit breaker.
+
+    The rate is increased additively on success and decreased multiplicatively on HTTP 429 / 503 (AIMD),
+    the host is paused for Retry-After or for the cooldown after repeated connection failures.
+    The pause for Retry-After is limited by max_retry_after, so a server asking for hours does not stall the crawl
+    (the acquire holds the lock of host while it waits).
+    """
+
+    def __init__(
+        self,
+        host: str,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        increase_step: float,
+        decrease_factor: float,
+        failures_threshold: int,
+        cooldown: float,
+        max_retry_after: float,
+    ) -> None:
+        self.host = host
+        self.rate = rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._increase_step = increase_step
+        self._decrease_factor = decrease_factor
+        self._failures_threshold = failures_threshold
+        self._cooldown = cooldown
+        self._max_retry_after = max_retry_after
+
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_failures = 0
+        self._lock = asyncio.Lock()
+
+        self.throttled_count = 0
+        self.circuit_opened_count = 0
+
+    @property
+    def is_circuit_open(self) -> bool:
+        return self._consecutive_failures >= self._failures_threshold
+
+    async def acquire(self) -> None:
+        """ Wait for the pause of host to end and for the token """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self._tokens + (now - self._updated_at) * self.rate, max(self.rate, 1.0))
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def limit_max_rate(self, max_rate: float) -> None:
+        """ Cap the rate of host, e.g. by Crawl-delay of its robots.txt """
+        self._max_rate = min(self._max_rate, max_rate)
+        self._min_rate = min(self._min_rate, self._max_rate)
+        self.rate = min(self.rate, self._max_rate)
+
+    def on_success(self) -> None:
+        self._consecutive_failures = 0
+        self.rate = min(self.rate + self._increase_step, self._max_rate)
+
+    def on_throttled(self, retry_after: typing.Optional[float]) -> None:
+        self.throttled_count += 1
+        self.rate = max(self.rate * self._decrease_factor, self._min_rate)
+        self._tokens = 0.0
+        if retry_after is not None:
+            retry_after = min(retry_after, self._max_retry_after)
+            self._pause(retry_after)
+
+        logger.debug(f"The host '{self.host}' is throttled: rate {self.rate:.2f} req/sec, retry after {retry_after}")
+
+    def on_connection_error(self) -> None:
+        self._consecutive_failures += 1
+        if self.is_circuit_open:
+            # Every failure of the half-open circuit opens it again
+            self.circuit_opened_count += 1
+            self._pause(self._cooldown)
+            logger.warning(
+                f"The host '{self.host}' is paused for {self._cooldown:.1f} s "
+                f"after {self._consecutive_failures} connection failures"
+            )
+
+    def _pause(self, delay: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.host}: {self.rate:.2f} req/sec, throttled {self.throttled_count} times, "
+            f"circuit opened {self.circuit_opened_count} times"
+        )
+
+
+class HostRateLimits:
+    """ The registry of rate limiters by host """
+
+    def __init__(
+        self,
+        initial_rate: float = 10.0,
+        min_rate: float = 0.5,
+        max_rate: float = 100.0,
+        increase_step: float = 0.5,
+        decrease_factor: float = 0.5,
+        failures_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_retry_after: float = 120.0,
+    ) -> None:
+        if not 0 < min_rate <= initial_rate <= max_rate:
+            raise ValueError(f"The rates must be 0 < min ({min_rate}) <= initial ({initial_rate}) <= max ({max_rate})")
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"The decrease factor must be between 0 and 1: {decrease_factor}")
+
+        self._limiter_kwargs = dict(
+            rate=initial_rate,
+            min_rate=min_rate,
+            max_rate=max_rate,
+            increase_step=increase_step,
+            decrease_factor=decrease_factor,
+            failures_threshold=failures_threshold,
+            cooldown=cooldown,
+            max_retry_after=max_retry_after,
+        )
+        self._limiters: dict[str, HostRateLimiter] = {}
+
+    def get(self, host: str) -> HostRateLimiter:
+        if (limiter := self._limiters.get(host)) is None:
+            limiter = self._limiters[host] = HostRateLimiter(host=host, **self._limiter_kwargs)
+        return limiter
+
+    def __iter__(self) -> typing.Iterator[HostRateLimiter]:
+        return iter(self._limiters.values())
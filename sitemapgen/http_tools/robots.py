@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import typing
+import urllib.robotparser
+
+import yarl
+
+from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher
+from sitemapgen.http_tools.rate_limiter import HostRateLimits
+from sitemapgen.utils.url_tools import build_base_url
+
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "sitemapgen"
+
+
+class RobotsCache:
+    """
+    The robots.txt rules fetched once per site (scheme, host and port).
+
+    The missing robots.txt (HTTP 4xx) allows everything, the unavailable one (HTTP 5xx or connection errors)
+    disallows everything as RFC 9309 requires. Crawl-delay and Request-rate cap the rate limiter of host.
+    """
+
+    def __init__(
+        self,
+        link_fetcher: HttpLinkFetcher,
+        host_rate_limits: typing.Optional[HostRateLimits] = None,
+        obey_rules: bool = True,
+        user_agent: str = USER_AGENT,
+    ) -> None:
+        self._link_fetcher = link_fetcher
+        self._host_rate_limits = host_rate_limits
+        self._obey_rules = obey_rules
+        self._user_agent = user_agent
+
+        self._rules: dict[str, urllib.robotparser.RobotFileParser] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def is_allowed(self, url: str) -> bool:
+        if not self._obey_rules:
+            return True
+
+        rules = await self.get(url)
+        return rules.can_fetch(self._user_agent, url)
+
+    async def get_sitemap_urls(self, url: str) -> list[str]:
+        rules = await self.get(url)
+        return rules.site_maps() or []
+
+    async def get(self, url: str) -> urllib.robotparser.RobotFileParser:
+        url_ = yarl.URL(url)
+        site_url = build_base_url(scheme=url_.scheme, hostname=url_.host, port=url_.explicit_port)
+
+        if (rules := self._rules.get(site_url)) is not None:
+            return rules
+
+        lock = self._locks.setdefault(site_url, asyncio.Lock())
+        async with lock:
+            if site_url not in self._rules:
+                self._rules[site_url] = await self._load(robots_url=f"{site_url}/robots.txt", host=url_.host)
+
+        return self._rules[site_url]
+
+    async def _load(self, robots_url: str, host: str) -> urllib.robotparser.RobotFileParser:
+        rules = urllib.robotparser.RobotFileParser(robots_url)
+
+        try:
+            fetched = await self._link_fetcher.get_resource(url=robots_url)
+        except Exception as e:
+            logger.warning(f"The robots.txt is unavailable, the site is disallowed: {robots_url}: {e!s}")
+            rules.disallow_all = True
+            return rules
+
+        if fetched.status >= 500:
+            logger.warning(
+                f"The robots.txt is unavailable, the site is disallowed: {robots_url}: HTTP {fetched.status}"
+            )
+            rules.disallow_all = True
+        elif fetched.status >= 400:
+            logger.debug(f"The robots.txt is missing, the site is allowed: {robots_url}: HTTP {fetched.status}")
+            rules.allow_all = True
+        else:
+            rules.parse(fetched.body.decode("utf-8", errors="replace").splitlines())
+
+        rules.modified()  # RobotFileParser disallows everything until it is marked as read
+        self._apply_crawl_delay(rules=rules, host=host)
+        return rules
+
+    def _apply_crawl_delay(self, rules: urllib.robotparser.RobotFileParser, host: str) -> None:
+        if not self._obey_rules or self._host_rate_limits is None:
+            return
+
+        max_rate = None
+        if crawl_delay := rules.crawl_delay(self._user_agent):
+            max_rate = 1 / float(crawl_delay)
+        if (request_rate := rules.request_rate(self._user_agent)) and request_rate.seconds:
+            max_rate = min(max_rate or float("inf"), request_rate.requests / request_rate.seconds)
+
+        if max_rate is not None:
+            logger.info(f"The rate of host '{host}' is limited by robots.txt: {max_rate:.2f} req/sec")
+            self._host_rate_limits.get(host).limit_max_rate(max_rate)
+
+    def __str__(self) -> str:
+        return f"robots.txt of {len(self._rules)} sites"
@@ -0,0 +1,79 @@
+import logging
+import typing
+import zlib
+
+from lxml import etree
+
+from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher
+
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+MAX_SITEMAP_SIZE = 50 * 2 ** 20  # the limit of uncompressed sitemap by the protocol
+MAX_SITEMAP_NESTING = 3
+
+
+async def iter_sitemap_urls(
+    link_fetcher: HttpLinkFetcher,
+    sitemap_url: str,
+    max_nesting: int = MAX_SITEMAP_NESTING,
+) -> typing.AsyncIterator[str]:
+    """
+    Yield the page URLs of sitemap while it is downloaded, the sitemap indexes are followed recursively.
+
+    The gzipped sitemaps are detected by the magic bytes and decompressed by chunks,
+    the parsed elements are dropped at once, so the memory does not grow with the sitemap size.
+    """
+    child_sitemap_urls: list[str] = []
+    xml_parser = etree.XMLPullParser(events=("end",), resolve_entities=False, no_network=True, huge_tree=True)
+    decompressor = None
+    size = 0
+
+    # The chunks are closed explicitly, contextlib.aclosing is not available before Python 3.10
+    chunks = link_fetcher.iter_body_chunks(url=sitemap_url)
+    try:
+        async for chunk in chunks:
+            if decompressor is None and size == 0 and chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk, MAX_SITEMAP_SIZE - size + 1)
+
+            size += len(chunk)
+            if size > MAX_SITEMAP_SIZE:
+                logger.warning(f"The sitemap exceeds {MAX_SITEMAP_SIZE} bytes, the rest is ignored: {sitemap_url}")
+                break
+
+            xml_parser.feed(chunk)
+            for url, is_sitemap in _read_locations(xml_parser):
+                if is_sitemap:
+                    child_sitemap_urls.append(url)
+                else:
+                    yield url
+    finally:
+        await chunks.aclose()
+
+    if child_sitemap_urls and max_nesting <= 1:
+        logger.warning(f"The sitemap index is nested too deep, its {len(child_sitemap_urls)} sitemaps are ignored")
+        return
+
+    for child_sitemap_url in child_sitemap_urls:
+        async for url in iter_sitemap_urls(link_fetcher, sitemap_url=child_sitemap_url, max_nesting=max_nesting - 1):
+            yield url
+
+
+def _read_locations(xml_parser: etree.XMLPullParser) -> typing.Iterator[tuple[str, bool]]:
+    """ Yield the <loc> of every parsed <url> and <sitemap> entry with the flag whether it is a sitemap """
+    for _, element in xml_parser.read_events():
+        tag = etree.QName(element).localname
+        if tag not in ("url", "sitemap"):
+            continue
+
+        for child in element:
+            if etree.QName(child).localname == "loc" and child.text:
+                yield child.text.strip(), tag == "sitemap"
+                break
+
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
@@ -0,0 +1,71 @@
+import time
+import types
+
+import aiohttp
+
+from sitemapgen.utils.metrics import MetricsRegistry
+
+
+def build_metrics_trace_config(registry: MetricsRegistry) -> aiohttp.TraceConfig:
+    """
+    Track the phases of every request of the client session: DNS resolution, connection and time to the
+    response headers (TTFB). The body download is tracked by the link fetcher, as the chunk signal
+    is not sent for the streamed bodies.
+    """
+    requests_total = registry.counter("sitemapgen_http_requests_total", "The count of sent HTTP requests")
+    request_errors_total = registry.counter(
+        "sitemapgen_http_request_errors_total", "The count of HTTP requests failed without a response"
+    )
+    dns_seconds = registry.histogram("sitemapgen_http_dns_seconds", "The time of DNS resolution of host")
+    connect_seconds = registry.histogram("sitemapgen_http_connect_seconds", "The time of opening a new connection")
+    ttfb_seconds = registry.histogram(
+        "sitemapgen_http_ttfb_seconds", "The time from the request start to the response headers"
+    )
+
+    async def on_request_start(
+        session: aiohttp.ClientSession, context: types.SimpleNamespace, params: aiohttp.TraceRequestStartParams
+    ) -> None:
+        requests_total.inc()
+        context.request_started_at = time.perf_counter()
+
+    async def on_request_end(
+        session: aiohttp.ClientSession, context: types.SimpleNamespace, params: aiohttp.TraceRequestEndParams
+    ) -> None:
+        ttfb_seconds.observe(time.perf_counter() - context.request_started_at)
+
+    async def on_request_exception(
+        session: aiohttp.ClientSession, context: types.SimpleNamespace, params: aiohttp.TraceRequestExceptionParams
+    ) -> None:
+        request_errors_total.inc()
+
+    async def on_dns_resolvehost_start(
+        session: aiohttp.ClientSession, context: types.SimpleNamespace, params: aiohttp.TraceDnsResolveHostStartParams
+    ) -> None:
+        context.dns_started_at = time.perf_counter()
+
+    async def on_dns_resolvehost_end(
+        session: aiohttp.ClientSession, context: types.SimpleNamespace, params: aiohttp.TraceDnsResolveHostEndParams
+    ) -> None:
+        dns_seconds.observe(time.perf_counter() - context.dns_started_at)
+
+    async def on_connection_create_start(
+        session: aiohttp.ClientSession,
+        context: types.SimpleNamespace,
+        params: aiohttp.TraceConnectionCreateStartParams,
+    ) -> None:
+        context.connect_started_at = time.perf_counter()
+
+    async def on_connection_create_end(
+        session: aiohttp.ClientSession, context: types.SimpleNamespace, params: aiohttp.TraceConnectionCreateEndParams
+    ) -> None:
+        connect_seconds.observe(time.perf_counter() - context.connect_started_at)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
@@ -1,19 +1,32 @@
 import asyncio
+import concurrent.futures
 import logging
+import pathlib
 import typing
 from functools import cached_property
-from urllib.parse import urljoin
 
 import aiohttp
 import yarl
+from aiohttp import web
 
-from sitemapgen.cmds.generate_map import SiteMapGenerator, IPageParser, PageInfo
-from sitemapgen.cmds.observer import Observer
-from sitemapgen.db.api_client import DatabaseApiClient, DbTableSite, DbTablePage
+from sitemapgen.cmds.checkpoint import CrawlCheckpointer
+from sitemapgen.cmds.frontier_worker import FrontierWorker
+from sitemapgen.cmds.generate_map import SiteMapGenerator
+from sitemapgen.cmds.known_pages import DbKnownPages
+from sitemapgen.cmds.observer import Observer, ObservedPage
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.cmds.save_queue import PageSaveQueue
+from sitemapgen.cmds.sitemap_export import SitemapExporter
+from sitemapgen.db.api_client import DatabaseApiClient
+from sitemapgen.db.html_storage import HtmlStorage
 from sitemapgen.http_tools.link_fetcher import HttpLinkFetcher
+from sitemapgen.http_tools.rate_limiter import HostRateLimits
+from sitemapgen.http_tools.robots import RobotsCache
+from sitemapgen.http_tools.tracing import build_metrics_trace_config
 from sitemapgen.settings import Settings
-from sitemapgen.utils.html_page_parser import LxmlParser
-from sitemapgen.utils.url_tools import build_base_url
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+from sitemapgen.utils.metrics import MetricsRegistry, add_process_metrics, start_metrics_server
+from sitemapgen.utils.visited_set import VisitedSetKind, build_visited_set
 
 logger = logging.getLogger(__name__)
 
@@ -36,100 +49,260 @@ class CommandProvider:
 
         self.provide_show(page_list=page_list)
 
-    def provide_show(self, page_list: list[DbTablePage]) -> None:
+    def provide_show_links(self, url: str, limit: int) -> None:
+        url = yarl.URL(url)
+
+        if not url.host:
+            raise ValueError("Incorrect URL")
+
+        page_list = self.observer.get_linked_pages(
+            scheme=url.scheme, hostname=url.host, port=url.port, url_path=url.path, limit=limit
+        )
+        self.provide_show(page_list=page_list)
+
+    def provide_show(self, page_list: typing.Iterable[ObservedPage]) -> None:
         for i, page in enumerate(page_list):
-            base_url = build_base_url(scheme=page.ref_site.scheme, hostname=page.ref_site.hostname)
-            url = urljoin(base_url, page.url_path)
-            logger.info(f"{i + 1:4d}. {url} : {page.title}")
+            logger.info(f"{i + 1:4d}. {page.url} : {page.title}")
+
+    def provide_export(
+        self,
+        url: str,
+        output_dir: pathlib.Path,
+        base_url: typing.Optional[str],
+        compress: bool,
+    ) -> pathlib.Path:
+        url = yarl.URL(url)
+
+        if not url.host:
+            raise ValueError("Incorrect URL")
+
+        exporter = SitemapExporter(db_client=self.db_api_client, compress=compress)
+        return exporter.export(site_key=(url.scheme, url.host, url.port), output_dir=output_dir, base_url=base_url)
 
-    async def provide_generate(self, url: str, depth: int, concurrent_requests_limit: int) -> None:
-        site_map_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+    async def provide_generate(
+        self,
+        url: str,
+        depth: int,
+        concurrent_requests_limit: int,
+        streaming: bool = False,
+        visited_set_kind: VisitedSetKind = VisitedSetKind.FINGERPRINT,
+        bloom_capacity: int = 10_000_000,
+        html_storage: HtmlStorage = HtmlStorage.INLINE,
+        bulk_copy: bool = False,
+        recrawl: bool = False,
+        parser_kind: PageParserKind = PageParserKind.STREAMING,
+        parse_workers: int = 0,
+        robots: bool = False,
+        sitemaps: bool = False,
+        checkpoint_path: typing.Optional[pathlib.Path] = None,
+        checkpoint_interval: float = 60.0,
+        resume: bool = False,
+        save_queue_memory_bytes: int = 256 * 2 ** 20,
+        save_queue_spill_dir: typing.Optional[pathlib.Path] = None,
+        metrics_port: typing.Optional[int] = None,
+        metrics_json_path: typing.Optional[pathlib.Path] = None,
+    ) -> None:
+        checkpoint = None
+        if resume:
+            if checkpoint_path is None:
+                raise ValueError("The checkpoint path is required to resume the crawl")
+
+            checkpoint = CrawlCheckpointer.load(checkpoint_path)
+            if checkpoint.url != url:
+                raise ValueError(f"The checkpoint is made for another URL: {checkpoint.url}")
+
+        site_map_queue = PageSaveQueue(
+            max_memory_bytes=save_queue_memory_bytes, spill_dir=save_queue_spill_dir, metrics=self.metrics
+        )
+        parse_executor = concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers) if parse_workers else None
+
+        if checkpoint is not None:
+            visited_urls = checkpoint.get_visited_urls()
+            site_map_queue.extend(checkpoint.pending_pages)
+            site_map_queue.extend(CrawlCheckpointer.iter_spilled_pages(checkpoint_path))
+        else:
+            visited_urls = build_visited_set(kind=visited_set_kind, capacity=bloom_capacity)
 
         smc = SiteMapGenerator(
             http_link_fetcher=self.http_link_fetcher,
-            page_parser=self.page_parser,
-            on_save_queue=site_map_queue
+            page_parser=build_page_parser(kind=parser_kind),
+            on_save_queue=site_map_queue,
+            workers_count=concurrent_requests_limit,
+            streaming=streaming,
+            visited_urls=visited_urls,
+            known_pages=DbKnownPages(db_client=self.db_api_client) if recrawl else None,
+            parse_executor=parse_executor,
+            robots=self.build_robots_cache(obey_rules=robots) if robots or sitemaps else None,
+            seed_from_sitemaps=sitemaps,
+            metrics=self.metrics,
+        )
+
+        page_writer = PageBatchWriter(
+            db_client=self.db_api_client, html_storage=html_storage, bulk_copy=bulk_copy, metrics=self.metrics
         )
 
+        checkpointer = None
+        checkpoint_task = None
+        checkpoint_stop_event = asyncio.Event()
+        if checkpoint_path is not None:
+            checkpointer = CrawlCheckpointer(
+                path=checkpoint_path,
+                url=url,
+                generator=smc,
+                visited_urls=visited_urls,
+                page_queue=site_map_queue,
+                page_writer=page_writer,
+                interval=checkpoint_interval,
+            )
+            checkpoint_task = asyncio.ensure_future(checkpointer.run(checkpoint_stop_event))
+
+        metrics_server = await self.start_metrics_server(port=metrics_port)
+        saving_task = self.start_saving(page_writer, save_queue=site_map_queue)
+        is_complete = False
         try:
-            asyncio.ensure_future(self._run_saving_page_info(site_map_queue))
-            await smc.generate_map(url=url, depth=depth)
+            await self.crawl_while_saving(
+                smc.generate_map(
+                    url=url, depth=depth, resumed_frontier=checkpoint.get_frontier() if checkpoint is not None else None
+                ),
+                saving_task=saving_task,
+            )
+            is_complete = True
         finally:
+            if checkpoint_task is not None:
+                # The periodic saving is finished first, so it does not race the final save or the removal of file
+                checkpoint_stop_event.set()
+                await checkpoint_task
+
+            if checkpointer is not None and not is_complete:
+                await checkpointer.save()
+
             await self.graceful_shutdown()
 
-            retries = 0
-            while not site_map_queue.empty():
-                await asyncio.sleep(0.5)
-
-                if retries > 15:
-                    raise RuntimeError(
-                        f"Unknown error during saving pages to database: qsize = {site_map_queue.qsize()}"
-                    )
-
-                retries += 1
-
-    async def _run_saving_page_info(self, site_map_queue: asyncio.Queue[PageInfo]):
-        while True:
-            try:
-                page_info_to_save = await asyncio.wait_for(site_map_queue.get(), 1)
-                await self._save_page_info(page_info=page_info_to_save)
-            except asyncio.TimeoutError:
-                if self._stop_event.is_set():
-                    return
-
-    async def _save_page_info(self, page_info: PageInfo):
-        logger.debug(f"Saving {page_info.url}...")
-        url = yarl.URL(page_info.url)
-
-        query_site_criterion = (
-            DbTableSite.scheme == url.scheme,
-            DbTableSite.hostname == url.host,
-            DbTableSite.port == url.port
+            if parse_executor is not None:
+                parse_executor.shutdown(wait=True)
+
+            await self.stop_saving(saving_task, save_queue=site_map_queue)
+            await self.stop_metrics_server(metrics_server, json_path=metrics_json_path)
+
+            if checkpointer is not None and is_complete:
+                checkpointer.remove()
+
+    async def provide_worker(
+        self,
+        url: str,
+        depth: int,
+        concurrent_requests_limit: int,
+        worker_id: str,
+        claim_size: int = 32,
+        lease: float = 120.0,
+        crawl_id: typing.Optional[str] = None,
+        restart: bool = False,
+        html_storage: HtmlStorage = HtmlStorage.INLINE,
+        bulk_copy: bool = False,
+        parser_kind: PageParserKind = PageParserKind.STREAMING,
+        robots: bool = False,
+        save_queue_memory_bytes: int = 256 * 2 ** 20,
+        save_queue_spill_dir: typing.Optional[pathlib.Path] = None,
+        metrics_port: typing.Optional[int] = None,
+        metrics_json_path: typing.Optional[pathlib.Path] = None,
+    ) -> None:
+        site_map_queue = PageSaveQueue(
+            max_memory_bytes=save_queue_memory_bytes, spill_dir=save_queue_spill_dir, metrics=self.metrics
         )
 
-        get_page_query = (
-            self.db_api_client.session.query(DbTablePage)
-                .join(DbTableSite.ref_pages)
-                .filter(*query_site_criterion, DbTablePage.url_path == url.path)
+        smc = SiteMapGenerator(
+            http_link_fetcher=self.http_link_fetcher,
+            page_parser=build_page_parser(kind=parser_kind),
+            on_save_queue=site_map_queue,
+            workers_count=concurrent_requests_limit,
+            robots=self.build_robots_cache(obey_rules=True) if robots else None,
+            metrics=self.metrics,
         )
-        # Update orw
-        if (page := get_page_query.scalar()) is not None:
-            if page.title != page_info.title or page.html != page_info.html:
-                page.title = page_info.title
-                page.html = page_info.html
-                self.db_api_client.session.add(page)
-                self.db_api_client.session.commit()
-            return
-
-        # Create row
-        page = DbTablePage(
-            url_path=url.path,
-            title=page_info.title,
-            html=page_info.html
+        page_writer = PageBatchWriter(
+            db_client=self.db_api_client, html_storage=html_storage, bulk_copy=bulk_copy, metrics=self.metrics
         )
-
-        site: typing.Optional[DbTableSite] = (
-            self.db_api_client.session
-                .query(DbTableSite)
-                .filter(*query_site_criterion)
-                .scalar()
+        frontier_worker = FrontierWorker(
+            generator=smc,
+            db_client=self.db_api_client,
+            page_writer=page_writer,
+            save_queue=site_map_queue,
+            worker_id=worker_id,
+            claim_size=claim_size,
+            lease=lease,
+            crawl_id=crawl_id,
+            restart=restart,
         )
-        if site is not None:
-            page.ref_site = site
-        else:
-            created_site = DbTableSite(scheme=url.scheme, hostname=url.host, port=url.port)
-            page.ref_site = created_site
 
-        self.db_api_client.session.add(page)
-        self.db_api_client.session.commit()
+        metrics_server = await self.start_metrics_server(port=metrics_port)
+        saving_task = self.start_saving(page_writer, save_queue=site_map_queue)
+        try:
+            await self.crawl_while_saving(frontier_worker.run(url=url, depth=depth), saving_task=saving_task)
+        finally:
+            await self.graceful_shutdown()
+
+            await self.stop_saving(saving_task, save_queue=site_map_queue)
+            await self.stop_metrics_server(metrics_server, json_path=metrics_json_path)
+
+    def start_saving(self, page_writer: PageBatchWriter, save_queue: PageSaveQueue) -> asyncio.Future:
+        """ Run the writer, the queue is closed when it stops, so the puts fail instead of waiting for it """
+        saving_task = asyncio.ensure_future(page_writer.run(save_queue, self._stop_event))
+        saving_task.add_done_callback(lambda _: save_queue.close())
+        return saving_task
+
+    @staticmethod
+    async def crawl_while_saving(crawl: typing.Awaitable[None], saving_task: asyncio.Future) -> None:
+        """ Run the crawl until it is complete, it is cancelled when the writer stops before it """
+        crawl_task = asyncio.ensure_future(crawl)
+        try:
+            await asyncio.wait({crawl_task, saving_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not crawl_task.done():
+                crawl_task.cancel()
+                await asyncio.gather(crawl_task, return_exceptions=True)
+
+        if crawl_task.cancelled() and saving_task.done():
+            saving_task.result()  # the error of writer is raised if it failed
+            raise RuntimeError("The page writer stopped before the crawl is complete")
+
+        crawl_task.result()
+
+    async def stop_saving(self, saving_task: asyncio.Future, save_queue: PageSaveQueue) -> None:
+        """ Wait until the writer saves every queued page, it stops on the stop event once the queue is drained """
+        if not save_queue.empty():
+            logger.info(f"Waiting for {save_queue.qsize()} pages left in the queue to be saved")
+
+        try:
+            await saving_task
+        finally:
+            save_queue.close()
+
+    async def start_metrics_server(self, port: typing.Optional[int]) -> typing.Optional[web.AppRunner]:
+        if port is None:
+            return None
+        return await start_metrics_server(self.metrics, host="127.0.0.1", port=port)
+
+    async def stop_metrics_server(
+        self, metrics_server: typing.Optional[web.AppRunner], json_path: typing.Optional[pathlib.Path]
+    ) -> None:
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+
+        if json_path is not None:
+            self.metrics.dump_json(json_path)
+            logger.info(f"The metrics are saved to '{json_path}'")
 
     async def graceful_shutdown(self):
         await self.client_session.close()
         self._stop_event.set()
 
+        for host_rate_limiter in self.host_rate_limits:
+            logger.info(f"Host rate limit: {host_rate_limiter}")
+
     @cached_property
-    def page_parser(self) -> IPageParser:
-        return LxmlParser()
+    def metrics(self) -> MetricsRegistry:
+        metrics = MetricsRegistry()
+        add_process_metrics(metrics)
+        return metrics
 
     @cached_property
     def observer(self) -> Observer:
@@ -148,14 +321,29 @@ class CommandProvider:
 
     @cached_property
     def http_link_fetcher(self) -> HttpLinkFetcher:
-        return HttpLinkFetcher(client_session=self.client_session)
+        return HttpLinkFetcher(
+            client_session=self.client_session,
+            host_rate_limits=self.host_rate_limits,
+            max_body_size=self._settings.fetcher.max_body_size,
+            metrics=self.metrics,
+        )
+
+    def build_robots_cache(self, obey_rules: bool) -> RobotsCache:
+        return RobotsCache(
+            link_fetcher=self.http_link_fetcher, host_rate_limits=self.host_rate_limits, obey_rules=obey_rules
+        )
+
+    @cached_property
+    def host_rate_limits(self) -> HostRateLimits:
+        return HostRateLimits(**self._settings.host_rate_limit.dict())
 
     @cached_property
     def client_session(self) -> aiohttp.ClientSession:
         return aiohttp.ClientSession(
             connector=self.client_session_connector,
             headers={"User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:92.0) Gecko/20100101 Firefox/92.0"},
-            cookie_jar=aiohttp.DummyCookieJar()
+            cookie_jar=aiohttp.DummyCookieJar(),
+            trace_configs=[build_metrics_trace_config(self.metrics)],
         )
 
     @cached_property
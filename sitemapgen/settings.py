@@ -12,5 +12,29 @@ class PostgresSettings(pydantic.BaseSettings):
         env_prefix = "POSTGRES_"
 
 
+class HostRateLimitSettings(pydantic.BaseSettings):
+    initial_rate: float = pydantic.Field(default=10.0, gt=0)
+    min_rate: float = pydantic.Field(default=0.5, gt=0)
+    max_rate: float = pydantic.Field(default=100.0, gt=0)
+    increase_step: float = pydantic.Field(default=0.5, ge=0)
+    decrease_factor: float = pydantic.Field(default=0.5, gt=0, lt=1)
+    failures_threshold: int = pydantic.Field(default=5, ge=1)
+    cooldown: float = pydantic.Field(default=30.0, ge=0)
+    # The longest pause of host for Retry-After, the default is the max time of retries of request
+    max_retry_after: float = pydantic.Field(default=120.0, ge=0)
+
+    class Config:
+        env_prefix = "HOST_RATE_LIMIT_"
+
+
+class FetcherSettings(pydantic.BaseSettings):
+    max_body_size: int = pydantic.Field(default=10 * 2 ** 20, gt=0)
+
+    class Config:
+        env_prefix = "FETCHER_"
+
+
 class Settings(pydantic.BaseSettings):
     postgres: PostgresSettings = pydantic.Field(default_factory=PostgresSettings)
+    fetcher: FetcherSettings = pydantic.Field(default_factory=FetcherSettings)
+    host_rate_limit: HostRateLimitSettings = pydantic.Field(default_factory=HostRateLimitSettings)
@@ -0,0 +1,54 @@
+import codecs
+import re
+import typing
+
+
+_META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+
+# The encoding of browsers for the legacy pages which declare none, it is the superset of Latin-1
+FALLBACK_HTML_ENCODING = "cp1252"
+
+
+def detect_html_encoding(raw_html: bytes, http_charset: typing.Optional[str] = None) -> typing.Optional[str]:
+    """
+    Detect the encoding of HTML by its BOM, the charset of Content-Type header or the charset declared
+    in the first 1024 bytes. The undeclared encoding is UTF-8 if the body is valid in it, None otherwise.
+    """
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+        if raw_html.startswith(bom):
+            return encoding
+
+    if http_charset and (encoding := _lookup_encoding(http_charset)):
+        return encoding
+
+    if (match := _META_CHARSET_PATTERN.search(raw_html[:1024])) and (encoding := _lookup_encoding(match.group(1))):
+        return encoding
+
+    if _is_utf8(raw_html):
+        return "utf-8"
+
+    return None
+
+
+def decode_html(raw_html: bytes, http_charset: typing.Optional[str] = None) -> str:
+    """ Decode HTML by its detected encoding, the invalid bytes are replaced instead of failing the page """
+    encoding = detect_html_encoding(raw_html, http_charset=http_charset) or FALLBACK_HTML_ENCODING
+    return raw_html.decode(encoding, errors="replace")
+
+
+def _lookup_encoding(charset: typing.Union[str, bytes]) -> typing.Optional[str]:
+    try:
+        return codecs.lookup(charset.decode("ascii") if isinstance(charset, bytes) else charset).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+
+def _is_utf8(raw_html: bytes) -> bool:
+    if raw_html.isascii():
+        return True
+
+    try:
+        raw_html.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
@@ -1,13 +1,41 @@
+import enum
+import typing
+
 import lxml.etree
 import lxml.html
 
-from sitemapgen.cmds.generate_map import ParsePageResult
+from sitemapgen.cmds.generate_map import ParsePageResult, IPageParser
+from sitemapgen.utils.html_encoding import detect_html_encoding
+
+
+class PageParserKind(str, enum.Enum):
+    LXML = "lxml"
+    STREAMING = "streaming"
+
+
+def build_html_parser(
+    raw_html: typing.Union[str, bytes], http_charset: typing.Optional[str] = None, **parser_kwargs
+) -> lxml.html.HTMLParser:
+    """ The encoding is passed to the parser only when it is known, libxml2 detects it otherwise """
+    if isinstance(raw_html, bytes) and (encoding := detect_html_encoding(raw_html, http_charset=http_charset)):
+        parser_kwargs["encoding"] = encoding
+    return lxml.html.HTMLParser(**parser_kwargs)
 
 
 class LxmlParser:
 
-    def parse_html(self, raw_html: str) -> ParsePageResult:
-        parsed_html = lxml.html.fromstring(raw_html)
+    def parse_html(
+        self, raw_html: typing.Union[str, bytes], http_charset: typing.Optional[str] = None
+    ) -> ParsePageResult:
+        try:
+            return self._parse(raw_html, parser=build_html_parser(raw_html, http_charset=http_charset))
+        except UnicodeDecodeError:
+            # The body is invalid in its declared encoding, libxml2 detects the encoding and recovers from errors
+            return self._parse(raw_html, parser=lxml.html.HTMLParser())
+
+    def _parse(self, raw_html: typing.Union[str, bytes], parser: lxml.html.HTMLParser) -> ParsePageResult:
+        # The text of the tree is decoded lazily, so the invalid bytes fail the getting of title or links
+        parsed_html = lxml.html.fromstring(raw_html, parser=parser)
 
         title = self.get_title(html=parsed_html)
         links = self.get_links(html=parsed_html)
@@ -27,3 +55,70 @@ class LxmlParser:
         elements = html.xpath("//a[@href]")
 
         return [e.attrib['href'] for e in elements if e.attrib['href']]
+
+
+class _TitleAndLinksTarget:
+    """
+    The target of lxml parser that collects only the title and the links of page.
+
+    The callbacks do as little as possible, they are called for every tag and text of page.
+    Only the first title before <body> is taken like '/html/head/title' of the parsed tree.
+    """
+
+    def __init__(self) -> None:
+        self.title_parts: list[str] = []
+        self.links: list[str] = []
+        self._is_in_title = False
+        self._is_title_passed = False
+
+    def start(self, tag: str, attrib: dict[str, str]) -> None:
+        if tag == "a":
+            if href := attrib.get("href"):
+                self.links.append(href)
+        elif tag == "title":
+            self._is_in_title = not self._is_title_passed
+            self._is_title_passed = True
+            return
+        elif tag == "body":
+            self._is_title_passed = True
+
+        self._is_in_title = False
+
+    def end(self, tag: str) -> None:
+        if tag == "title":
+            self._is_in_title = False
+
+    def data(self, data: str) -> None:
+        if self._is_in_title:
+            self.title_parts.append(data)
+
+    def close(self) -> None:
+        pass
+
+
+class LxmlStreamingParser:
+    """ The parser that collects the title and the links by the parser events without building the tree """
+
+    def parse_html(
+        self, raw_html: typing.Union[str, bytes], http_charset: typing.Optional[str] = None
+    ) -> ParsePageResult:
+        target = _TitleAndLinksTarget()
+        try:
+            self._feed(raw_html, parser=build_html_parser(raw_html, http_charset=http_charset, target=target))
+        except UnicodeDecodeError:
+            # The body is invalid in its declared encoding, libxml2 detects the encoding and recovers from errors
+            target = _TitleAndLinksTarget()
+            self._feed(raw_html, parser=lxml.html.HTMLParser(target=target))
+
+        return ParsePageResult(title="".join(target.title_parts) or "No title", links=target.links)
+
+    @staticmethod
+    def _feed(raw_html: typing.Union[str, bytes], parser: lxml.html.HTMLParser) -> None:
+        parser.feed(raw_html)
+        parser.close()
+
+
+def build_page_parser(kind: PageParserKind) -> IPageParser:
+    if kind == PageParserKind.LXML:
+        return LxmlParser()
+    return LxmlStreamingParser()
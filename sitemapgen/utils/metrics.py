@@ -0,0 +1,202 @@
+import bisect
+import contextlib
+import json
+import logging
+import math
+import os
+import resource
+import sys
+import time
+import typing
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.value = 0.0
+
+    def inc(self, value: float = 1.0) -> None:
+        self.value += value
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {"type": "counter", "value": self.value}
+
+    def render(self) -> list[str]:
+        return [f"{self.name} {_format_number(self.value)}"]
+
+
+class Gauge:
+    """ The value read from the callback at the moment of export (e.g. the queue size) """
+
+    def __init__(self, name: str, help_text: str, get_value: typing.Callable[[], float]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._get_value = get_value
+
+    @property
+    def value(self) -> float:
+        return float(self._get_value())
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {"type": "gauge", "value": self.value}
+
+    def render(self) -> list[str]:
+        return [f"{self.name} {_format_number(self.value)}"]
+
+
+class Histogram:
+    """ The count of observations per bucket of upper bounds, the quantiles are interpolated in the buckets """
+
+    def __init__(self, name: str, help_text: str, buckets: typing.Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> typing.Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        cumulative_count = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if cumulative_count + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower_bound = self.buckets[i - 1] if i else 0.0
+                return lower_bound + (self.buckets[i] - lower_bound) * (rank - cumulative_count) / bucket_count
+            cumulative_count += bucket_count
+
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "type": "histogram",
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                _format_number(bound): count for bound, count in zip((*self.buckets, math.inf), self.bucket_counts)
+            },
+        }
+
+    def render(self) -> list[str]:
+        lines = []
+        cumulative_count = 0
+        for bound, bucket_count in zip((*self.buckets, math.inf), self.bucket_counts):
+            cumulative_count += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{_format_number(bound)}"}} {cumulative_count}')
+        lines.append(f"{self.name}_sum {_format_number(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+Metric = typing.Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """
+    The metrics of crawl exported in the Prometheus text format and as JSON.
+
+    The metrics are got or created by name, so the components sharing the registry share the metrics.
+    They are not locked, every metric must be updated by one thread (the event loop or the writer thread).
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get_or_add(Counter(name=name, help_text=help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: typing.Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_add(Histogram(name=name, help_text=help_text, buckets=buckets))
+
+    def gauge(self, name: str, help_text: str, get_value: typing.Callable[[], float]) -> Gauge:
+        """ Add the gauge, the callback replaces the one of gauge added before """
+        gauge = self._metrics[name] = Gauge(name=name, help_text=help_text, get_value=get_value)
+        return gauge
+
+    def get(self, name: str) -> typing.Optional[Metric]:
+        return self._metrics.get(name)
+
+    def to_dict(self) -> dict[str, dict[str, typing.Any]]:
+        return {name: metric.to_dict() for name, metric in self._metrics.items()}
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.to_dict()['type']}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path: typing.Union[str, os.PathLike]) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def _get_or_add(self, metric: Metric) -> typing.Any:
+        existing_metric = self._metrics.setdefault(metric.name, metric)
+        if type(existing_metric) is not type(metric):
+            raise ValueError(f"The metric '{metric.name}' is already added as {type(existing_metric).__name__}")
+        return existing_metric
+
+
+def add_process_metrics(registry: MetricsRegistry) -> None:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss_unit = 1 if sys.platform == "darwin" else 1024
+    registry.gauge(
+        "sitemapgen_process_max_rss_bytes",
+        "The peak resident memory of the process",
+        lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * max_rss_unit,
+    )
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> web.AppRunner:
+    """ Serve the metrics on http://host:port/metrics in the Prometheus text format, ?format=json gives JSON """
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        if request.query.get("format") == "json":
+            return web.json_response(registry.to_dict())
+        return web.Response(text=registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"The metrics are served on http://{host}:{port}/metrics")
+    return runner
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
@@ -1,3 +1,5 @@
+import enum
+import functools
 import typing
 import urllib.parse
 
@@ -13,12 +15,21 @@ def is_url_scheme_is_http(url: str) -> bool:
 
 
 def is_url_relative(url: str) -> bool:
-    return url.startswith("/")
+    """ Whether URL has no scheme and must be joined to the page URL: `/x`, `../x`, `x.html`, `//host/x` """
+    return not urllib.parse.urlsplit(url).scheme
+
+
+def is_host_internal(host: typing.Optional[str], base_url_host: str) -> bool:
+    """ Whether the host is the base host itself or its subdomain """
+    if not host:
+        return False
+
+    return host == base_url_host or host.endswith(f".{base_url_host}")
 
 
 def is_url_internal(url: str, base_url_host: str) -> bool:
     curr = yarl.URL(url)
-    return curr.host.endswith(base_url_host)
+    return is_host_internal(curr.host, base_url_host.lower())
 
 
 def convert_relative_url_to_absolute(url: str, base_url: str) -> str:
@@ -39,3 +50,86 @@ def get_base_url(url: str) -> str:
         raise ValueError(f"The URL is not absolute for get base of it: {url}")
 
     return build_base_url(scheme=absolute_url.scheme, hostname=absolute_url.host, port=absolute_url.port)
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def canonicalize_url(url: typing.Union[str, yarl.URL]) -> str:
+    url_ = url if isinstance(url, yarl.URL) else yarl.URL(url)
+
+    if not url_.is_absolute():
+        raise ValueError(f"The URL is not absolute for canonicalize it: {url}")
+
+    return _build_canonical_url(url_)
+
+
+def _build_canonical_url(url: yarl.URL) -> str:
+    """ Lowercase scheme and host, no default port and fragment, sorted query; yarl already resolved dot segments """
+    netloc = url.host_subcomponent
+    if not url.is_default_port():
+        netloc = f"{netloc}:{url.port}"
+
+    query = url.raw_query_string
+    if query:
+        query = "?" + "&".join(sorted(query.split("&")))
+
+    return f"{url.scheme}://{netloc}{url.raw_path or '/'}{query}"
+
+
+class LinkKind(str, enum.Enum):
+    INTERNAL = "internal"
+    EXTERNAL = "external"
+    NOT_HTTP = "not_http"
+    ELEMENT_REFERENCE = "element_reference"
+    INVALID = "invalid"
+
+
+class ResolvedLink(typing.NamedTuple):
+    kind: LinkKind
+    url: typing.Optional[str]
+
+
+class UrlCanonicalizer:
+    """
+    Resolve the link against its page, canonicalize and classify it with one URL parse.
+
+    The results are memoised in the bounded LRU keyed by (page URL, link), the absolute links are keyed
+    without the page URL, so the navigation links repeated on every page are parsed once.
+    """
+
+    HTTP_SCHEMES = ("http", "https")
+
+    def __init__(self, base_url_host: str, cache_size: int = 2 ** 16) -> None:
+        self._base_url_host = base_url_host.lower()
+        self._resolve_cached = functools.lru_cache(maxsize=cache_size)(self._resolve)
+        self._parse_page_url = functools.lru_cache(maxsize=64)(yarl.URL)
+
+    def resolve(self, page_url: str, link: str) -> ResolvedLink:
+        if is_url_reference_to_html_element(link):
+            return ResolvedLink(kind=LinkKind.ELEMENT_REFERENCE, url=None)
+
+        if link[:8].lower().startswith(("http://", "https://")):
+            return self._resolve_cached(None, link)
+
+        return self._resolve_cached(page_url, link)
+
+    def _resolve(self, page_url: typing.Optional[str], link: str) -> ResolvedLink:
+        try:
+            url = yarl.URL(link)
+            if page_url is not None:
+                url = self._parse_page_url(page_url).join(url)
+        except ValueError:
+            return ResolvedLink(kind=LinkKind.INVALID, url=None)
+
+        if url.scheme not in self.HTTP_SCHEMES:
+            return ResolvedLink(kind=LinkKind.NOT_HTTP, url=None)
+
+        if not url.host:
+            return ResolvedLink(kind=LinkKind.INVALID, url=None)
+
+        kind = LinkKind.INTERNAL if is_host_internal(url.host, self._base_url_host) else LinkKind.EXTERNAL
+        return ResolvedLink(kind=kind, url=_build_canonical_url(url))
+
+    def __str__(self) -> str:
+        cache_info = self._resolve_cached.cache_info()
+        hit_rate = cache_info.hits / max(cache_info.hits + cache_info.misses, 1)
+        return f"{cache_info.currsize} cached links, hit rate {hit_rate:.1%}"
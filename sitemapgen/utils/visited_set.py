@@ -0,0 +1,172 @@
+import array
+import enum
+import hashlib
+import math
+import typing
+
+from sitemapgen.utils.url_tools import canonicalize_url
+
+
+class VisitedSetKind(str, enum.Enum):
+    FINGERPRINT = "fingerprint"
+    BLOOM = "bloom"
+
+
+class IVisitedSet(typing.Protocol):
+    def add(self, url: str) -> bool:
+        ...
+
+    def __contains__(self, url: str) -> bool:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        ...
+
+    @property
+    def false_positive_rate(self) -> float:
+        ...
+
+
+def url_fingerprint(url: str) -> int:
+    """ The 64-bit fingerprint of the canonical form of URL """
+    digest = hashlib.blake2b(canonicalize_url(url).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class FingerprintSet:
+    """ The open-addressing hash set of 64-bit URL fingerprints stored in a flat array """
+
+    _EMPTY_SLOT = 0
+    _MAX_LOAD_FACTOR = 0.6
+
+    def __init__(self, initial_capacity: int = 1024) -> None:
+        capacity = 1 << max(initial_capacity - 1, 1).bit_length()
+        self._slots = array.array("Q", bytes(8 * capacity))
+        self._mask = capacity - 1
+        self._size = 0
+
+    def add(self, url: str) -> bool:
+        """ Add URL to the set and return whether it was not there before """
+        return self.add_fingerprint(url_fingerprint(url))
+
+    def add_fingerprint(self, fingerprint: int) -> bool:
+        fingerprint = fingerprint or 1  # the zero is reserved for the empty slot
+
+        index = self._find_slot(fingerprint)
+        if self._slots[index] == fingerprint:
+            return False
+
+        self._slots[index] = fingerprint
+        self._size += 1
+        if self._size > len(self._slots) * self._MAX_LOAD_FACTOR:
+            self._grow()
+
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        fingerprint = url_fingerprint(url) or 1
+        return self._slots[self._find_slot(fingerprint)] == fingerprint
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return (slot for slot in self._slots if slot != self._EMPTY_SLOT)
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        return self._slots.itemsize * len(self._slots)
+
+    @property
+    def false_positive_rate(self) -> float:
+        """ The probability that a new URL collides with one of the stored fingerprints """
+        return self._size / 2 ** 64
+
+    def _find_slot(self, fingerprint: int) -> int:
+        slots, mask = self._slots, self._mask
+        index = fingerprint & mask
+        while slots[index] != self._EMPTY_SLOT and slots[index] != fingerprint:
+            index = (index + 1) & mask
+        return index
+
+    def _grow(self) -> None:
+        old_slots = self._slots
+        self._slots = array.array("Q", bytes(16 * len(old_slots)))
+        self._mask = len(self._slots) - 1
+
+        for fingerprint in old_slots:
+            if fingerprint != self._EMPTY_SLOT:
+                self._slots[self._find_slot(fingerprint)] = fingerprint
+
+    def __str__(self) -> str:
+        return (
+            f"{self._size} URLs in {self.memory_usage_bytes / 2 ** 20:.2f} MiB, "
+            f"false positive rate {self.false_positive_rate:.2e}"
+        )
+
+
+class BloomFilterSet:
+    """ The Bloom filter of URLs with the bounded memory and a small rate of false positives """
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.001) -> None:
+        if capacity < 1:
+            raise ValueError(f"The capacity must be positive: {capacity}")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"The error rate must be between 0 and 1: {error_rate}")
+
+        self._bits_count = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._hashes_count = max(1, round(self._bits_count / capacity * math.log(2)))
+        self._bits = bytearray(math.ceil(self._bits_count / 8))
+        self._size = 0
+
+    def add(self, url: str) -> bool:
+        """ Add URL to the filter and return whether it was not there before """
+        is_added = False
+        for index in self._bit_indexes(url):
+            byte_index, mask = index >> 3, 1 << (index & 7)
+            if not self._bits[byte_index] & mask:
+                self._bits[byte_index] |= mask
+                is_added = True
+
+        if is_added:
+            self._size += 1
+        return is_added
+
+    def __contains__(self, url: str) -> bool:
+        return all(self._bits[index >> 3] & (1 << (index & 7)) for index in self._bit_indexes(url))
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        return len(self._bits)
+
+    @property
+    def false_positive_rate(self) -> float:
+        """ The estimated probability that a new URL is reported as already visited """
+        return (1 - math.exp(-self._hashes_count * self._size / self._bits_count)) ** self._hashes_count
+
+    def _bit_indexes(self, url: str) -> typing.Iterator[int]:
+        digest = hashlib.blake2b(canonicalize_url(url).encode(), digest_size=16).digest()
+        hash_1 = int.from_bytes(digest[:8], "little")
+        hash_2 = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self._hashes_count):
+            yield (hash_1 + i * hash_2) % self._bits_count
+
+    def __str__(self) -> str:
+        return (
+            f"~{self._size} URLs in {self.memory_usage_bytes / 2 ** 20:.2f} MiB "
+            f"({self._hashes_count} hashes), false positive rate {self.false_positive_rate:.2e}"
+        )
+
+
+def build_visited_set(kind: VisitedSetKind, capacity: int) -> IVisitedSet:
+    if kind == VisitedSetKind.BLOOM:
+        return BloomFilterSet(capacity=capacity)
+    return FingerprintSet()
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+from sitemapgen.db.api_client import _copy_rows, _format_copy_value
+
+
+class RecordingCursor:
+    def __init__(self) -> None:
+        self.statement = ""
+        self.data = ""
+
+    def __enter__(self) -> "RecordingCursor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def copy_expert(self, statement: str, data: io.StringIO) -> None:
+        self.statement = statement
+        self.data = data.read()
+
+
+class RecordingConnection:
+    """ The SQLAlchemy connection stub which records the COPY statement and its data """
+
+    def __init__(self) -> None:
+        self.recording_cursor = RecordingCursor()
+        self.connection = self
+
+    def cursor(self) -> RecordingCursor:
+        return self.recording_cursor
+
+
+@pytest.mark.parametrize("value, copy_value", [
+    (None, "\\N"),
+    ("", ""),
+    (42, "42"),
+    ("plain text", "plain text"),
+    ("a\tb", "a\\tb"),
+    ("line 1\nline 2\r\n", "line 1\\nline 2\\r\\n"),
+    ("C:\\path", "C:\\\\path"),
+    ("\\N", "\\\\N"),
+    ("NULL", "NULL"),
+])
+def test_format_copy_value(value, copy_value: str):
+    assert _format_copy_value(value) == copy_value
+
+
+@pytest.mark.parametrize("value, copy_value", [
+    ([], "{}"),
+    (["http://example.com/a", "http://example.com/b"], '{"http://example.com/a","http://example.com/b"}'),
+    (("NULL", "a,b", "{c}"), '{"NULL","a,b","{c}"}'),
+    (['say "hi"'], '{"say \\\\"hi\\\\""}'),
+    (["C:\\path"], '{"C:\\\\\\\\path"}'),
+    (["a\tb\nc"], '{"a\\tb\\nc"}'),
+])
+def test_format_copy_array_value(value, copy_value: str):
+    assert _format_copy_value(value) == copy_value
+
+
+def test_copy_rows_keeps_one_line_per_row():
+    connection = RecordingConnection()
+    rows = [(1, "Title\twith tab", None), (2, "Multi\nline", ["/a"])]
+
+    _copy_rows(connection, table_name="page_staging", columns=("id", "title", "links"), rows=rows)
+
+    assert connection.recording_cursor.statement == "COPY page_staging (id, title, links) FROM STDIN"
+    assert connection.recording_cursor.data.splitlines() == [
+        "1\tTitle\\twith tab\t\\N",
+        '2\tMulti\\nline\t{"/a"}',
+    ]
@@ -0,0 +1,140 @@
+import asyncio
+import dataclasses
+import pickle
+import threading
+import time
+
+import pytest
+
+from sitemapgen.cmds.checkpoint import CrawlCheckpoint, CrawlCheckpointer
+from sitemapgen.cmds.generate_map import FrontierEntry, PageInfo
+from sitemapgen.cmds.save_queue import PageSaveQueue
+from sitemapgen.utils.visited_set import BloomFilterSet, FingerprintSet, IVisitedSet
+
+FRONTIER = [FrontierEntry(depth=2, url="http://example.com/a"), FrontierEntry(depth=3, url="http://example.com/a/b")]
+
+
+class StaticGenerator:
+    def get_frontier_snapshot(self) -> list[FrontierEntry]:
+        return list(FRONTIER)
+
+
+class StaticPageWriter:
+    def __init__(self, pending_pages: list[PageInfo]) -> None:
+        self.pending_pages = pending_pages
+
+
+def build_page(path: str) -> PageInfo:
+    return PageInfo(url=f"http://example.com{path}", title="Page", html="<html></html>", links=[], etag='"1"')
+
+
+def build_checkpointer(tmp_path, visited_urls: IVisitedSet, **checkpointer_kwargs) -> CrawlCheckpointer:
+    page_queue = PageSaveQueue(max_memory_bytes=2 ** 20)
+    page_queue.put_nowait(build_page("/queued"))
+    return CrawlCheckpointer(
+        path=tmp_path / "crawl.checkpoint",
+        url="http://example.com/",
+        generator=StaticGenerator(),
+        visited_urls=visited_urls,
+        page_queue=page_queue,
+        page_writer=StaticPageWriter([build_page("/pending")]),
+        **checkpointer_kwargs,
+    )
+
+
+@pytest.mark.parametrize("visited_urls", [FingerprintSet(), BloomFilterSet(capacity=1000)])
+def test_checkpoint_round_trip(tmp_path, visited_urls: IVisitedSet):
+    visited_urls.add("http://example.com/")
+    visited_urls.add("http://example.com/pending")
+    checkpointer = build_checkpointer(tmp_path, visited_urls)
+
+    asyncio.run(checkpointer.save())
+    checkpoint = CrawlCheckpointer.load(tmp_path / "crawl.checkpoint")
+
+    assert checkpoint.url == "http://example.com/"
+    assert checkpoint.get_frontier() == FRONTIER
+    assert [page_info.url for page_info in checkpoint.pending_pages] == [
+        "http://example.com/pending", "http://example.com/queued"
+    ]
+    assert checkpoint.pending_pages[0].etag == '"1"'
+    assert checkpoint.spilled_pages_count == 0
+    assert list(CrawlCheckpointer.iter_spilled_pages(tmp_path / "crawl.checkpoint")) == []
+
+    restored_visited_urls = checkpoint.get_visited_urls()
+    assert type(restored_visited_urls) is type(visited_urls)
+    assert len(restored_visited_urls) == 2
+    assert "http://example.com/pending" in restored_visited_urls
+    assert "http://example.com/other" not in restored_visited_urls
+
+
+def test_checkpoint_is_replaced_and_removed(tmp_path):
+    checkpointer = build_checkpointer(tmp_path, FingerprintSet())
+
+    asyncio.run(checkpointer.save())
+    asyncio.run(checkpointer.save())
+    assert [path.name for path in tmp_path.iterdir()] == ["crawl.checkpoint"]
+
+    checkpointer.remove()
+    checkpointer.remove()
+    assert not list(tmp_path.iterdir())
+
+
+def test_checkpoint_is_saved_periodically_until_stop(tmp_path):
+    checkpointer = build_checkpointer(tmp_path, FingerprintSet(), interval=0.01)
+
+    async def run() -> None:
+        stop_event = asyncio.Event()
+        run_task = asyncio.ensure_future(checkpointer.run(stop_event))
+        while not (tmp_path / "crawl.checkpoint").exists():
+            await asyncio.sleep(0.01)
+
+        stop_event.set()
+        await asyncio.wait_for(run_task, 1)
+
+    asyncio.run(run())
+    assert CrawlCheckpointer.load(tmp_path / "crawl.checkpoint").url == "http://example.com/"
+
+
+def test_checkpoint_of_other_version_is_not_loaded(tmp_path):
+    checkpoint, spilled_pages = build_checkpointer(tmp_path, FingerprintSet()).take()
+    spilled_pages.release()
+
+    path = tmp_path / "old.checkpoint"
+    path.write_bytes(pickle.dumps(dataclasses.replace(checkpoint, version=1)))
+    with pytest.raises(ValueError):
+        CrawlCheckpointer.load(path)
+
+    path.write_bytes(pickle.dumps({"url": "http://example.com/"}))
+    with pytest.raises(ValueError):
+        CrawlCheckpointer.load(path)
+
+    path.write_bytes(pickle.dumps(checkpoint))
+    assert isinstance(CrawlCheckpointer.load(path), CrawlCheckpoint)
+
+
+def test_checkpoint_is_not_recreated_after_periodic_saving_is_stopped(tmp_path):
+    checkpointer = build_checkpointer(tmp_path, FingerprintSet(), interval=0.01)
+    write = checkpointer._write
+    is_writing = threading.Event()
+
+    def write_slowly(*args) -> None:
+        is_writing.set()
+        time.sleep(0.05)
+        write(*args)
+
+    checkpointer._write = write_slowly
+
+    async def run() -> None:
+        stop_event = asyncio.Event()
+        run_task = asyncio.ensure_future(checkpointer.run(stop_event))
+        while not is_writing.is_set():
+            await asyncio.sleep(0.005)
+
+        # The saving in progress is finished before the task stops, so the file is not written after removal
+        stop_event.set()
+        await asyncio.wait_for(run_task, 1)
+        checkpointer.remove()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import typing
+
+from sitemapgen.cmds.frontier_worker import FrontierWorker
+from sitemapgen.cmds.generate_map import SiteMapGenerator
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.cmds.save_queue import PageSaveQueue
+from sitemapgen.http_tools.link_fetcher import FetchedPage
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+
+PAGES = {
+    "http://example.com/": b'<html><a href="/a">A</a><a href="/b">B</a></html>',
+}
+
+
+class FrontierRow(typing.NamedTuple):
+    id: int
+    url: str
+    depth: int
+
+
+class MemoryFrontierDatabaseApiClient:
+    """ The frontier of one worker in memory, the completed and extended entries are recorded """
+
+    def __init__(self) -> None:
+        self.rows: dict[str, FrontierRow] = {}
+        self.claimed_ids: set[int] = set()
+        self.done_ids: set[int] = set()
+        self.extended_ids: set[int] = set()
+
+    def add_frontier_entries(self, crawl: str, entries: list[tuple[str, int]]) -> None:
+        for url, depth in entries:
+            self.rows.setdefault(url, FrontierRow(id=len(self.rows) + 1, url=url, depth=depth))
+
+    def claim_frontier_entries(self, crawl: str, worker_id: str, limit: int, lease: float) -> list[FrontierRow]:
+        claimed_rows = [row for row in self.rows.values() if row.id not in self.claimed_ids][:limit]
+        self.claimed_ids.update(row.id for row in claimed_rows)
+        return claimed_rows
+
+    def extend_frontier_leases(self, worker_id: str, entry_ids: list[int], lease: float) -> int:
+        self.extended_ids.update(entry_ids)
+        return len(entry_ids)
+
+    def complete_frontier_entries(self, worker_id: str, entry_ids: list[int]) -> None:
+        self.done_ids.update(entry_ids)
+
+    def has_unfinished_frontier_entries(self, crawl: str) -> bool:
+        return len(self.done_ids) < len(self.rows)
+
+
+class BlockingDatabaseApiClient:
+    """ The database client of the writer which saves the pages only when it is available """
+
+    def __init__(self) -> None:
+        self.is_available = threading.Event()
+        self.url_paths: list[str] = []
+
+    def select_site_ids(self) -> dict[tuple, int]:
+        return {}
+
+    def create_site(self, site_key: tuple) -> int:
+        return 1
+
+    def upsert_pages(self, rows: list[dict], blob_rows: list[dict], page_links: dict) -> None:
+        self.is_available.wait()
+        self.url_paths.extend(row["url_path"] for row in rows)
+
+
+class StaticLinkFetcher:
+    async def get_page(self, url: str, **request_kwargs) -> FetchedPage:
+        return FetchedPage(status=200, body=PAGES.get(url, b"<html></html>"))
+
+
+async def run_worker(
+    frontier_db: MemoryFrontierDatabaseApiClient,
+    pages_db: BlockingDatabaseApiClient,
+    lease: float,
+    check: typing.Callable[[], typing.Awaitable[None]],
+) -> None:
+    save_queue = PageSaveQueue(max_memory_bytes=2 ** 20)
+    page_writer = PageBatchWriter(db_client=pages_db, flush_interval=0.01)
+    generator = SiteMapGenerator(
+        http_link_fetcher=StaticLinkFetcher(),
+        page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+        on_save_queue=save_queue,
+    )
+    worker = FrontierWorker(
+        generator=generator,
+        db_client=frontier_db,
+        page_writer=page_writer,
+        save_queue=save_queue,
+        worker_id="worker",
+        lease=lease,
+        poll_interval=0.01,
+    )
+
+    stop_event = asyncio.Event()
+    saving_task = asyncio.ensure_future(page_writer.run(save_queue, stop_event))
+    worker_task = asyncio.ensure_future(worker.run(url="http://example.com/", depth=2))
+    try:
+        await check()
+        pages_db.is_available.set()
+        await asyncio.wait_for(worker_task, 1)
+    finally:
+        pages_db.is_available.set()
+        stop_event.set()
+        await asyncio.wait_for(saving_task, 1)
+
+
+async def wait_for(condition: typing.Callable[[], bool]) -> None:
+    async def wait() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), 1)
+
+
+def test_entries_are_done_when_pages_are_saved():
+    frontier_db = MemoryFrontierDatabaseApiClient()
+    pages_db = BlockingDatabaseApiClient()
+
+    async def check() -> None:
+        # Every entry is processed, but their pages are not saved yet
+        await wait_for(lambda: len(frontier_db.claimed_ids) == 3)
+        await asyncio.sleep(0.05)
+        assert not frontier_db.done_ids
+
+    asyncio.run(run_worker(frontier_db, pages_db, lease=60, check=check))
+
+    assert frontier_db.done_ids == {1, 2, 3}
+    assert sorted(pages_db.url_paths) == ["/", "/a", "/b"]
+
+
+def test_leases_are_extended_while_pages_are_saved():
+    frontier_db = MemoryFrontierDatabaseApiClient()
+    pages_db = BlockingDatabaseApiClient()
+
+    async def check() -> None:
+        await wait_for(lambda: frontier_db.extended_ids == {1, 2, 3})
+        assert not frontier_db.done_ids
+
+    asyncio.run(run_worker(frontier_db, pages_db, lease=0.06, check=check))
+
+    assert frontier_db.done_ids == {1, 2, 3}
@@ -0,0 +1,196 @@
+import asyncio
+
+from sitemapgen.cmds.generate_map import FrontierEntry, SiteMapGenerator, PageInfo, KnownPage
+from sitemapgen.db.html_storage import get_content_hash
+from sitemapgen.http_tools.link_fetcher import FetchedPage
+from sitemapgen.http_tools.robots import RobotsCache
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+
+CP1251_PAGE = (
+    '<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1251">'
+    "<title>Привет, мир</title></head>"
+    '<body><a href="/статья/1">Статья 1</a><a href="/about">О нас</a></body></html>'
+).encode("cp1251")
+
+
+class StaticLinkFetcher:
+    def __init__(self, pages: dict[str, bytes]) -> None:
+        self._pages = pages
+        self.fetched_urls: list[str] = []
+
+    async def get_page(self, url: str, **request_kwargs) -> FetchedPage:
+        self.fetched_urls.append(url)
+        return FetchedPage(status=200, body=self._pages.get(url, b"<html></html>"))
+
+    async def get_resource(self, url: str, **request_kwargs) -> FetchedPage:
+        if url not in self._pages:
+            return FetchedPage(status=404, body=b"")
+        return FetchedPage(status=200, body=self._pages[url])
+
+
+class StaticKnownPages:
+    def __init__(self, known_page: KnownPage) -> None:
+        self._known_page = known_page
+
+    async def get(self, url: str) -> KnownPage:
+        return self._known_page
+
+
+def build_generator(pages: dict[str, bytes], save_queue: asyncio.Queue, **generator_kwargs) -> SiteMapGenerator:
+    return SiteMapGenerator(
+        http_link_fetcher=StaticLinkFetcher(pages),
+        page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+        on_save_queue=save_queue,
+        **generator_kwargs,
+    )
+
+
+def test_crawl_cp1251_page():
+    save_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+    generator = build_generator({"http://example.com/": CP1251_PAGE}, save_queue=save_queue)
+
+    asyncio.run(generator.generate_map(url="http://example.com/", depth=2))
+
+    assert generator.statistics.pages_failed == 0
+    saved_pages = {page_info.url: page_info for page_info in (save_queue.get_nowait() for _ in range(3))}
+    assert save_queue.empty()
+    assert set(saved_pages) == {
+        "http://example.com/",
+        "http://example.com/%D1%81%D1%82%D0%B0%D1%82%D1%8C%D1%8F/1",
+        "http://example.com/about",
+    }
+
+    page_info = saved_pages["http://example.com/"]
+    assert page_info.title == "Привет, мир"
+    assert "Статья 1" in page_info.html
+    assert page_info.content_hash == get_content_hash(CP1251_PAGE)
+
+
+def test_unchanged_page_is_decoded_only_for_new_validators():
+    content_hash = get_content_hash(CP1251_PAGE)
+    pages = {"http://example.com/": CP1251_PAGE}
+
+    known_page = KnownPage(title="Привет, мир", links=[], content_hash=content_hash)
+    generator = build_generator(pages, save_queue=asyncio.Queue(), known_pages=StaticKnownPages(known_page))
+    page_info = asyncio.run(generator.get_page_result(url="http://example.com/"))
+    assert not page_info.is_modified
+    assert page_info.html == ""
+
+    known_page = KnownPage(title="Привет, мир", links=[], etag='"old"', content_hash=content_hash)
+    generator = build_generator(pages, save_queue=asyncio.Queue(), known_pages=StaticKnownPages(known_page))
+    page_info = asyncio.run(generator.get_page_result(url="http://example.com/"))
+    assert page_info.is_modified
+    assert "Привет, мир" in page_info.html
+    assert generator.statistics.pages_unchanged == 1
+
+
+def test_seed_disallowed_by_robots_is_not_fetched():
+    link_fetcher = StaticLinkFetcher({
+        "http://example.com/robots.txt": b"User-agent: *\nDisallow: /private/\n",
+        "http://example.com/private/": b'<html><a href="/public">Public</a></html>',
+    })
+    save_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+    generator = SiteMapGenerator(
+        http_link_fetcher=link_fetcher,
+        page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+        on_save_queue=save_queue,
+        robots=RobotsCache(link_fetcher=link_fetcher),
+    )
+
+    asyncio.run(generator.generate_map(url="http://example.com/private/", depth=2))
+
+    assert link_fetcher.fetched_urls == []
+    assert save_queue.empty()
+    assert generator.statistics.urls_disallowed == 1
+
+
+def test_page_is_decoded_by_charset_of_content_type():
+    class CharsetLinkFetcher(StaticLinkFetcher):
+        async def get_page(self, url: str, **request_kwargs) -> FetchedPage:
+            return FetchedPage(status=200, body=b"<title>Caf\xe9</title>", charset="iso-8859-1")
+
+    generator = SiteMapGenerator(
+        http_link_fetcher=CharsetLinkFetcher({}),
+        page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+        on_save_queue=asyncio.Queue(),
+    )
+    page_info = asyncio.run(generator.get_page_result(url="http://example.com/"))
+
+    assert page_info.title == "Café"
+    assert page_info.html == "<title>Café</title>"
+
+
+def test_streaming_crawl_stops_at_depth_limit():
+    link_fetcher = StaticLinkFetcher({
+        "http://example.com/": b'<a href="/a">A</a>',
+        "http://example.com/a": b'<a href="/b">B</a>',
+        "http://example.com/b": b'<a href="/c">C</a>',
+    })
+    generator = SiteMapGenerator(
+        http_link_fetcher=link_fetcher,
+        page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+        on_save_queue=asyncio.Queue(),
+        streaming=True,
+    )
+
+    asyncio.run(generator.generate_map(url="http://example.com/", depth=2))
+
+    assert link_fetcher.fetched_urls == ["http://example.com/", "http://example.com/a"]
+
+
+def test_streaming_crawl_does_not_wait_for_depth_level():
+    class SlowLinkFetcher(StaticLinkFetcher):
+        """ The slow page of depth 2 is fetched only after the page of depth 3 """
+
+        def __init__(self, pages: dict[str, bytes]) -> None:
+            super().__init__(pages)
+            self.deep_page_fetched = asyncio.Event()
+
+        async def get_page(self, url: str, **request_kwargs) -> FetchedPage:
+            if url == "http://example.com/slow":
+                await self.deep_page_fetched.wait()
+            if url == "http://example.com/fast/child":
+                self.deep_page_fetched.set()
+            return await super().get_page(url, **request_kwargs)
+
+    async def run() -> list[str]:
+        link_fetcher = SlowLinkFetcher({
+            "http://example.com/": b'<a href="/slow">Slow</a><a href="/fast">Fast</a>',
+            "http://example.com/fast": b'<a href="/fast/child">Child</a>',
+        })
+        generator = SiteMapGenerator(
+            http_link_fetcher=link_fetcher,
+            page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+            on_save_queue=asyncio.Queue(),
+            workers_count=2,
+            streaming=True,
+        )
+        await asyncio.wait_for(generator.generate_map(url="http://example.com/", depth=3), 1)
+        return link_fetcher.fetched_urls
+
+    assert asyncio.run(run()) == [
+        "http://example.com/", "http://example.com/fast", "http://example.com/fast/child", "http://example.com/slow",
+    ]
+
+
+def test_streaming_frontier_hands_out_shallowest_entry_first():
+    link_fetcher = StaticLinkFetcher({"http://example.com/a": b'<a href="/a1">A1</a>'})
+    generator = SiteMapGenerator(
+        http_link_fetcher=link_fetcher,
+        page_parser=build_page_parser(kind=PageParserKind.STREAMING),
+        on_save_queue=asyncio.Queue(),
+        workers_count=1,
+        streaming=True,
+    )
+    resumed_frontier = [
+        FrontierEntry(depth=2, url="http://example.com/c"),
+        FrontierEntry(depth=1, url="http://example.com/b"),
+        FrontierEntry(depth=1, url="http://example.com/a"),
+    ]
+
+    asyncio.run(generator.generate_map(url="http://example.com/", depth=3, resumed_frontier=resumed_frontier))
+
+    # The link of depth 2 found on /a goes after /b of depth 1, but before /c of depth 2 by the URL order
+    assert link_fetcher.fetched_urls == [
+        "http://example.com/a", "http://example.com/b", "http://example.com/a1", "http://example.com/c",
+    ]
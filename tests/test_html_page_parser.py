@@ -0,0 +1,61 @@
+import pytest
+
+from sitemapgen.utils.html_encoding import decode_html, detect_html_encoding
+from sitemapgen.utils.html_page_parser import PageParserKind, build_page_parser
+
+CP1251_BODY = (
+    '<html><head><title>Привет</title></head><body><a href="/статья">Статья</a></body></html>'.encode("cp1251")
+)
+
+
+@pytest.fixture(params=list(PageParserKind))
+def page_parser(request):
+    return build_page_parser(kind=request.param)
+
+
+@pytest.mark.parametrize("raw_html, http_charset, encoding", [
+    (b"<title>Plain</title>", None, "utf-8"),
+    ("<title>Café</title>".encode("utf-8"), None, "utf-8"),
+    (b"<title>Caf\xe9</title>", None, None),
+    (b"<title>Caf\xe9</title>", "ISO-8859-1", "iso8859-1"),
+    (b'<meta charset="windows-1251"><title>\xcf\xf0\xe8</title>', None, "cp1251"),
+    # The charset of Content-Type header wins over <meta charset>, the BOM wins over both
+    (b'<meta charset="utf-8"><title>\xcf\xf0\xe8</title>', "windows-1251", "cp1251"),
+    (b'\xef\xbb\xbf<meta charset="windows-1251">', "windows-1251", "utf-8"),
+    (b'<meta charset="unknown"><title>Caf\xe9</title>', "unknown", None),
+])
+def test_detect_html_encoding(raw_html: bytes, http_charset, encoding):
+    assert detect_html_encoding(raw_html, http_charset=http_charset) == encoding
+
+
+def test_decode_undeclared_legacy_html():
+    assert decode_html(b"<title>Caf\xe9 \x80</title>") == "<title>Café €</title>"
+
+
+def test_parse_undeclared_latin1_page(page_parser):
+    result = page_parser.parse_html(b'<html><head><title>Caf\xe9</title></head><a href="/caf\xe9">a</a></html>')
+
+    assert result.title == "Café"
+    assert result.links == ["/café"]
+
+
+def test_parse_undeclared_utf8_page(page_parser):
+    result = page_parser.parse_html("<html><head><title>Привет</title></head></html>".encode("utf-8"))
+
+    assert result.title == "Привет"
+
+
+def test_parse_page_by_charset_of_content_type(page_parser):
+    result = page_parser.parse_html(CP1251_BODY, http_charset="windows-1251")
+
+    assert result.title == "Привет"
+    assert result.links == ["/статья"]
+
+    result = page_parser.parse_html(b"<title>Caf\xe9 \xa9</title>", http_charset="ISO-8859-1")
+    assert result.title == "Café ©"
+
+
+def test_parse_page_invalid_in_declared_encoding(page_parser):
+    result = page_parser.parse_html(b'<html><head><meta charset="utf-8"><title>Caf\xe9</title></head></html>')
+
+    assert result.title == "Café"
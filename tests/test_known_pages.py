@@ -0,0 +1,47 @@
+import asyncio
+import typing
+
+from sitemapgen.cmds.generate_map import KnownPage
+from sitemapgen.cmds.known_pages import DbKnownPages
+
+
+class KnownPageRow(typing.NamedTuple):
+    title: typing.Optional[str]
+    links: typing.Optional[list[str]]
+    etag: typing.Optional[str] = None
+    last_modified: typing.Optional[str] = None
+    content_hash: typing.Optional[str] = None
+
+
+class StaticDatabaseApiClient:
+    """ The database client stub which records the selected pages """
+
+    def __init__(self, rows: dict[tuple, KnownPageRow]) -> None:
+        self._rows = rows
+        self.selected_keys: list[tuple] = []
+
+    def select_known_page(self, site_key: tuple, url_path: str) -> typing.Optional[KnownPageRow]:
+        self.selected_keys.append((site_key, url_path))
+        return self._rows.get((site_key, url_path))
+
+
+def test_known_page_is_selected_by_url():
+    site_key = ("https", "example.com", 443)
+    db_client = StaticDatabaseApiClient({
+        (site_key, "/a"): KnownPageRow(title="A", links=["https://example.com/b"], etag='"1"', content_hash="hash"),
+        (site_key, "/failed"): KnownPageRow(title="[ERROR] 500", links=None),
+    })
+    known_pages = DbKnownPages(db_client=db_client)
+
+    async def run() -> list[typing.Optional[KnownPage]]:
+        return [
+            await known_pages.get(url)
+            for url in ("https://example.com/a", "https://example.com/failed", "https://example.com/new")
+        ]
+
+    assert asyncio.run(run()) == [
+        KnownPage(title="A", links=["https://example.com/b"], etag='"1"', content_hash="hash"),
+        None,
+        None,
+    ]
+    assert db_client.selected_keys == [(site_key, "/a"), (site_key, "/failed"), (site_key, "/new")]
@@ -0,0 +1,72 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from sitemapgen.http_tools.link_fetcher import FetchedPage, HttpLinkFetcher, PageSkippedError
+
+MAX_BODY_SIZE = 1024
+CP1251_PAGE = "<title>Привет</title>".encode("cp1251")
+
+
+async def get_cp1251_page(_: web.Request) -> web.Response:
+    return web.Response(body=CP1251_PAGE, headers={"Content-Type": "text/html; charset=windows-1251", "ETag": '"1"'})
+
+
+async def get_image(_: web.Request) -> web.Response:
+    return web.Response(body=b"\x89PNG", content_type="image/png")
+
+
+async def get_large_page(_: web.Request) -> web.Response:
+    return web.Response(body=b"x" * (MAX_BODY_SIZE + 1), content_type="text/html")
+
+
+async def stream_large_page(request: web.Request) -> web.StreamResponse:
+    """ The body without Content-Length, only the downloaded size shows it is too large """
+    response = web.StreamResponse(headers={"Content-Type": "text/html"})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    for _ in range(8):
+        await response.write(b"x" * MAX_BODY_SIZE)
+    await response.write_eof()
+    return response
+
+
+def build_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/page", get_cp1251_page)
+    app.router.add_get("/image.png", get_image)
+    app.router.add_get("/large", get_large_page)
+    app.router.add_get("/large-stream", stream_large_page)
+    return app
+
+
+def get_page(path: str, **request_kwargs) -> FetchedPage:
+    async def run() -> FetchedPage:
+        async with TestServer(build_app()) as server, aiohttp.ClientSession() as session:
+            link_fetcher = HttpLinkFetcher(client_session=session, max_body_size=MAX_BODY_SIZE)
+            return await link_fetcher.get_page(server.make_url(path), **request_kwargs)
+
+    return asyncio.run(run())
+
+
+def test_html_page_with_charset_of_content_type():
+    fetched_page = get_page("/page")
+
+    assert fetched_page.status == 200
+    assert fetched_page.body == CP1251_PAGE
+    assert fetched_page.charset == "windows-1251"
+    assert fetched_page.etag == '"1"'
+    assert fetched_page.html == "<title>Привет</title>"
+
+
+@pytest.mark.parametrize("path, message", [
+    ("/image.png", "The content type is not HTML: image/png"),
+    ("/large", f"The content length {MAX_BODY_SIZE + 1} exceeds {MAX_BODY_SIZE} bytes"),
+    ("/large-stream", f"The body exceeds {MAX_BODY_SIZE} bytes"),
+])
+def test_page_is_skipped(path: str, message: str):
+    with pytest.raises(PageSkippedError, match=message):
+        get_page(path)
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from sitemapgen.utils.metrics import Histogram, MetricsRegistry, start_metrics_server
+
+PROMETHEUS_TEXT = """\
+# HELP sitemapgen_pages_total The count of pages
+# TYPE sitemapgen_pages_total counter
+sitemapgen_pages_total 3
+# HELP sitemapgen_queue_size The size of queue
+# TYPE sitemapgen_queue_size gauge
+sitemapgen_queue_size 2.5
+# HELP sitemapgen_fetch_seconds The time of fetch
+# TYPE sitemapgen_fetch_seconds histogram
+sitemapgen_fetch_seconds_bucket{le="0.5"} 2
+sitemapgen_fetch_seconds_bucket{le="1"} 2
+sitemapgen_fetch_seconds_bucket{le="+Inf"} 3
+sitemapgen_fetch_seconds_sum 4.75
+sitemapgen_fetch_seconds_count 3
+"""
+
+
+def build_registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.counter("sitemapgen_pages_total", "The count of pages").inc(3)
+    registry.gauge("sitemapgen_queue_size", "The size of queue", lambda: 2.5)
+    histogram = registry.histogram("sitemapgen_fetch_seconds", "The time of fetch", buckets=(1.0, 0.5))
+    for value in (0.25, 0.5, 4.0):
+        histogram.observe(value)
+    return registry
+
+
+@pytest.mark.parametrize("q, value", [
+    (0.25, 0.5),
+    (0.5, 1.0),
+    (0.75, 1.5),
+    (1.0, 2.0),
+])
+def test_histogram_quantile_is_interpolated_in_bucket(q: float, value: float):
+    histogram = Histogram("sitemapgen_fetch_seconds", "The time of fetch", buckets=(1.0, 2.0, 4.0))
+    for observed_value in (0.5, 1.0, 1.5, 2.0):
+        histogram.observe(observed_value)
+
+    assert histogram.quantile(q) == pytest.approx(value)
+
+
+def test_histogram_quantile_out_of_buckets():
+    histogram = Histogram("sitemapgen_fetch_seconds", "The time of fetch", buckets=(1.0, 2.0))
+    assert histogram.quantile(0.5) == 0.0
+
+    histogram.observe(100.0)
+    assert histogram.quantile(0.5) == 2.0
+    assert histogram.bucket_counts == [0, 0, 1]
+
+
+def test_metrics_are_shared_by_name():
+    registry = MetricsRegistry()
+    counter = registry.counter("sitemapgen_pages_total", "The count of pages")
+
+    assert registry.counter("sitemapgen_pages_total", "The count of pages") is counter
+    with pytest.raises(ValueError):
+        registry.histogram("sitemapgen_pages_total", "The count of pages")
+
+
+def test_render_prometheus():
+    assert build_registry().render_prometheus() == PROMETHEUS_TEXT
+
+
+def test_dump_json(tmp_path):
+    build_registry().dump_json(tmp_path / "metrics.json")
+
+    metrics = json.loads((tmp_path / "metrics.json").read_text())
+    assert metrics["sitemapgen_pages_total"] == {"type": "counter", "value": 3.0}
+    assert metrics["sitemapgen_queue_size"] == {"type": "gauge", "value": 2.5}
+    assert metrics["sitemapgen_fetch_seconds"] == {
+        "type": "histogram",
+        "count": 3,
+        "sum": 4.75,
+        "p50": 0.375,
+        "p90": 1.0,
+        "p99": 1.0,
+        "buckets": {"0.5": 2, "1": 0, "+Inf": 1},
+    }
+
+
+def test_metrics_server():
+    async def run() -> tuple[str, dict]:
+        registry = build_registry()
+        runner = await start_metrics_server(registry, host="127.0.0.1", port=0)
+        try:
+            host, port = runner.addresses[0][:2]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://{host}:{port}/metrics") as response:
+                    text = await response.text()
+                async with session.get(f"http://{host}:{port}/metrics", params={"format": "json"}) as response:
+                    metrics = await response.json()
+        finally:
+            await runner.cleanup()
+        return text, metrics
+
+    text, metrics = asyncio.run(run())
+    assert text == PROMETHEUS_TEXT
+    assert metrics == build_registry().to_dict()
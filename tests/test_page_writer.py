@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+import sqlalchemy.exc
+
+from sitemapgen.cmds.generate_map import PageInfo
+from sitemapgen.cmds.page_writer import PageBatchWriter
+from sitemapgen.db.html_storage import HtmlStorage
+
+
+class PostgresError(Exception):
+    def __init__(self, message: str, pgcode: str) -> None:
+        super().__init__(message)
+        self.pgcode = pgcode
+
+
+class FlakyDatabaseApiClient:
+    """
+    The database client which keeps the saved blobs and pages, it fails the saving while is_failing is set
+    and the times of unavailable_count, the pages with the path of rejected_path are rejected.
+    """
+
+    def __init__(self, unavailable_count: int = 0, rejected_path: str = "") -> None:
+        self.is_failing = False
+        self.unavailable_count = unavailable_count
+        self.rejected_path = rejected_path
+        self.blob_hashes: list[str] = []
+        self.url_paths: list[str] = []
+        self._site_ids: dict[tuple, int] = {}
+
+    def select_site_ids(self) -> dict[tuple, int]:
+        return dict(self._site_ids)
+
+    def create_site(self, site_key: tuple) -> int:
+        return self._site_ids.setdefault(site_key, len(self._site_ids) + 1)
+
+    def upsert_pages(self, rows: list[dict], blob_rows: list[dict], page_links: dict) -> None:
+        if self.is_failing:
+            raise ConnectionError("The database is gone")
+        if self.unavailable_count:
+            self.unavailable_count -= 1
+            raise sqlalchemy.exc.OperationalError("INSERT", {}, PostgresError("server closed the connection", "08006"))
+        if any(row["url_path"] == self.rejected_path for row in rows):
+            raise sqlalchemy.exc.OperationalError("INSERT", {}, PostgresError("index row size exceeds", "54000"))
+
+        self.blob_hashes.extend(blob_row["content_hash"] for blob_row in blob_rows)
+        self.url_paths.extend(row["url_path"] for row in rows)
+
+    copy_pages = upsert_pages
+
+
+def build_page(url: str, html: str) -> PageInfo:
+    return PageInfo(url=url, title="Page", html=html, links=[])
+
+
+def test_blob_is_saved_again_after_failed_flush():
+    db_client = FlakyDatabaseApiClient()
+    writer = PageBatchWriter(db_client=db_client, html_storage=HtmlStorage.GZIP)
+
+    db_client.is_failing = True
+    with pytest.raises(ConnectionError):
+        writer.flush([build_page("http://example.com/a", "<html>same</html>")])
+
+    db_client.is_failing = False
+    writer.flush([build_page("http://example.com/b", "<html>same</html>")])
+    writer.flush([build_page("http://example.com/c", "<html>same</html>")])
+
+    assert len(db_client.blob_hashes) == 1
+
+
+def test_blob_hashes_are_bounded():
+    db_client = FlakyDatabaseApiClient()
+    writer = PageBatchWriter(db_client=db_client, html_storage=HtmlStorage.GZIP, stored_blob_hashes_limit=2)
+
+    writer.flush([build_page(f"http://example.com/{i}", f"<html>{i}</html>") for i in range(3)])
+    writer.flush([build_page("http://example.com/again", "<html>0</html>")])
+
+    # The first blob is evicted as the least recently used one, its insert is repeated and ignored by database
+    assert len(db_client.blob_hashes) == 4
+    assert writer.statistics.html_deduplicated_count == 0
+
+
+def build_pages(count: int) -> list[PageInfo]:
+    return [build_page(f"http://example.com/{i}", f"<html>{i}</html>") for i in range(count)]
+
+
+def test_flush_is_retried_while_database_is_unavailable():
+    db_client = FlakyDatabaseApiClient(unavailable_count=2)
+    writer = PageBatchWriter(db_client=db_client, flush_max_tries=3, flush_retry_delay=0.001)
+
+    asyncio.run(writer.save_batch(build_pages(3)))
+
+    assert db_client.url_paths == ["/0", "/1", "/2"]
+
+
+def test_writer_fails_when_database_stays_unavailable():
+    db_client = FlakyDatabaseApiClient(unavailable_count=3)
+    writer = PageBatchWriter(db_client=db_client, flush_max_tries=3, flush_retry_delay=0.001)
+
+    async def run() -> None:
+        page_queue: asyncio.Queue[PageInfo] = asyncio.Queue()
+        for page_info in build_pages(3):
+            page_queue.put_nowait(page_info)
+        stop_event = asyncio.Event()
+        stop_event.set()
+
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            await asyncio.wait_for(writer.run(page_queue, stop_event), 1)
+
+    asyncio.run(run())
+
+    # The batch is not dropped, it is saved by the checkpoint
+    assert [page_info.url for page_info in writer.pending_pages] == [f"http://example.com/{i}" for i in range(3)]
+    assert db_client.url_paths == []
+
+
+def test_rejected_page_is_isolated_from_batch():
+    db_client = FlakyDatabaseApiClient(rejected_path="/3")
+    writer = PageBatchWriter(db_client=db_client)
+
+    asyncio.run(writer.save_batch(build_pages(8)))
+
+    assert sorted(db_client.url_paths) == ["/0", "/1", "/2", "/4", "/5", "/6", "/7"]
+    assert writer.statistics.pages_rejected == 1
@@ -0,0 +1,141 @@
+import asyncio
+import email.utils
+import time
+
+import pytest
+
+from sitemapgen.http_tools.rate_limiter import HostRateLimiter, HostRateLimits, parse_retry_after
+
+
+def build_limiter(**limiter_kwargs) -> HostRateLimiter:
+    kwargs = dict(
+        host="example.com",
+        rate=10.0,
+        min_rate=1.0,
+        max_rate=12.0,
+        increase_step=1.0,
+        decrease_factor=0.5,
+        failures_threshold=3,
+        cooldown=30.0,
+        max_retry_after=120.0,
+    )
+    return HostRateLimiter(**{**kwargs, **limiter_kwargs})
+
+
+def measure_acquire(limiter: HostRateLimiter) -> float:
+    async def run() -> float:
+        started_at = time.monotonic()
+        await asyncio.wait_for(limiter.acquire(), 1)
+        return time.monotonic() - started_at
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("value, delay", [
+    (None, None),
+    ("", None),
+    ("120", 120.0),
+    (" 0 ", 0.0),
+    ("-5", None),
+    ("soon", None),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+])
+def test_parse_retry_after(value, delay):
+    assert parse_retry_after(value) == delay
+
+
+def test_parse_retry_after_http_date():
+    value = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert parse_retry_after(value) == pytest.approx(60, abs=2)
+
+
+def test_rate_is_increased_additively_up_to_max():
+    limiter = build_limiter()
+
+    limiter.on_success()
+    assert limiter.rate == 11.0
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.rate == 12.0
+
+
+def test_rate_is_decreased_multiplicatively_down_to_min():
+    limiter = build_limiter()
+
+    limiter.on_throttled(retry_after=None)
+    assert limiter.rate == 5.0
+    for _ in range(5):
+        limiter.on_throttled(retry_after=None)
+    assert limiter.rate == 1.0
+    assert limiter.throttled_count == 6
+
+    limiter.on_success()
+    assert limiter.rate == 2.0
+
+
+def test_max_rate_is_limited_by_crawl_delay():
+    limiter = build_limiter()
+
+    limiter.limit_max_rate(0.5)
+    assert limiter.rate == 0.5
+    limiter.on_success()
+    assert limiter.rate == 0.5
+    limiter.on_throttled(retry_after=None)
+    assert limiter.rate == 0.5
+
+
+def test_throttled_host_is_paused_for_retry_after():
+    limiter = build_limiter(rate=1000.0, max_rate=1000.0)
+    limiter.on_throttled(retry_after=0.2)
+
+    assert measure_acquire(limiter) >= 0.15
+
+
+def test_pause_for_retry_after_is_limited():
+    limiter = build_limiter(rate=1000.0, max_rate=1000.0, max_retry_after=0.2)
+    limiter.on_throttled(retry_after=86400.0)
+
+    assert 0.15 <= measure_acquire(limiter) < 1
+
+
+def test_circuit_is_opened_after_consecutive_failures():
+    limiter = build_limiter(cooldown=0.2)
+
+    limiter.on_connection_error()
+    limiter.on_success()
+    limiter.on_connection_error()
+    limiter.on_connection_error()
+    assert not limiter.is_circuit_open
+    assert measure_acquire(limiter) < 0.1
+
+    limiter.on_connection_error()
+    assert limiter.is_circuit_open
+    assert limiter.circuit_opened_count == 1
+    assert measure_acquire(limiter) >= 0.15
+
+    # The failure of the half-open circuit opens it again, the success closes it
+    limiter.on_connection_error()
+    assert limiter.circuit_opened_count == 2
+    limiter.on_success()
+    assert not limiter.is_circuit_open
+
+
+def test_host_rate_limits_keep_limiter_per_host():
+    host_rate_limits = HostRateLimits(initial_rate=2.0, min_rate=1.0, max_rate=4.0)
+
+    limiter = host_rate_limits.get("example.com")
+    limiter.on_success()
+    assert host_rate_limits.get("example.com") is limiter
+    assert host_rate_limits.get("blog.example.com").rate == 2.0
+    assert [limiter.host for limiter in host_rate_limits] == ["example.com", "blog.example.com"]
+
+
+@pytest.mark.parametrize("limits_kwargs", [
+    dict(initial_rate=0.5, min_rate=1.0),
+    dict(initial_rate=200.0, max_rate=100.0),
+    dict(min_rate=0),
+    dict(decrease_factor=1),
+])
+def test_host_rate_limits_reject_bad_parameters(limits_kwargs: dict):
+    with pytest.raises(ValueError):
+        HostRateLimits(**limits_kwargs)
@@ -0,0 +1,227 @@
+import asyncio
+import io
+import pickle
+
+import pytest
+
+from sitemapgen.cmds.checkpoint import CrawlCheckpointer
+from sitemapgen.cmds.generate_map import PageInfo, FrontierEntry
+from sitemapgen.cmds.save_queue import PageSaveQueue, SaveQueueClosedError, get_page_size
+from sitemapgen.provider import CommandProvider
+from sitemapgen.utils.metrics import MetricsRegistry
+from sitemapgen.utils.visited_set import FingerprintSet
+
+
+def build_page(i: int) -> PageInfo:
+    return PageInfo(url=f"http://example.com/{i}", title=f"Page {i}", html="x" * 10_000, links=["http://example.com/"])
+
+
+PAGE_SIZE = get_page_size(build_page(0))
+
+
+def drain(queue: PageSaveQueue) -> list[int]:
+    numbers = []
+    while not queue.empty():
+        numbers.append(int(queue.get_nowait().url.rsplit("/", 1)[1]))
+        queue.task_done()
+    return numbers
+
+
+def test_memory_bytes_are_tracked():
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=10 * PAGE_SIZE)
+        for i in range(3):
+            queue.put_nowait(build_page(i))
+        assert queue.memory_bytes == 3 * PAGE_SIZE
+
+        queue.get_nowait()
+        assert queue.memory_bytes == 2 * PAGE_SIZE
+        assert drain(queue) == [1, 2]
+        assert queue.memory_bytes == 0
+
+    asyncio.run(run())
+
+
+def test_put_waits_while_full_and_continues_after_get():
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=2 * PAGE_SIZE)
+        await queue.put(build_page(0))
+        await queue.put(build_page(1))
+        assert queue.full()
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait(build_page(2))
+
+        put_task = asyncio.ensure_future(queue.put(build_page(2)))
+        await asyncio.sleep(0.01)
+        assert not put_task.done()
+
+        assert (await queue.get()).url == "http://example.com/0"
+        await asyncio.wait_for(put_task, 1)
+        assert drain(queue) == [1, 2]
+
+    asyncio.run(run())
+
+
+def test_page_larger_than_budget_is_taken_in():
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=1)
+        await asyncio.wait_for(queue.put(build_page(0)), 1)
+        assert queue.full()
+
+    asyncio.run(run())
+
+
+def test_get_waits_for_put():
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=PAGE_SIZE)
+        get_task = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0.01)
+        assert not get_task.done()
+
+        queue.put_nowait(build_page(0))
+        assert (await asyncio.wait_for(get_task, 1)).url == "http://example.com/0"
+
+    asyncio.run(run())
+
+
+def test_spilled_pages_keep_order(tmp_path):
+    async def run() -> None:
+        metrics = MetricsRegistry()
+        queue = PageSaveQueue(max_memory_bytes=3 * PAGE_SIZE, spill_dir=tmp_path, metrics=metrics)
+        for i in range(10):
+            await asyncio.wait_for(queue.put(build_page(i)), 1)
+
+        assert not queue.full()
+        assert queue.qsize() == 10
+        assert queue.spilled_count == 7
+        assert queue.memory_bytes == 3 * PAGE_SIZE
+        assert metrics.get("sitemapgen_save_queue_spilled_pages_total").value == 7
+
+        # The memory is freed, but the page goes after the spilled ones
+        assert [queue.get_nowait().url for _ in range(2)] == ["http://example.com/0", "http://example.com/1"]
+        queue.put_nowait(build_page(10))
+        assert queue.spilled_count == 8
+        assert drain(queue) == list(range(2, 11))
+
+        # The file is read to the end, the next pages are in memory again
+        queue.put_nowait(build_page(11))
+        assert queue.spilled_count == 0
+        assert queue.memory_bytes == get_page_size(build_page(11))
+        queue.close()
+
+    asyncio.run(run())
+
+
+def test_spilled_pages_are_copied_without_reading(tmp_path):
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=PAGE_SIZE, spill_dir=tmp_path)
+        queue.extend(build_page(i) for i in range(4))
+        queue.get_nowait()
+        queue.get_nowait()
+
+        spilled_pages = queue.take_spilled_pages()
+        # The spill file is not truncated while the range is taken
+        drain(queue)
+        queue.put_nowait(build_page(4))
+
+        f = io.BytesIO()
+        spilled_pages.copy_to(f)
+        spilled_pages.release()
+        f.seek(0)
+        assert [pickle.load(f).url for _ in range(spilled_pages.count)] == [
+            "http://example.com/2", "http://example.com/3"
+        ]
+        assert drain(queue) == [4]
+
+    asyncio.run(run())
+
+
+def test_task_done_balance():
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=PAGE_SIZE)
+        queue.extend(build_page(i) for i in range(3))
+        assert queue.qsize() == 3
+
+        join_task = asyncio.ensure_future(queue.join())
+        assert drain(queue) == [0, 1, 2]
+        await asyncio.wait_for(join_task, 1)
+
+        with pytest.raises(ValueError):
+            queue.task_done()
+
+    asyncio.run(run())
+
+
+def test_closed_queue_fails_waiting_put():
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=PAGE_SIZE)
+        queue.put_nowait(build_page(0))
+
+        put_task = asyncio.ensure_future(queue.put(build_page(1)))
+        await asyncio.sleep(0.01)
+        queue.close()
+
+        with pytest.raises(SaveQueueClosedError):
+            await asyncio.wait_for(put_task, 1)
+        with pytest.raises(SaveQueueClosedError):
+            queue.put_nowait(build_page(2))
+
+    asyncio.run(run())
+
+
+class StaticGenerator:
+    def get_frontier_snapshot(self) -> list[FrontierEntry]:
+        return [FrontierEntry(depth=2, url="http://example.com/next")]
+
+
+class StaticPageWriter:
+    pending_pages = [build_page(100)]
+
+
+def test_checkpoint_streams_spilled_pages(tmp_path):
+    async def run() -> None:
+        queue = PageSaveQueue(max_memory_bytes=2 * PAGE_SIZE, spill_dir=tmp_path)
+        queue.extend(build_page(i) for i in range(5))
+
+        checkpointer = CrawlCheckpointer(
+            path=tmp_path / "crawl.checkpoint",
+            url="http://example.com/",
+            generator=StaticGenerator(),
+            visited_urls=FingerprintSet(),
+            page_queue=queue,
+            page_writer=StaticPageWriter(),
+        )
+        await checkpointer.save()
+        assert drain(queue) == [0, 1, 2, 3, 4]
+
+    asyncio.run(run())
+
+    checkpoint = CrawlCheckpointer.load(tmp_path / "crawl.checkpoint")
+    assert [page_info.url for page_info in checkpoint.pending_pages] == [
+        "http://example.com/100", "http://example.com/0", "http://example.com/1"
+    ]
+    assert checkpoint.spilled_pages_count == 3
+    assert [page_info.url for page_info in CrawlCheckpointer.iter_spilled_pages(tmp_path / "crawl.checkpoint")] == [
+        "http://example.com/2", "http://example.com/3", "http://example.com/4"
+    ]
+
+
+def test_crawl_is_cancelled_when_writer_stops():
+    async def run() -> None:
+        crawl_task_cancelled = asyncio.Event()
+
+        async def crawl() -> None:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                crawl_task_cancelled.set()
+                raise
+
+        async def write() -> None:
+            raise ConnectionError("The database is gone")
+
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(CommandProvider.crawl_while_saving(crawl(), asyncio.ensure_future(write())), 1)
+        assert crawl_task_cancelled.is_set()
+
+    asyncio.run(run())
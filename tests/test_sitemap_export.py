@@ -0,0 +1,30 @@
+import gzip
+
+from sitemapgen.cmds.sitemap_export import SitemapExporter
+
+
+class StaticDatabaseApiClient:
+    def __init__(self, url_paths: list[str]) -> None:
+        self._url_paths = url_paths
+
+    def iter_site_pages(self, site_key: tuple) -> list[tuple[str, None]]:
+        return [(url_path, None) for url_path in self._url_paths]
+
+
+def export(tmp_path, url_paths: list[str], compress: bool = True) -> list[str]:
+    exporter = SitemapExporter(db_client=StaticDatabaseApiClient(url_paths), compress=compress, max_urls=2)
+    exporter.export(site_key=("https", "example.com", 443), output_dir=tmp_path)
+    return sorted(path.name for path in tmp_path.iterdir())
+
+
+def test_sitemaps_are_split_by_urls_count(tmp_path):
+    assert export(tmp_path, ["/a", "/b", "/c"]) == ["sitemap-1.xml.gz", "sitemap-2.xml.gz", "sitemap.xml"]
+    assert b"<loc>https://example.com/c</loc>" in gzip.decompress((tmp_path / "sitemap-2.xml.gz").read_bytes())
+    assert b"https://example.com/sitemap-2.xml.gz" in (tmp_path / "sitemap.xml").read_bytes()
+
+
+def test_stale_sitemaps_are_removed(tmp_path):
+    (tmp_path / "robots.txt").write_text("User-agent: *")
+    export(tmp_path, [f"/{i}" for i in range(6)])
+
+    assert export(tmp_path, ["/a"], compress=False) == ["robots.txt", "sitemap-1.xml", "sitemap.xml"]
@@ -0,0 +1,58 @@
+import asyncio
+import gzip
+
+from sitemapgen.http_tools.sitemaps import iter_sitemap_urls
+
+SITEMAP = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+    b"<url><loc>http://example.com/a</loc></url>"
+    b"<url><loc> http://example.com/b </loc></url>"
+    b"</urlset>"
+)
+
+
+class ChunkedLinkFetcher:
+    def __init__(self, bodies: dict[str, bytes], chunk_size: int = 16) -> None:
+        self._bodies = bodies
+        self._chunk_size = chunk_size
+        self.closed_urls: list[str] = []
+
+    async def iter_body_chunks(self, url: str):
+        body = self._bodies[url]
+        try:
+            for start in range(0, len(body), self._chunk_size):
+                yield body[start:start + self._chunk_size]
+        finally:
+            self.closed_urls.append(url)
+
+
+async def collect_urls(link_fetcher: ChunkedLinkFetcher, sitemap_url: str, limit: int = 100) -> list[str]:
+    urls = []
+    sitemap_urls = iter_sitemap_urls(link_fetcher, sitemap_url=sitemap_url)
+    try:
+        async for url in sitemap_urls:
+            urls.append(url)
+            if len(urls) == limit:
+                break
+    finally:
+        await sitemap_urls.aclose()
+    return urls
+
+
+def test_gzipped_sitemap_urls():
+    link_fetcher = ChunkedLinkFetcher({"http://example.com/sitemap.xml.gz": gzip.compress(SITEMAP)})
+
+    urls = asyncio.run(collect_urls(link_fetcher, "http://example.com/sitemap.xml.gz"))
+
+    assert urls == ["http://example.com/a", "http://example.com/b"]
+    assert link_fetcher.closed_urls == ["http://example.com/sitemap.xml.gz"]
+
+
+def test_body_is_closed_when_iteration_stops_early():
+    link_fetcher = ChunkedLinkFetcher({"http://example.com/sitemap.xml": SITEMAP})
+
+    urls = asyncio.run(collect_urls(link_fetcher, "http://example.com/sitemap.xml", limit=1))
+
+    assert urls == ["http://example.com/a"]
+    assert link_fetcher.closed_urls == ["http://example.com/sitemap.xml"]
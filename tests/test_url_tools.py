@@ -0,0 +1,74 @@
+import pytest
+
+from sitemapgen.utils.url_tools import (
+    LinkKind,
+    ResolvedLink,
+    UrlCanonicalizer,
+    canonicalize_url,
+    is_host_internal,
+    is_url_internal,
+)
+
+
+@pytest.mark.parametrize("url, canonical_url", [
+    ("http://example.com", "http://example.com/"),
+    ("HTTP://EXAMPLE.com/Path", "http://example.com/Path"),
+    ("http://example.com:80/", "http://example.com/"),
+    ("https://example.com:443/", "https://example.com/"),
+    ("http://example.com:8080/", "http://example.com:8080/"),
+    ("https://example.com:80/", "https://example.com:80/"),
+    ("http://example.com/a/./b/../c", "http://example.com/a/c"),
+    ("http://example.com/a/b/../../../c", "http://example.com/c"),
+    ("http://example.com/a#section", "http://example.com/a"),
+    ("http://example.com/?b=2&a=1", "http://example.com/?a=1&b=2"),
+])
+def test_canonicalize_url(url: str, canonical_url: str):
+    assert canonicalize_url(url) == canonical_url
+
+
+def test_canonicalize_relative_url_fails():
+    with pytest.raises(ValueError):
+        canonicalize_url("/relative")
+
+
+@pytest.mark.parametrize("host, is_internal", [
+    ("example.com", True),
+    ("blog.example.com", True),
+    ("evilexample.com", False),
+    ("example.com.evil.org", False),
+    ("", False),
+    (None, False),
+])
+def test_is_host_internal(host, is_internal: bool):
+    assert is_host_internal(host, "example.com") is is_internal
+
+
+def test_is_url_internal_ignores_host_case():
+    assert is_url_internal("http://Blog.Example.com/", "EXAMPLE.com")
+    assert not is_url_internal("http://evilexample.com/", "example.com")
+
+
+@pytest.mark.parametrize("link, resolved_link", [
+    ("/b/../c", ResolvedLink(kind=LinkKind.INTERNAL, url="http://example.com/c")),
+    ("../up", ResolvedLink(kind=LinkKind.INTERNAL, url="http://example.com/up")),
+    ("next.html?b=2&a=1", ResolvedLink(kind=LinkKind.INTERNAL, url="http://example.com/dir/next.html?a=1&b=2")),
+    ("//blog.example.com:80/", ResolvedLink(kind=LinkKind.INTERNAL, url="http://blog.example.com/")),
+    ("HTTPS://Example.com:443/x", ResolvedLink(kind=LinkKind.INTERNAL, url="https://example.com/x")),
+    ("http://evilexample.com/", ResolvedLink(kind=LinkKind.EXTERNAL, url="http://evilexample.com/")),
+    ("//evilexample.com/x", ResolvedLink(kind=LinkKind.EXTERNAL, url="http://evilexample.com/x")),
+    ("mailto:admin@example.com", ResolvedLink(kind=LinkKind.NOT_HTTP, url=None)),
+    ("javascript:void(0)", ResolvedLink(kind=LinkKind.NOT_HTTP, url=None)),
+    ("#top", ResolvedLink(kind=LinkKind.ELEMENT_REFERENCE, url=None)),
+    ("http://[::1", ResolvedLink(kind=LinkKind.INVALID, url=None)),
+])
+def test_url_canonicalizer_resolve(link: str, resolved_link: ResolvedLink):
+    canonicalizer = UrlCanonicalizer(base_url_host="Example.com")
+    assert canonicalizer.resolve("http://example.com/dir/page.html", link) == resolved_link
+
+
+def test_url_canonicalizer_caches_absolute_links_once():
+    canonicalizer = UrlCanonicalizer(base_url_host="example.com")
+    for i in range(3):
+        canonicalizer.resolve(f"http://example.com/{i}", "http://example.com/about")
+
+    assert str(canonicalizer) == "1 cached links, hit rate 66.7%"
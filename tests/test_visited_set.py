@@ -0,0 +1,71 @@
+import pytest
+
+from sitemapgen.utils.visited_set import BloomFilterSet, FingerprintSet, VisitedSetKind, build_visited_set
+
+
+def test_fingerprint_set_add_and_contains():
+    visited_urls = FingerprintSet()
+
+    assert visited_urls.add("http://example.com/a")
+    assert not visited_urls.add("http://example.com/a")
+    # The URL is canonicalized before hashing
+    assert not visited_urls.add("http://EXAMPLE.com:80/b/../a")
+
+    assert "http://example.com/a" in visited_urls
+    assert "http://example.com/b" not in visited_urls
+    assert len(visited_urls) == 1
+
+
+def test_fingerprint_set_probes_colliding_slots():
+    visited_urls = FingerprintSet(initial_capacity=8)
+    fingerprints = [3, 3 + 8, 3 + 16]  # the same slot of the 8 slots
+
+    assert all(visited_urls.add_fingerprint(fingerprint) for fingerprint in fingerprints)
+    assert not any(visited_urls.add_fingerprint(fingerprint) for fingerprint in fingerprints)
+    assert sorted(visited_urls) == fingerprints
+    assert len(visited_urls) == 3
+
+
+def test_fingerprint_set_keeps_zero_fingerprint():
+    visited_urls = FingerprintSet(initial_capacity=8)
+
+    assert visited_urls.add_fingerprint(0)
+    assert not visited_urls.add_fingerprint(0)
+    assert list(visited_urls) == [1]
+
+
+def test_fingerprint_set_grows_over_load_factor():
+    visited_urls = FingerprintSet(initial_capacity=8)
+    assert visited_urls.memory_usage_bytes == 8 * 8
+
+    urls = [f"http://example.com/{i}" for i in range(1000)]
+    assert all(visited_urls.add(url) for url in urls)
+
+    assert len(visited_urls) == 1000
+    assert visited_urls.memory_usage_bytes == 2048 * 8
+    assert all(url in visited_urls for url in urls)
+    assert "http://example.com/1000" not in visited_urls
+
+
+def test_bloom_filter_set_add_and_contains():
+    visited_urls = BloomFilterSet(capacity=1000, error_rate=0.01)
+
+    urls = [f"http://example.com/{i}" for i in range(1000)]
+    assert sum(visited_urls.add(url) for url in urls) >= 990
+    assert not visited_urls.add("http://example.com/0")
+
+    assert all(url in visited_urls for url in urls)
+    false_positives_count = sum(f"http://example.com/new/{i}" in visited_urls for i in range(10_000))
+    assert false_positives_count < 300
+    assert visited_urls.false_positive_rate == pytest.approx(0.01, rel=0.5)
+
+
+@pytest.mark.parametrize("capacity, error_rate", [(0, 0.01), (1000, 0), (1000, 1)])
+def test_bloom_filter_set_rejects_bad_parameters(capacity: int, error_rate: float):
+    with pytest.raises(ValueError):
+        BloomFilterSet(capacity=capacity, error_rate=error_rate)
+
+
+def test_build_visited_set():
+    assert isinstance(build_visited_set(VisitedSetKind.BLOOM, capacity=1000), BloomFilterSet)
+    assert isinstance(build_visited_set(VisitedSetKind.FINGERPRINT, capacity=1000), FingerprintSet)